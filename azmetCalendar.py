@@ -0,0 +1,209 @@
+# AZMET's calendar, a whole column at a time. AZMET puts midnight at 24:00 of
+# the day that is ending, not 00:00 of the next one: 1987-01-02 00:00:00 is
+# obs_year 1987, obs_doy "001", obs_hour "2400", and the R download functions
+# write its obs_datetime as "1987-01-01 23:59:59" (use_24_datetime(),
+# use_24_year(), use_24_yday() and use_24_hour() in R/utils.R, which format one
+# element at a time with strftime()).
+#
+# Here the same conversions go both ways on NumPy arrays, through tables of
+# every day from CALENDAR_YEARS[0] to CALENDAR_YEARS[1] (each day's year, doy
+# and "YYYY-MM-DD", and where each year starts), so that leap years and hour
+# 24 only ever come from those, and the obs_datetime, obs_year, obs_doy and
+# obs_hour columns of the schema's primary keys can be built without a
+# per-row pass. Anything invalid (NaT, a year outside the tables, doy 366 of a
+# common year, an hour past 2400) comes out as -1, NaT or "NA".
+
+import functools
+
+from csvParseAndProcess import np, requireNumpy
+
+CALENDAR_YEARS = (1900, 2100)
+SECONDS_PER_DAY = 86400
+HOUR_MIDNIGHT = 2400
+
+
+@functools.lru_cache(maxsize=None)
+def getCalendarTables():
+    # {"year_starts": day number (days since 1970-01-01) of 1 January of each
+    # year and of the year after the last, "years", "doys" and "dates": the
+    # year, doy and b"YYYY-MM-DD" of each day, indexed by day number minus
+    # that of the first day}
+    requireNumpy()
+    aryYearStarts = (
+        (np.arange(CALENDAR_YEARS[0], CALENDAR_YEARS[1] + 2) - 1970)
+        .astype("datetime64[Y]")
+        .astype("datetime64[D]")
+        .astype(np.int64)
+    )
+    aryYearLengths = np.diff(aryYearStarts)
+    aryDayNumbers = np.arange(aryYearStarts[0], aryYearStarts[-1])
+
+    return {
+        "year_starts": aryYearStarts,
+        "years": np.repeat(
+            np.arange(CALENDAR_YEARS[0], CALENDAR_YEARS[1] + 1), aryYearLengths
+        ),
+        "doys": aryDayNumbers - np.repeat(aryYearStarts[:-1], aryYearLengths) + 1,
+        "dates": np.datetime_as_string(aryDayNumbers.astype("datetime64[D]")).astype(
+            "S10"
+        ),
+    }
+
+
+def getDayIndexes(aryYears, aryDoys):
+    # (index in the calendar tables of each (year, doy), valid mask)
+    dictTables = getCalendarTables()
+    aryYearStarts = dictTables["year_starts"]
+    aryYears = np.asarray(aryYears, dtype=np.int64)
+    aryDoys = np.asarray(aryDoys, dtype=np.int64)
+    aryYearIndexes = aryYears - CALENDAR_YEARS[0]
+    aryValid = (aryYearIndexes >= 0) & (aryYearIndexes < len(aryYearStarts) - 1)
+    aryYearIndexes = np.where(aryValid, aryYearIndexes, 0)
+    aryStarts = aryYearStarts[aryYearIndexes]
+    aryValid &= (aryDoys >= 1) & (
+        aryDoys <= aryYearStarts[aryYearIndexes + 1] - aryStarts
+    )
+
+    return np.where(aryValid, aryStarts - aryYearStarts[0] + aryDoys - 1, 0), aryValid
+
+
+def isValidHour(aryHours):
+    # obs_hour as an integer, 0 to 2400 with minutes under 60
+    return (aryHours >= 0) & (aryHours <= HOUR_MIDNIGHT) & (aryHours % 100 < 60)
+
+
+def toAzmetParts(aryDatetimes):
+    # (obs_year, obs_doy, obs_hour) integer arrays of datetime64 values, as
+    # use_24_year(), use_24_yday() and use_24_hour() give them: 00:00:00 is
+    # hour 2400 of the day before, and 1 January 00:00:00 is in the year
+    # before. Like strftime(x, "%H00"), minutes and seconds are dropped
+    # (01:30 -> 100, 00:30 -> 0 of the same day).
+    dictTables = getCalendarTables()
+    aryDatetimes = np.asarray(aryDatetimes).astype("datetime64[s]")
+    aryValid = ~np.isnat(aryDatetimes)
+    aryDays, arySeconds = np.divmod(
+        np.where(aryValid, aryDatetimes.astype(np.int64), 0), SECONDS_PER_DAY
+    )
+    aryMidnight = arySeconds == 0
+    aryIndexes = aryDays - aryMidnight - dictTables["year_starts"][0]
+    aryValid &= (aryIndexes >= 0) & (aryIndexes < len(dictTables["years"]))
+    aryIndexes = np.where(aryValid, aryIndexes, 0)
+    aryHours = np.where(aryMidnight, HOUR_MIDNIGHT, arySeconds // 3600 * 100)
+
+    return (
+        np.where(aryValid, dictTables["years"][aryIndexes], -1),
+        np.where(aryValid, dictTables["doys"][aryIndexes], -1),
+        np.where(aryValid, aryHours, -1),
+    )
+
+
+def fromAzmetParts(aryYears, aryDoys, aryHours=None):
+    # datetime64[s] of each (obs_year, obs_doy, obs_hour), hour 2400 being
+    # 00:00:00 of the next day, NaT where invalid; without hours, the start of
+    # each day
+    dictTables = getCalendarTables()
+    aryIndexes, aryValid = getDayIndexes(aryYears, aryDoys)
+    arySeconds = (aryIndexes + dictTables["year_starts"][0]) * SECONDS_PER_DAY
+    if aryHours is not None:
+        aryHours = np.asarray(aryHours, dtype=np.int64)
+        aryValid &= isValidHour(aryHours)
+        arySeconds += aryHours // 100 * 3600 + aryHours % 100 * 60
+
+    return np.where(
+        aryValid, arySeconds.astype("datetime64[s]"), np.datetime64("NaT", "s")
+    )
+
+
+def splitObsKeys(aryKeys):
+    # (obs_year, obs_doy, obs_hour) of getObsKey() keys, -1 for a -1 key
+    aryKeys = np.asarray(aryKeys, dtype=np.int64)
+    aryValid = aryKeys >= 0
+
+    return (
+        np.where(aryValid, aryKeys // 10**7, -1),
+        np.where(aryValid, aryKeys // 10**4 % 1000, -1),
+        np.where(aryValid, aryKeys % 10**4, -1),
+    )
+
+
+def getObsKeys(aryYears, aryDoys, aryHours=None):
+    # getObsKey() of each (obs_year, obs_doy, obs_hour), -1 where invalid
+    aryIndexes, aryValid = getDayIndexes(aryYears, aryDoys)
+    aryKeys = (
+        np.asarray(aryYears, dtype=np.int64) * 10**7
+        + np.asarray(aryDoys, dtype=np.int64) * 10**4
+    )
+    if aryHours is not None:
+        aryHours = np.asarray(aryHours, dtype=np.int64)
+        aryValid &= isValidHour(aryHours)
+        aryKeys += aryHours
+
+    return np.where(aryValid, aryKeys, -1)
+
+
+def getDigits(aryValues, intWidth=1):
+    # (len, intWidth) uint8 array of the zero-padded decimal digits of each
+    # of aryValues, which are all >= 0
+    aryPowers = 10 ** np.arange(intWidth - 1, -1, -1, dtype=np.int64)
+
+    return (aryValues[:, None] // aryPowers % 10 + ord("0")).astype(np.uint8)
+
+
+def joinBytes(listParts, aryValid):
+    # str array of each row of the uint8 arrays in listParts put together,
+    # "NA" where not aryValid
+    aryBytes = np.ascontiguousarray(np.concatenate(listParts, axis=1))
+    aryStrings = aryBytes.view(f"S{aryBytes.shape[1]}").reshape(-1).astype(str)
+
+    return np.where(aryValid, aryStrings, "NA")
+
+
+def formatObsDatetimes(aryYears, aryDoys, aryHours=None):
+    # obs_datetime of each (obs_year, obs_doy, obs_hour) as the R download
+    # functions write it, "YYYY-MM-DD HH:MM:00" with "23:59:59" for hour 2400
+    # (use_24_datetime()); without hours, the daily "YYYY-MM-DD"
+    dictTables = getCalendarTables()
+    aryIndexes, aryValid = getDayIndexes(aryYears, aryDoys)
+    listParts = [dictTables["dates"][aryIndexes].view(np.uint8).reshape(-1, 10)]
+    if aryHours is not None:
+        aryHours = np.asarray(aryHours, dtype=np.int64)
+        aryValid &= isValidHour(aryHours)
+        aryHours = np.where(aryValid, aryHours, 0)
+        aryMidnight = aryHours == HOUR_MIDNIGHT
+        arySpaces = np.full((len(aryHours), 1), ord(" "), dtype=np.uint8)
+        aryColons = np.full((len(aryHours), 1), ord(":"), dtype=np.uint8)
+        listParts += [
+            arySpaces,
+            getDigits(np.where(aryMidnight, 23, aryHours // 100), 2),
+            aryColons,
+            getDigits(np.where(aryMidnight, 59, aryHours % 100), 2),
+            aryColons,
+            getDigits(np.where(aryMidnight, 59, 0), 2),
+        ]
+
+    return joinBytes(listParts, aryValid)
+
+
+def formatObsKeyColumns(aryYears, aryDoys, aryHours=None):
+    # {"obs_datetime", "obs_year", "obs_doy" and "obs_hour" (with hours)}
+    # string columns as the R download functions write them, e.g. "1987",
+    # "001", "2400"
+    aryYears = np.asarray(aryYears, dtype=np.int64)
+    aryDoys = np.asarray(aryDoys, dtype=np.int64)
+    aryValid = getDayIndexes(aryYears, aryDoys)[1]
+    if aryHours is not None:
+        aryHours = np.asarray(aryHours, dtype=np.int64)
+        aryValid &= isValidHour(aryHours)
+    dictColumns = {
+        "obs_datetime": formatObsDatetimes(aryYears, aryDoys, aryHours),
+        "obs_year": joinBytes(
+            [getDigits(np.where(aryValid, aryYears, 0), 4)], aryValid
+        ),
+        "obs_doy": joinBytes([getDigits(np.where(aryValid, aryDoys, 0), 3)], aryValid),
+    }
+    if aryHours is not None:
+        dictColumns["obs_hour"] = joinBytes(
+            [getDigits(np.where(aryValid, aryHours, 0), 4)], aryValid
+        )
+
+    return dictColumns
@@ -0,0 +1,884 @@
+# Run updateDerived() for every station in azmet-station-list.csv in a pool of
+# worker processes. Stations share no state, so each one runs in its own
+# process, and a failure in one station is reported without stopping the rest.
+#
+# python batchUpdateDerived.py legacy azmet-station-list.csv --processes 8
+#
+# With --journal, each station goes through the stages of run.R (fetch, parse,
+# dedup, derive, validate, write) and every finished stage is appended to the
+# journal with hashes of its outputs. Rerunning with the same journal picks each
+# station up at its first unfinished stage, so a crash costs at most the
+# stages in flight.
+#
+# python batchUpdateDerived.py legacy azmet-station-list.csv --journal legacy/journal.jsonl --delete-originals
+#
+# With --shard-years, each station's years are split into shards that run in
+# processes of their own (see shardDerived.py), for when one long station
+# would otherwise finish well after the rest.
+#
+# With --validate, each station's _updated files are checked against the
+# legacy values validateDerived.py compares them with, and a station with more
+# than --max-breaches of its days off fails (in journal mode, before write, so
+# its originals are kept).
+
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+
+from csvParseAndProcess import (
+    COMPRESSIONS,
+    DEDUP_POLICIES,
+    MISSING_SENTINELS,
+    SCHEMA_PATH,
+    DuplicateReport,
+    JoinReport,
+    MissingValues,
+    ProfileReport,
+    dedupStation,
+    getDuplicatesPath,
+    getUpdatedPath,
+    isFile,
+    openAtomic,
+    openBinary,
+    openCsv,
+    repackArchive,
+    splitArchivePath,
+    updateDerived,
+)
+from fetchLegacyData import BASE_URL, YEARS, fetchFiles, listRawFiles, readStations
+from shardDerived import updateDerivedSharded
+from validateDerived import VALIDATION_TOLERANCES, getBreachErrors, validateStation
+
+# the SQL schema sits next to this script, wherever it is run from
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), SCHEMA_PATH)
+
+
+def toSnakeCase(strStation=""):
+    # same file names as snakecase::to_snake_case() in run.R,
+    # e.g. "Parker #1" -> "parker_1" and "Fort Mohave, CA" -> "fort_mohave_ca"
+    return re.sub(r"[^a-z0-9]+", "_", strStation.lower()).strip("_")
+
+
+def getStationPaths(path_legacy, strStation=""):
+    # path_legacy may also be a directory in a zip archive, e.g.
+    # azmet_legacy_1987-2019.zip/legacy, and a file that is only there
+    # compressed, e.g. obs_hrly-tucson.csv.gz, is used as it is
+    strSnakeStation = toSnakeCase(strStation)
+    dictPaths = {}
+    for strPathKey, strFile in (
+        ("path_obs_hrly", "obs_hrly"),
+        ("path_derived_hrly", "obs_hrly_derived"),
+        ("path_obs_dyly", "obs_dyly"),
+        ("path_derived_dyly", "obs_dyly_derived"),
+    ):
+        path = os.path.join(path_legacy, f"{strFile}-{strSnakeStation}.csv")
+        dictPaths[strPathKey] = next(
+            (
+                path + strSuffix
+                for strSuffix in COMPRESSIONS
+                if not isFile(path) and isFile(path + strSuffix)
+            ),
+            path,
+        )
+
+    return dictPaths
+
+
+def readStationList(path_station_list):
+    with open(path_station_list, "r", newline="") as csvfile:
+        return [row["stn"] for row in csv.DictReader(csvfile)]
+
+
+def validateUpdated(path_legacy, strStation="", dictValidate=None, listSentinels=None):
+    # (validateStation() of a station's _updated files, getBreachErrors() of
+    # it); dictValidate has
+    #   path_raw: the raw file cache, for the heat_units check
+    #   path_station_list: for the station number of the raw files
+    #   tolerances: {check: tolerance} over VALIDATION_TOLERANCES
+    #   max_breaches: the fraction of a check's days that may be off
+    dictPaths = getStationPaths(path_legacy, strStation)
+    intStationNumber = None
+    if dictValidate.get("path_station_list"):
+        for strName, intNumber, _, _ in readStations(dictValidate["path_station_list"]):
+            if strName == strStation:
+                intStationNumber = intNumber
+    dictValidation = validateStation(
+        dictPaths["path_derived_hrly"],
+        dictPaths["path_derived_dyly"],
+        intStationNumber,
+        dictValidate.get("path_raw"),
+        dictValidate.get("tolerances"),
+        MissingValues(listSentinels or MISSING_SENTINELS),
+    )
+
+    return dictValidation, getBreachErrors(
+        dictValidation, dictValidate.get("max_breaches", 0.0)
+    )
+
+
+def updateStation(path_legacy, strStation="", dictOptions=None):
+    # updateDerived() for a single station; never raises, so that one bad
+    # station can't take down the pool. dictOptions are passed on to
+    # updateDerived(), except "missing_sentinels", which is used to build the
+    # station's MissingValues, "profile", which turns on its ProfileReport,
+    # "validate", validateUpdated() options to check the outputs with,
+    # which makes a station with too many breaches "invalid", and
+    # "shard_years" and "shard_processes", to run the station's years in
+    # shards with updateDerivedSharded() instead.
+    dictOptions = dict(dictOptions or {})
+    listSentinels = dictOptions.pop("missing_sentinels", MISSING_SENTINELS)
+    dictValidate = dictOptions.pop("validate", None)
+    intShardYears = dictOptions.pop("shard_years", None)
+    intShardProcesses = dictOptions.pop("shard_processes", None)
+    fnUpdate = updateDerived
+    if intShardYears:
+        fnUpdate = updateDerivedSharded
+        dictOptions.update(shard_years=intShardYears, processes=intShardProcesses)
+    missing = MissingValues(listSentinels)
+    joins = JoinReport()
+    duplicates = DuplicateReport()
+    profile = ProfileReport(blnEnabled=dictOptions.pop("profile", False))
+    dictResult = {"station": strStation, "status": "ok", "seconds": 0.0}
+    fltStart = time.perf_counter()
+    try:
+        dictResult["outputs"] = fnUpdate(
+            **getStationPaths(path_legacy, strStation),
+            **dictOptions,
+            missing=missing,
+            joins=joins,
+            profile=profile,
+            duplicates=duplicates,
+        )
+        if dictValidate is not None:
+            dictResult["validation"], listErrors = validateUpdated(
+                path_legacy, strStation, dictValidate, listSentinels
+            )
+            if listErrors:
+                dictResult["status"] = "invalid"
+                dictResult["error"] = "; ".join(listErrors)
+    except Exception as e:
+        dictResult["status"] = "error"
+        dictResult["error"] = f"{type(e).__name__}: {e}"
+        dictResult["traceback"] = traceback.format_exc()
+    dictResult["seconds"] = round(time.perf_counter() - fltStart, 3)
+    dictResult["missing"] = missing.getCounts()
+    dictResult["unmatched"] = joins.getCounts()
+    dictResult["duplicates"] = duplicates.getCounts()
+    if profile.blnEnabled:
+        dictResult["profile"] = profile.getReport()
+
+    return dictResult
+
+
+# -----------------------------------------------------------------------------
+# Checkpoint journal
+#
+# One JSON line per finished (station, stage), with the sha256 of every file
+# the stage wrote. A station resumes at the first of its stages without a
+# line, or at its first stage if a file recorded by a finished stage has
+# changed or gone since. Once "write" is recorded the station is done, as its
+# original derived files may have been deleted.
+
+STAGES = ("fetch", "parse", "dedup", "derive", "validate", "write")
+
+
+def hashFile(path):
+    # of the bytes as stored, or of the contents of a zip archive member
+    hashPath = hashlib.sha256()
+    with (
+        open(path, "rb") if splitArchivePath(path)[1] is None else openBinary(path)
+    ) as file:
+        for bytChunk in iter(lambda: file.read(2**20), b""):
+            hashPath.update(bytChunk)
+
+    return hashPath.hexdigest()
+
+
+def hashFiles(listPaths):
+    return {path: hashFile(path) for path in listPaths}
+
+
+def readJournal(path_journal):
+    # {station: {stage: outputs}} of the finished stages in a journal; a line
+    # cut short by a crash is ignored, and a stage that was run again undoes
+    # the stages after it
+    dictStations = {}
+    if not os.path.exists(path_journal):
+        return dictStations
+    with open(path_journal, "r") as jsonfile:
+        for strLine in jsonfile:
+            try:
+                dictEntry = json.loads(strLine)
+            except ValueError:
+                continue
+            dictDone = dictStations.setdefault(dictEntry["station"], {})
+            dictDone[dictEntry["stage"]] = dictEntry["outputs"]
+            for strStage in STAGES[STAGES.index(dictEntry["stage"]) + 1 :]:
+                dictDone.pop(strStage, None)
+
+    return dictStations
+
+
+def appendJournal(path_journal, strStation="", strStage="", dictOutputs=None):
+    # one line in a single O_APPEND write, so that stations finishing in
+    # different worker processes don't interleave
+    bytLine = (
+        json.dumps(
+            {
+                "station": strStation,
+                "stage": strStage,
+                "outputs": dictOutputs or {},
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+        )
+        + "\n"
+    ).encode()
+    intFile = os.open(path_journal, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # a line cut short by a crash is ended first, so it costs only itself
+        intSize = os.fstat(intFile).st_size
+        if intSize and os.pread(intFile, 1, intSize - 1) != b"\n":
+            bytLine = b"\n" + bytLine
+        os.write(intFile, bytLine)
+        os.fsync(intFile)
+    finally:
+        os.close(intFile)
+
+
+def getResumeStage(dictDone, listStages):
+    # index in listStages of the first stage to run, len(listStages) when the
+    # station is done
+    if "write" in dictDone:
+        return len(listStages)
+
+    # the latest hash of each file; an earlier stage's hash of a file that a
+    # later stage rewrote (e.g. dedup) is superseded by it
+    dictHashes = {}
+    for strStage in listStages:
+        dictHashes.update(dictDone.get(strStage, {}))
+    for path, strHash in dictHashes.items():
+        if not isFile(path) or hashFile(path) != strHash:
+            return 0
+
+    for intStage, strStage in enumerate(listStages):
+        if strStage not in dictDone:
+            return intStage
+
+    return len(listStages)
+
+
+def countRows(path):
+    # data rows of a csv file, as csv.DictReader would read them
+    with openCsv(path) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        return sum(1 for row in reader if row)
+
+
+def runStation(path_legacy, strStation="", dictOptions=None, dictCheckpoint=None):
+    # updateStation() as a series of journalled stages, starting at the
+    # first unfinished one; dictCheckpoint has
+    #   path_journal: the journal
+    #   path_station_list: for the station number and years to fetch
+    #   path_raw: fetch the raw files into this cache (no fetch stage if None)
+    #   years, base_url: what to fetch, as in fetchLegacyData.py
+    #   parse_command: a shell command run to write the station's four input
+    #     CSVs, e.g. with the R download functions, formatted with {station},
+    #     {snake_station}, {legacy} and {raw}; without it, parse only checks
+    #     and hashes inputs written beforehand
+    #   delete_originals: delete the original derived files once their
+    #     _updated versions are verified, as run.R does. A station whose
+    #     write stage is done is never run again (bar removing originals a
+    #     crash left), so start a new journal after scraping again.
+    # With a "validate" in dictOptions, a validate stage between derive and
+    # write fails a station with too many breaches before its originals go.
+    # Never raises; the result has the stage each station stopped at.
+    dictOptions = dict(dictOptions or {})
+    strDedup = dictOptions.pop("dedup", None)
+    dictValidate = dictOptions.pop("validate", None)
+    path_journal = dictCheckpoint["path_journal"]
+    dictPaths = getStationPaths(path_legacy, strStation)
+    listStages = [
+        strStage
+        for strStage in STAGES
+        if (strStage != "fetch" or dictCheckpoint.get("path_raw"))
+        and (strStage != "dedup" or strDedup)
+        and (strStage != "validate" or dictValidate is not None)
+    ]
+    dictDone = readJournal(path_journal).get(strStation, {})
+    intResume = getResumeStage(dictDone, listStages)
+    dictResult = {
+        "station": strStation,
+        "status": "ok",
+        "seconds": 0.0,
+        "stages": {strStage: "done before" for strStage in listStages[:intResume]},
+    }
+    fltStart = time.perf_counter()
+    strStage = None
+    try:
+        for strStage in listStages[intResume:]:
+            if strStage == "fetch":
+                listStations = [
+                    tplStation
+                    for tplStation in readStations(dictCheckpoint["path_station_list"])
+                    if tplStation[0] == strStation
+                ]
+                listResults = asyncio.run(
+                    fetchFiles(
+                        listRawFiles(listStations, *dictCheckpoint.get("years", YEARS)),
+                        dictCheckpoint["path_raw"],
+                        dictCheckpoint.get("base_url", BASE_URL),
+                    )
+                )
+                listErrors = [
+                    dictFetch["name"]
+                    for dictFetch in listResults
+                    if dictFetch["status"] == "error"
+                ]
+                if listErrors:
+                    raise RuntimeError(f"couldn't fetch {', '.join(listErrors)}")
+                dictOutputs = hashFiles(
+                    os.path.join(dictCheckpoint["path_raw"], dictFetch["name"])
+                    for dictFetch in listResults
+                    if dictFetch["status"] != "missing"
+                )
+            elif strStage == "parse":
+                if dictCheckpoint.get("parse_command"):
+                    subprocess.run(
+                        dictCheckpoint["parse_command"].format(
+                            station=strStation,
+                            snake_station=toSnakeCase(strStation),
+                            legacy=path_legacy,
+                            raw=dictCheckpoint.get("path_raw") or "",
+                        ),
+                        shell=True,
+                        check=True,
+                    )
+                dictOutputs = hashFiles(dictPaths.values())
+            elif strStage == "dedup":
+                duplicates = DuplicateReport()
+                dedupStation(
+                    *dictPaths.values(),
+                    strDedup,
+                    MissingValues(
+                        dictOptions.get("missing_sentinels", MISSING_SENTINELS)
+                    ),
+                    duplicates,
+                )
+                dictResult["duplicates"] = duplicates.getCounts()
+                dictOutputs = hashFiles(
+                    list(dictPaths.values())
+                    + [
+                        getDuplicatesPath(path)
+                        for path in dictPaths.values()
+                        if os.path.exists(getDuplicatesPath(path))
+                    ]
+                )
+            elif strStage == "derive":
+                dictDerived = updateStation(path_legacy, strStation, dictOptions)
+                for strKey in ("missing", "unmatched", "profile"):
+                    if strKey in dictDerived:
+                        dictResult[strKey] = dictDerived[strKey]
+                if dictDerived["status"] != "ok":
+                    dictResult["traceback"] = dictDerived.get("traceback")
+                    raise RuntimeError(dictDerived["error"])
+                dictResult["outputs"] = dictDerived["outputs"]
+                dictOutputs = hashFiles(
+                    str(path) for path in dictDerived["outputs"] if os.path.isfile(path)
+                )
+            elif strStage == "validate":
+                dictResult["validation"], listErrors = validateUpdated(
+                    path_legacy,
+                    strStation,
+                    dict(
+                        dictValidate,
+                        path_station_list=dictCheckpoint["path_station_list"],
+                    ),
+                    dictOptions.get("missing_sentinels"),
+                )
+                if listErrors:
+                    raise RuntimeError("; ".join(listErrors))
+                dictOutputs = {}
+            elif strStage == "write":
+                # the _updated files must be the ones derive wrote and have a
+                # row for every row of the originals before those can go
+                dictDerivedHashes = readJournal(path_journal)[strStation]["derive"]
+                dictOutputs = {}
+                for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+                    path_original = dictPaths[strPathKey]
+                    path_updated = getUpdatedPath(path_original)
+                    strHash = hashFile(path_updated)
+                    if strHash != dictDerivedHashes.get(path_updated):
+                        raise RuntimeError(f"{path_updated} changed since derive")
+                    if isFile(path_original) and countRows(path_original) != countRows(
+                        path_updated
+                    ):
+                        raise RuntimeError(
+                            f"{path_updated} doesn't have a row for every row of "
+                            f"{path_original}"
+                        )
+                    dictOutputs[path_updated] = strHash
+
+            appendJournal(path_journal, strStation, strStage, dictOutputs)
+            dictResult["stages"][strStage] = "done"
+
+        # only once write is in the journal, so that a crash in between
+        # leaves the originals rather than nothing; a station resumed after
+        # write removes whatever such a crash left
+        strStage = "write"
+        if dictCheckpoint.get("delete_originals"):
+            for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+                if os.path.exists(dictPaths[strPathKey]):
+                    os.remove(dictPaths[strPathKey])
+    except Exception as e:
+        dictResult["status"] = "error"
+        dictResult["stages"][strStage] = "error"
+        dictResult["error"] = f"{strStage}: {type(e).__name__}: {e}"
+        dictResult.setdefault("traceback", traceback.format_exc())
+    dictResult["seconds"] = round(time.perf_counter() - fltStart, 3)
+
+    return dictResult
+
+
+def runBatch(
+    path_legacy,
+    path_station_list,
+    intProcesses=None,
+    dictOptions=None,
+    fnReport=None,
+    dictCheckpoint=None,
+):
+    # Returns one result dict per station, in station list order. fnReport is
+    # called with each result as soon as that station finishes. With a
+    # dictCheckpoint (see runStation()), stations go through the journalled
+    # stages instead of a single updateDerived() call.
+    listStations = readStationList(path_station_list)
+    if dictCheckpoint is not None:
+        dictCheckpoint = dict(dictCheckpoint, path_station_list=path_station_list)
+    dictResults = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=intProcesses) as executor:
+        dictFutures = {
+            (
+                executor.submit(updateStation, path_legacy, strStation, dictOptions)
+                if dictCheckpoint is None
+                else executor.submit(
+                    runStation, path_legacy, strStation, dictOptions, dictCheckpoint
+                )
+            ): strStation
+            for strStation in listStations
+        }
+        for future in concurrent.futures.as_completed(dictFutures):
+            strStation = dictFutures[future]
+            try:
+                dictResult = future.result()
+            except Exception as e:
+                # the worker process itself died (e.g. killed for memory)
+                dictResult = {
+                    "station": strStation,
+                    "status": "error",
+                    "seconds": None,
+                    "error": f"{type(e).__name__}: {e}",
+                }
+            dictResults[strStation] = dictResult
+            if fnReport is not None:
+                fnReport(dictResult)
+
+    return [dictResults[strStation] for strStation in listStations]
+
+
+def mergeDuplicates(path_legacy, listStations):
+    # the _duplicates side files that dedup leaves next to each station's
+    # inputs, merged into one file per input file type with the station name
+    # first, e.g. legacy/obs_hrly_duplicates.csv; returns the paths written
+    listPaths = []
+    for strFile, strPathKey in (
+        ("obs_hrly", "path_obs_hrly"),
+        ("obs_hrly_derived", "path_derived_hrly"),
+        ("obs_dyly", "path_obs_dyly"),
+        ("obs_dyly_derived", "path_derived_dyly"),
+    ):
+        listHeader = None
+        listRows = []
+        for strStation in listStations:
+            path_duplicates = getDuplicatesPath(
+                getStationPaths(path_legacy, strStation)[strPathKey]
+            )
+            if not os.path.exists(path_duplicates):
+                continue
+            with open(path_duplicates, "r", newline="") as csvfile:
+                reader = csv.reader(csvfile)
+                listHeader = ["station_name"] + next(reader, [])
+                listRows.extend([strStation] + row for row in reader)
+        if listHeader is None:
+            continue
+
+        path_merged = os.path.join(path_legacy, f"{strFile}_duplicates.csv")
+        with openAtomic(path_merged) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(listHeader)
+            writer.writerows(listRows)
+        listPaths.append(path_merged)
+
+    return listPaths
+
+
+def repackLegacy(path_legacy, listStations, path_out):
+    # A copy of the zip archive path_legacy is in, written to path_out with
+    # the _updated outputs of listStations in place of their original
+    # derived files, as run.R leaves legacy/ before zipping it; returns the
+    # members written
+    path_archive = splitArchivePath(path_legacy)[0]
+    dictMembers = {}
+    for strStation in listStations:
+        dictPaths = getStationPaths(path_legacy, strStation)
+        for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+            strMember = splitArchivePath(dictPaths[strPathKey])[1]
+            dictMembers[strMember] = None
+            dictMembers[getUpdatedPath(strMember)] = getUpdatedPath(
+                dictPaths[strPathKey]
+            )
+
+    return repackArchive(path_archive, path_out, dictMembers)
+
+
+def sumProfiles(listResults):
+    # the stage and function totals of every station's profile; peak RSS is
+    # the highest of any one station, since each ran in its own process
+    dictTotal = {"seconds": 0.0, "peak_rss_mb": None, "stages": {}, "functions": {}}
+    for dictResult in listResults:
+        dictProfile = dictResult.get("profile")
+        if dictProfile is None:
+            continue
+        dictTotal["seconds"] += dictProfile["seconds"]
+        if dictProfile["peak_rss_mb"] is not None:
+            dictTotal["peak_rss_mb"] = max(
+                dictTotal["peak_rss_mb"] or 0, dictProfile["peak_rss_mb"]
+            )
+        for strKind in ("stages", "functions"):
+            for strName, dictCounts in dictProfile[strKind].items():
+                dictSum = dictTotal[strKind].setdefault(strName, {})
+                for strCount, value in dictCounts.items():
+                    if strCount == "peak_rss_mb":
+                        continue
+                    dictSum[strCount] = round(dictSum.get(strCount, 0) + value, 4)
+    dictTotal["seconds"] = round(dictTotal["seconds"], 4)
+
+    return dictTotal
+
+
+def printProfile(dictTotal):
+    # slowest stages and functions first
+    print(f"profile: {dictTotal['seconds']}s in updateDerived()")
+    for strKind in ("stages", "functions"):
+        for strName, dictCounts in sorted(
+            dictTotal[strKind].items(), key=lambda item: -item[1]["seconds"]
+        ):
+            strRows = f", {dictCounts['rows']} rows" if dictCounts.get("rows") else ""
+            print(
+                f"  {strName}: {dictCounts['seconds']}s, "
+                f"{dictCounts['calls']} calls{strRows}"
+            )
+
+
+def sumValidations(listResults):
+    # the check totals of every station's validation
+    dictTotal = {}
+    for dictResult in listResults:
+        dictValidation = dictResult.get("validation")
+        if dictValidation is None:
+            continue
+        for strCheck, dictCounts in dictValidation["checks"].items():
+            dictSum = dictTotal.setdefault(
+                strCheck,
+                {"stations": 0, "compared": 0, "breaches": 0, "max_abs_diff": 0.0},
+            )
+            dictSum["stations"] += 1
+            dictSum["compared"] += dictCounts["compared"]
+            dictSum["breaches"] += dictCounts["breaches"]
+            dictSum["max_abs_diff"] = max(
+                dictSum["max_abs_diff"], dictCounts["max_abs_diff"]
+            )
+
+    return dictTotal
+
+
+def printResult(dictResult):
+    if dictResult["status"] == "ok":
+        intUnmatched = sum(
+            dictJoin["unmatched"]
+            for dictJoin in dictResult.get("unmatched", {}).values()
+        )
+        intBreaches = sum(
+            dictCounts["breaches"]
+            for dictCounts in dictResult.get("validation", {"checks": {}})[
+                "checks"
+            ].values()
+        )
+        listStages = [
+            strStage
+            for strStage, strStatus in dictResult.get("stages", {}).items()
+            if strStatus == "done"
+        ]
+        print(
+            f"{dictResult['station']}: ok ({dictResult['seconds']}s)"
+            + (f", {intUnmatched} unmatched keys" if intUnmatched else "")
+            + (f", {intBreaches} days off" if intBreaches else "")
+            + (
+                f", ran {', '.join(listStages)}"
+                if listStages
+                else ", already done" if "stages" in dictResult else ""
+            ),
+            flush=True,
+        )
+    else:
+        print(
+            f"{dictResult['station']}: {dictResult['status']} - {dictResult['error']}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Run updateDerived() for every station in the station list"
+    )
+    parser.add_argument("legacy", help="directory with the scraped legacy CSVs")
+    parser.add_argument("station_list", help="e.g. azmet-station-list.csv")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per CPU)",
+    )
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only recalculate days whose input rows changed since the last "
+        "incremental run",
+    )
+    parser.add_argument(
+        "--parquet",
+        dest="path_parquet",
+        help="also write the _updated outputs as Parquet datasets under this "
+        "directory, partitioned by station and year",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_POLICIES,
+        help="first rewrite each station's inputs with one row per hour or day, "
+        "keeping the first or last copy of a duplicated key, the copy with the "
+        "fewest missing values (complete), or none of them (drop); every copy "
+        "goes in a _duplicates file, merged across stations at the end",
+    )
+    parser.add_argument(
+        "--shard-years",
+        type=int,
+        help="split each station into shards of this many years that run in "
+        "their own processes, so a long station doesn't hold up the batch",
+    )
+    parser.add_argument(
+        "--shard-processes",
+        type=int,
+        default=None,
+        help="with --shard-years, number of processes per station (default: "
+        "one per CPU)",
+    )
+    parser.add_argument(
+        "--missing-sentinel",
+        action="append",
+        dest="missing_sentinels",
+        help="value to treat as missing; repeat for more than one "
+        f"(default: {', '.join(repr(strValue) for strValue in MISSING_SENTINELS)})",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time each stage of updateDerived() and count calls to the "
+        "calculation functions; per-station and total profiles go in --report",
+    )
+    parser.add_argument("--report", help="write per-station results to this JSON file")
+    parser.add_argument(
+        "--journal",
+        help="run each station as journalled stages (fetch, parse, dedup, derive, "
+        "validate, write) and resume at the first unfinished one from this journal",
+    )
+    parser.add_argument(
+        "--raw",
+        dest="path_raw",
+        help="with --journal, first fetch the station's raw files into this "
+        "cache, as fetchLegacyData.py does; with --validate, check the heat "
+        "units of the raw daily files in it",
+    )
+    parser.add_argument(
+        "--years", type=int, nargs=2, default=YEARS, metavar=("START", "END")
+    )
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument(
+        "--parse-command",
+        help="with --journal, shell command that writes a station's four input "
+        "CSVs, formatted with {station}, {snake_station}, {legacy} and {raw}; "
+        "without it the inputs must already be there",
+    )
+    parser.add_argument(
+        "--delete-originals",
+        action="store_true",
+        help="with --journal, delete each station's original derived CSVs once "
+        "their _updated versions are verified",
+    )
+    parser.add_argument(
+        "--repack",
+        dest="path_repack",
+        help="with the legacy directory in a zip archive (e.g. "
+        "azmet_legacy_1987-2019.zip/legacy), write a copy of the archive to this "
+        "path with the _updated files of the stations that succeeded in place "
+        "of their original derived files",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="check each station's _updated files against the legacy values "
+        f"({', '.join(VALIDATION_TOLERANCES)}) and fail it if too many are off",
+    )
+    parser.add_argument(
+        "--tolerance",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("CHECK", "VALUE"),
+        help="with --validate, largest difference of a check that isn't a "
+        "breach; repeat for more than one (default: "
+        + ", ".join(
+            f"{strCheck} {fltTolerance:g}"
+            for strCheck, fltTolerance in VALIDATION_TOLERANCES.items()
+        )
+        + ")",
+    )
+    parser.add_argument(
+        "--max-breaches",
+        type=float,
+        default=0.01,
+        help="with --validate, fraction of a check's days that may be off by "
+        "more than its tolerance (default: 0.01)",
+    )
+    args = parser.parse_args(listArgs)
+    if args.incremental and (args.streaming or args.backend != "python"):
+        parser.error(
+            "--incremental can't be combined with --streaming or --backend numpy"
+        )
+    if args.shard_years is not None and (args.incremental or args.shard_years < 1):
+        parser.error(
+            "--shard-years must be at least 1 and can't be combined with --incremental"
+        )
+    if args.shard_processes is not None and args.shard_years is None:
+        parser.error("--shard-processes needs --shard-years")
+    if not args.journal and (args.parse_command or args.delete_originals):
+        parser.error("--parse-command and --delete-originals need --journal")
+    if args.path_raw and not (args.journal or args.validate):
+        parser.error("--raw needs --journal or --validate")
+    if args.path_repack and splitArchivePath(args.legacy)[1] is None:
+        parser.error("--repack needs a legacy directory in a zip archive")
+    for strCheck, _ in args.tolerance:
+        if strCheck not in VALIDATION_TOLERANCES:
+            parser.error(
+                f"no check {strCheck}, only {', '.join(VALIDATION_TOLERANCES)}"
+            )
+
+    fltStart = time.perf_counter()
+    listResults = runBatch(
+        args.legacy,
+        args.station_list,
+        intProcesses=args.processes,
+        dictOptions={
+            "backend": args.backend,
+            "streaming": args.streaming,
+            "incremental": args.incremental,
+            "path_parquet": args.path_parquet,
+            "path_schema": SCHEMA_FILE,
+            "missing_sentinels": args.missing_sentinels or MISSING_SENTINELS,
+            "profile": args.profile,
+            "dedup": args.dedup,
+            "shard_years": args.shard_years,
+            "shard_processes": args.shard_processes,
+            "validate": (
+                {
+                    "path_raw": args.path_raw,
+                    "path_station_list": args.station_list,
+                    "tolerances": {
+                        strCheck: float(strValue)
+                        for strCheck, strValue in args.tolerance
+                    },
+                    "max_breaches": args.max_breaches,
+                }
+                if args.validate
+                else None
+            ),
+        },
+        fnReport=printResult,
+        dictCheckpoint=(
+            None
+            if args.journal is None
+            else {
+                "path_journal": args.journal,
+                "path_raw": args.path_raw,
+                "years": args.years,
+                "base_url": args.base_url,
+                "parse_command": args.parse_command,
+                "delete_originals": args.delete_originals,
+            }
+        ),
+    )
+    fltSeconds = round(time.perf_counter() - fltStart, 3)
+
+    intFailed = sum(dictResult["status"] != "ok" for dictResult in listResults)
+    print(
+        f"{len(listResults) - intFailed} of {len(listResults)} stations updated "
+        f"in {fltSeconds}s"
+    )
+    dictReport = {"seconds": fltSeconds, "stations": listResults}
+    if args.dedup:
+        for path_merged in mergeDuplicates(
+            args.legacy, readStationList(args.station_list)
+        ):
+            print(f"duplicates: {path_merged}")
+    if args.path_repack:
+        listMembers = repackLegacy(
+            args.legacy,
+            [
+                dictResult["station"]
+                for dictResult in listResults
+                if dictResult["status"] == "ok"
+            ],
+            args.path_repack,
+        )
+        print(f"repacked: {args.path_repack}, {len(listMembers)} files")
+    if args.validate:
+        dictReport["validation"] = sumValidations(listResults)
+        for strCheck, dictSum in dictReport["validation"].items():
+            print(
+                f"{strCheck}: {dictSum['breaches']} of {dictSum['compared']} days "
+                f"off in {dictSum['stations']} stations, at most by "
+                f"{dictSum['max_abs_diff']:g}"
+            )
+    if args.profile:
+        dictReport["profile"] = sumProfiles(listResults)
+        printProfile(dictReport["profile"])
+    if args.report:
+        with open(args.report, "w") as jsonfile:
+            json.dump(dictReport, jsonfile, indent=2)
+
+    return 1 if intFailed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
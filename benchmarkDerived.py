@@ -0,0 +1,401 @@
+# Benchmark updateDerived() and the per-value functions it spends its time in,
+# on synthetic stations from generateSyntheticData.py, and write the results
+# as JSON. Each updateDerived() setup runs in a fresh worker process, so its
+# peak RSS is its own. Pass the JSON of an earlier run as --compare to see
+# what got faster or slower; the exit status is 1 if anything got worse by
+# more than --tolerance.
+#
+# python benchmarkDerived.py --stations 2 --years 1987 1996 --missing 0.02 --output bench.json
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from batchUpdateDerived import SCHEMA_FILE, getStationPaths, readStationList
+from csvParseAndProcess import (
+    DAILY_FIELDS,
+    HEAT_UNIT_THRESHOLDS,
+    HOURLY_FIELDS,
+    MissingValues,
+    calculateHeatStressCotton,
+    calculateHeatUnits,
+    getHeatUnits,
+    getPeakRss,
+    np,
+    readCsvRows,
+    roundValue,
+    roundValues,
+    updateDerived,
+)
+from generateSyntheticData import generateStations
+
+# updateDerived() options of each setup; incremental is timed on a rerun with
+# nothing changed, after an untimed first run
+CASES = {
+    "python": {},
+    "streaming": {"streaming": True},
+    "numpy": {"backend": "numpy"},
+    "incremental": {"incremental": True},
+}
+
+
+def runCase(path_legacy, listStations, dictOptions, intRepeat=3):
+    # runs in a fresh worker process: updateDerived() for every station,
+    # intRepeat times, keeping the fastest
+    fltStartRss = getPeakRss()
+    if dictOptions.get("incremental"):
+        for strStation in listStations:
+            updateDerived(
+                **getStationPaths(path_legacy, strStation),
+                **dictOptions,
+                path_schema=SCHEMA_FILE,
+            )
+
+    listSeconds = []
+    for _ in range(intRepeat):
+        fltStart = time.perf_counter()
+        for strStation in listStations:
+            updateDerived(
+                **getStationPaths(path_legacy, strStation),
+                **dictOptions,
+                path_schema=SCHEMA_FILE,
+            )
+        listSeconds.append(time.perf_counter() - fltStart)
+
+    return {
+        "seconds": round(min(listSeconds), 4),
+        "seconds_all": [round(fltSeconds, 4) for fltSeconds in listSeconds],
+        "start_rss_mb": fltStartRss,
+        "peak_rss_mb": getPeakRss(),
+    }
+
+
+def runCaseInWorker(path_legacy, listStations, dictOptions, intRepeat=3):
+    # "spawn" so the worker doesn't inherit this process's memory
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(
+            runCase, path_legacy, listStations, dictOptions, intRepeat
+        ).result()
+
+
+def timeCalls(fnCall, listArgs, intRepeat=3):
+    # the fastest of intRepeat passes of fnCall(*args) over listArgs
+    fltBest = None
+    for _ in range(intRepeat):
+        fltStart = time.perf_counter()
+        for args in listArgs:
+            fnCall(*args)
+        fltSeconds = time.perf_counter() - fltStart
+        fltBest = fltSeconds if fltBest is None else min(fltBest, fltSeconds)
+
+    return {
+        "calls": len(listArgs),
+        "seconds": round(fltBest, 6),
+        "us_per_call": round(fltBest / max(len(listArgs), 1) * 10**6, 4),
+    }
+
+
+def benchmarkFunctions(path_legacy, strStation="", intRepeat=3):
+    # time the per-value functions on one station's values, the way
+    # updateDerived() calls them
+    dictPaths = getStationPaths(path_legacy, strStation)
+    listHeader, listRows = readCsvRows(dictPaths["path_obs_hrly"])
+    listIndexes = [listHeader.index(strField) for strField in HOURLY_FIELDS]
+    listHourly = [[row[intIndex] for intIndex in listIndexes] for row in listRows]
+    listHeader, listRows = readCsvRows(dictPaths["path_obs_dyly"])
+    listIndexes = [listHeader.index(strField) for strField in DAILY_FIELDS]
+    listHeatUnits = [
+        [row[intIndex] for intIndex in listIndexes] + [strUpper, strLower]
+        for row in listRows
+        for _, _, strUpper, strLower in HEAT_UNIT_THRESHOLDS
+    ]
+
+    # heat stress comes back as a Decimal, which updateDerived() rounds as
+    # is; roundValue() is also timed on the same values as floats
+    missing = MissingValues()
+    listDecimals = []
+    for listValues in listHourly:
+        decHeatStress = calculateHeatStressCotton(*listValues)["heatStressCottonC"]
+        if decHeatStress != "-9999.0":
+            listDecimals.append(decHeatStress)
+    listFloats = [float(decHeatStress) for decHeatStress in listDecimals]
+
+    dictFunctions = {
+        "MissingValues.parse": timeCalls(
+            missing.parse,
+            [[strValue] for listValues in listHourly for strValue in listValues],
+            intRepeat,
+        ),
+        "calculateHeatStressCotton": timeCalls(
+            calculateHeatStressCotton, listHourly, intRepeat
+        ),
+        "calculateHeatUnits": timeCalls(calculateHeatUnits, listHeatUnits, intRepeat),
+        # all four thresholds at once, from the (Tmax, Tmin) cache
+        "getHeatUnits": timeCalls(
+            getHeatUnits,
+            [
+                [missing.parse(strValue) for strValue in listValues[:2]]
+                for listValues in listHeatUnits[:: len(HEAT_UNIT_THRESHOLDS)]
+            ],
+            intRepeat,
+        ),
+        "roundValue_decimal": timeCalls(
+            roundValue,
+            [[decValue, "000.0"] for decValue in listDecimals],
+            intRepeat,
+        ),
+        "roundValue_float": timeCalls(
+            roundValue,
+            [[fltValue, "000.0", "str"] for fltValue in listFloats],
+            intRepeat,
+        ),
+    }
+    if np is not None:
+        # one call for the whole column, reported per value
+        aryValues = np.array(listFloats, dtype=np.float64)
+        dictFunctions["roundValues_numpy"] = timeCalls(
+            roundValues, [[aryValues, "000.0", "str"]], intRepeat
+        )
+        dictFunctions["roundValues_numpy"]["us_per_call"] = round(
+            dictFunctions["roundValues_numpy"]["seconds"] / len(aryValues) * 10**6,
+            4,
+        )
+        dictFunctions["roundValues_numpy"]["calls"] = len(aryValues)
+
+    return dictFunctions
+
+
+def getCommit():
+    # the commit being benchmarked, if this is a git checkout
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmark(
+    path_legacy,
+    intStations=1,
+    intStartYear=1987,
+    intEndYear=1987,
+    fltMissing=0.02,
+    intSeed=0,
+    listCases=None,
+    intRepeat=3,
+    fnReport=None,
+):
+    # Generate the synthetic stations into path_legacy, then time each case
+    # and the per-value functions. Returns the results as a dict ready for
+    # json.dump(). fnReport is called with (name, result) as each case ends.
+    if listCases is None:
+        listCases = [
+            strCase for strCase in CASES if strCase != "numpy" or np is not None
+        ]
+
+    path_station_list, dictStations = generateStations(
+        path_legacy, intStations, intStartYear, intEndYear, fltMissing, intSeed
+    )
+    listStations = readStationList(path_station_list)
+    intRows = sum(sum(dictRows.values()) for dictRows in dictStations.values())
+    intHourlyRows = sum(dictRows["path_obs_hrly"] for dictRows in dictStations.values())
+
+    dictCases = {}
+    for strCase in listCases:
+        dictResult = runCaseInWorker(
+            path_legacy, listStations, CASES[strCase], intRepeat
+        )
+        dictResult["rows"] = intRows
+        dictResult["rows_per_second"] = round(intRows / dictResult["seconds"])
+        dictResult["hourly_rows_per_second"] = round(
+            intHourlyRows / dictResult["seconds"]
+        )
+        dictCases[strCase] = dictResult
+        if fnReport is not None:
+            fnReport(strCase, dictResult)
+
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": getCommit(),
+        "python": platform.python_version(),
+        "numpy": None if np is None else np.__version__,
+        "platform": platform.platform(),
+        "config": {
+            "stations": intStations,
+            "years": [intStartYear, intEndYear],
+            "missing": fltMissing,
+            "seed": intSeed,
+            "repeat": intRepeat,
+        },
+        "rows": {
+            "total": intRows,
+            "hourly": intHourlyRows,
+        },
+        "cases": dictCases,
+        "functions": benchmarkFunctions(path_legacy, listStations[0], intRepeat),
+    }
+
+
+def compareResults(dictOld, dictNew, fltTolerance=0.25):
+    # Lines describing how each measurement changed between two runs, and
+    # whether any got worse by more than fltTolerance (0.25 = 25%)
+    listLines = []
+    blnWorse = False
+
+    def addChange(strName, fltOld, fltNew, blnHigherIsBetter):
+        nonlocal blnWorse
+        if not fltOld or fltNew is None:
+            return
+        fltChange = fltNew / fltOld - 1
+        blnRegressed = (
+            fltChange < -fltTolerance if blnHigherIsBetter else fltChange > fltTolerance
+        )
+        blnWorse = blnWorse or blnRegressed
+        listLines.append(
+            f"{strName}: {fltOld} -> {fltNew} ({fltChange:+.1%})"
+            + (" REGRESSION" if blnRegressed else "")
+        )
+
+    if dictOld.get("config") != dictNew.get("config"):
+        listLines.append(
+            "warning: the runs used different --stations/--years/--missing"
+        )
+    for strCase, dictCase in dictNew["cases"].items():
+        dictOldCase = dictOld.get("cases", {}).get(strCase)
+        if dictOldCase is None:
+            continue
+        addChange(
+            f"{strCase} rows/s",
+            dictOldCase["rows_per_second"],
+            dictCase["rows_per_second"],
+            True,
+        )
+        addChange(
+            f"{strCase} peak RSS MB",
+            dictOldCase["peak_rss_mb"],
+            dictCase["peak_rss_mb"],
+            False,
+        )
+    for strFunction, dictFunction in dictNew["functions"].items():
+        dictOldFunction = dictOld.get("functions", {}).get(strFunction)
+        if dictOldFunction is None:
+            continue
+        addChange(
+            f"{strFunction} us/call",
+            dictOldFunction["us_per_call"],
+            dictFunction["us_per_call"],
+            False,
+        )
+
+    return listLines, blnWorse
+
+
+def printCase(strCase, dictResult):
+    print(
+        f"{strCase}: {dictResult['seconds']}s, {dictResult['rows_per_second']} rows/s, "
+        f"peak RSS {dictResult['peak_rss_mb']} MB",
+        flush=True,
+    )
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark updateDerived() on synthetic legacy data"
+    )
+    parser.add_argument("--stations", type=int, default=1)
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs=2,
+        default=[1987, 1990],
+        metavar=("START", "END"),
+        help="first and last year, inclusive",
+    )
+    parser.add_argument(
+        "--missing",
+        type=float,
+        default=0.02,
+        help="fraction of observed values written as missing (default: 0.02)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--case",
+        action="append",
+        dest="cases",
+        choices=list(CASES),
+        help="updateDerived() setup to time; repeat for more than one "
+        "(default: all)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="times to run each case, keeping the fastest (default: 3)",
+    )
+    parser.add_argument(
+        "--data",
+        help="directory to write the synthetic CSVs to and keep "
+        "(default: a temporary directory)",
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", help="JSON file of an earlier run to compare the results with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="with --compare, the relative change that counts as a regression "
+        "(default: 0.25)",
+    )
+    args = parser.parse_args(listArgs)
+    if "numpy" in (args.cases or []) and np is None:
+        parser.error("--case numpy needs numpy")
+
+    with tempfile.TemporaryDirectory() as path_temp:
+        dictResults = runBenchmark(
+            args.data or path_temp,
+            args.stations,
+            args.years[0],
+            args.years[1],
+            args.missing,
+            args.seed,
+            args.cases,
+            args.repeat,
+            fnReport=printCase,
+        )
+    for strFunction, dictFunction in dictResults["functions"].items():
+        print(f"{strFunction}: {dictFunction['us_per_call']} us/call")
+
+    if args.output:
+        with open(args.output, "w") as jsonfile:
+            json.dump(dictResults, jsonfile, indent=2)
+
+    if args.compare:
+        with open(args.compare) as jsonfile:
+            listLines, blnWorse = compareResults(
+                json.load(jsonfile), dictResults, args.tolerance
+            )
+        print("\n".join(listLines))
+        return 1 if blnWorse else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,171 @@
 # author: Matt Harmon
 # modified by: Eric Scott
 
+import collections
+import contextlib
 import csv
 import decimal
+import functools
+import gzip
+import hashlib
+import io
+import json
 from decimal import Decimal, ROUND_HALF_UP, ROUND_HALF_DOWN
 import math
+import mmap
+import os
 import re
+import shutil
+import time
+import zipfile
+
+try:
+    import resource
+except ImportError:  # not on Windows, where peak memory isn't profiled
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:  # only needed for backend = "numpy"
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as pads
+except ImportError:  # only needed for Parquet output and zstd files
+    pa = None
+
+
+# The legacy files flag missing values with sentinels instead of leaving them
+# empty, and readr writes NA for anything it couldn't parse
+MISSING_SENTINELS = ("-7999", "-6999", "-9999.0", "-9999", "NA", "")
+
+
+class MissingValues:
+    # Parses numeric fields into floats, with NaN for any value that is one of
+    # the sentinel strings, and counts how many values of each field were
+    # parsed and how many of those were treated as missing
+
+    def __init__(self, listSentinels=MISSING_SENTINELS):
+        self.setSentinels = frozenset(listSentinels)
+        self.dictParsed = collections.Counter()
+        self.dictParsedRows = collections.Counter()  # parsed by parseRow()
+        self.dictMissing = collections.Counter()
+
+    def isMissing(self, strValue=""):
+        return strValue in self.setSentinels
+
+    def parse(self, strValue="", strField=""):
+        self.dictParsed[strField] += 1
+        if strValue in self.setSentinels:
+            self.dictMissing[strField] += 1
+            return math.nan
+
+        return float(strValue)
+
+    def parseRow(self, row, listFields, listIndexes=None):
+        # the listed fields of a csv.DictReader row as floats, in order; or of
+        # a csv.reader row, with the index of each field in listIndexes
+        listValues = []
+        for strField, key in zip(listFields, listIndexes or listFields):
+            strValue = row[key]
+            if strValue in self.setSentinels:
+                self.dictMissing[strField] += 1
+                listValues.append(math.nan)
+            else:
+                listValues.append(float(strValue))
+        self.dictParsedRows[tuple(listFields)] += 1
+
+        return listValues
+
+    def countArray(self, strField, aryMissing, aryCounted=None):
+        # counts a column's values, or just those where aryCounted is true
+        # (e.g. the rows with a valid key, as parseRow() only sees those)
+        if aryCounted is not None:
+            aryMissing = aryMissing[aryCounted]
+        self.dictParsed[strField] += len(aryMissing)
+        self.dictMissing[strField] += int(np.count_nonzero(aryMissing))
+
+    def parseArray(self, listStrValues, strField="", aryCounted=None):
+        # a whole column -> (float array with NaN for missing, missing mask);
+        # aryCounted as in countArray()
+        listStrValues = list(listStrValues)
+        intCount = len(listStrValues)
+        aryMissing = np.fromiter(
+            map(self.setSentinels.__contains__, listStrValues),
+            dtype=bool,
+            count=intCount,
+        )
+        aryFltValues = np.fromiter(
+            (
+                math.nan if blnMissing else float(strValue)
+                for strValue, blnMissing in zip(listStrValues, aryMissing.tolist())
+            ),
+            dtype=np.float64,
+            count=intCount,
+        )
+        self.countArray(strField, aryMissing, aryCounted)
+
+        return aryFltValues, aryMissing | np.isnan(aryFltValues)
+
+    def parseBytes(self, aryBytes, strField="", aryCounted=None):
+        # parseArray() for a NumPy bytes array, e.g. a column from
+        # iterCsvColumns()
+        aryMissing = np.isin(
+            aryBytes, [strValue.encode() for strValue in self.setSentinels]
+        )
+        try:
+            aryFltValues = np.where(aryMissing, b"nan", aryBytes).astype(np.float64)
+        except ValueError:
+            # raise the same error float() would
+            return self.parseArray(
+                [bytValue.decode() for bytValue in aryBytes.tolist()],
+                strField,
+                aryCounted,
+            )
+        self.countArray(strField, aryMissing, aryCounted)
+
+        return aryFltValues, aryMissing | np.isnan(aryFltValues)
+
+    def parseNumbers(self, aryValues, strField="", aryCounted=None):
+        # parseArray() for a column that is already numeric, e.g. an R double
+        # column handed over by reticulate or Arrow, with NaN for NA; a value
+        # equal to a numeric sentinel, like -7999, is missing too
+        aryFltValues = np.asarray(aryValues, dtype=np.float64)
+        listNumbers = []
+        for strValue in self.setSentinels:
+            try:
+                listNumbers.append(float(strValue))
+            except ValueError:
+                continue
+        aryMissing = np.isnan(aryFltValues) | np.isin(aryFltValues, listNumbers)
+        self.countArray(strField, aryMissing, aryCounted)
+
+        return np.where(aryMissing, np.nan, aryFltValues), aryMissing
+
+    def getCounts(self):
+        # {field: {"parsed": n, "missing": n}}
+        dictParsed = collections.Counter(self.dictParsed)
+        for tplFields, intRows in self.dictParsedRows.items():
+            for strField in tplFields:
+                dictParsed[strField] += intRows
+
+        return {
+            strField: {"parsed": intParsed, "missing": self.dictMissing[strField]}
+            for strField, intParsed in dictParsed.items()
+        }
+
+    def addCounts(self, dictCounts):
+        # adds the getCounts() of another MissingValues, e.g. of one run in
+        # another process
+        for strField, dictField in dictCounts.items():
+            self.dictParsed[strField] += dictField["parsed"]
+            self.dictMissing[strField] += dictField["missing"]
+
+
+defaultMissingValues = MissingValues()
 
 
 def convertCelsiusToFahrenheit(strDegCelsius=""):
@@ -16,10 +176,67 @@ def convertCelsiusToFahrenheit(strDegCelsius=""):
     return fltDegF
 
 
+@functools.lru_cache(maxsize=None)
+def getQuantizer(strExp="1"):
+    # the Decimal to quantize() to for a roundValue() exponent, and its number
+    # of decimal places, e.g. "000.0" -> (Decimal("0.0"), 1)
+    decExp = decimal.Decimal(strExp)
+
+    return decExp, -decExp.as_tuple().exponent
+
+
+def roundFloatScaled(fltValue=0.0, intPlaces=0):
+    # abs(fltValue) rounded half up to intPlaces places, on its exact binary
+    # value, as an integer scaled by 10**intPlaces. Only for finite values
+    # small enough that the scaled value is exact in a float's 53 bits.
+    fltAbs = abs(fltValue)
+    fltScaled = fltAbs * 10**intPlaces
+    intFloor = math.floor(fltScaled)
+    fltFraction = fltScaled - intFloor
+
+    # the scaling multiply is off by at most half an ulp, which only matters
+    # for values sitting right on a tie (with no places there is no multiply)
+    if intPlaces and abs(fltFraction - 0.5) <= 4 * math.ulp(fltScaled):
+        intNumerator, intDenominator = fltAbs.as_integer_ratio()
+        return (2 * intNumerator * 10**intPlaces + intDenominator) // (
+            2 * intDenominator
+        )
+
+    return intFloor + (fltFraction >= 0.5)
+
+
 def roundValue(valueToRound=0, strExp="1", strReturnType="dec"):
-    decReturnValue = decimal.Decimal(valueToRound).quantize(
-        decimal.Decimal(strExp), rounding=ROUND_HALF_UP
-    )
+    # ROUND_HALF_UP to the places of strExp, on the exact value of valueToRound
+    # (for a float, its binary value, not its repr), like Decimal.quantize().
+    # Floats that don't need to come back as a Decimal are rounded in integer
+    # arithmetic instead, with the same results.
+    decExp, intPlaces = getQuantizer(strExp)
+
+    if (
+        strReturnType != "dec"
+        and type(valueToRound) is float
+        and abs(valueToRound) < 2.0**53 / 10**intPlaces
+    ):
+        intScaled = roundFloatScaled(valueToRound, intPlaces)
+        strSign = "-" if math.copysign(1.0, valueToRound) < 0 else ""
+        if strReturnType == "int":
+            return (
+                -(intScaled // 10**intPlaces) if strSign else intScaled // 10**intPlaces
+            )
+
+        if intPlaces:
+            intScale = 10**intPlaces
+            strRounded = (
+                f"{strSign}{intScaled // intScale}.{intScaled % intScale:0{intPlaces}d}"
+            )
+        else:
+            strRounded = f"{strSign}{intScaled}"
+
+        return float(strRounded) if strReturnType == "flt" else strRounded
+
+    if not isinstance(valueToRound, decimal.Decimal):
+        valueToRound = decimal.Decimal(valueToRound)
+    decReturnValue = valueToRound.quantize(decExp, rounding=ROUND_HALF_UP)
 
     if strReturnType == "flt":
         returnValue = float(decReturnValue)
@@ -33,40 +250,107 @@ def roundValue(valueToRound=0, strExp="1", strReturnType="dec"):
     return returnValue
 
 
+def roundValues(values, strExp="1", strReturnType="dec"):
+    # roundValue() for every value of a column. A float numpy array that
+    # doesn't need Decimals back is rounded in one pass with roundArray().
+    if (
+        np is None
+        or strReturnType == "dec"
+        or not isinstance(values, np.ndarray)
+        or values.dtype != np.float64
+    ):
+        return [roundValue(value, strExp, strReturnType) for value in values]
+
+    intPlaces = getPlaces(strExp)
+    # NaN, inf and values too big for int64 once scaled go through roundValue()
+    aryScalar = ~(np.abs(values) < 2.0**53 / 10**intPlaces)
+    aryIntScaled, aryNegative = roundArray(np.where(aryScalar, 0.0, values), strExp)
+    if strReturnType == "int":
+        aryIntRounded = np.abs(aryIntScaled) // 10**intPlaces
+        listRounded = np.where(aryNegative, -aryIntRounded, aryIntRounded).tolist()
+    else:
+        listRounded = formatScaled(aryIntScaled, aryNegative, intPlaces)
+        if strReturnType == "flt":
+            listRounded = [float(strRounded) for strRounded in listRounded]
+
+    for intIndex in np.flatnonzero(aryScalar).tolist():
+        listRounded[intIndex] = roundValue(
+            float(values[intIndex]), strExp, strReturnType
+        )
+
+    return listRounded
+
+
+def roundFloatToScaled(fltValue=0.0, intPlaces=0):
+    # roundValue(fltValue, places) as (an integer scaled by 10**intPlaces, and
+    # whether it is negative, which is the only sign a "-0.0" has)
+    blnNegative = math.copysign(1.0, fltValue) < 0
+    if abs(fltValue) < 2.0**53 / 10**intPlaces:
+        intAbs = roundFloatScaled(fltValue, intPlaces)
+    else:
+        # too big for roundFloatScaled(), e.g. from a garbled input
+        decRounded = roundValue(fltValue, str(decimal.Decimal(1).scaleb(-intPlaces)))
+        intAbs = abs(int(decRounded.scaleb(intPlaces)))
+
+    return (-intAbs if blnNegative else intAbs), blnNegative
+
+
+def roundScaledValue(intScaled=0, intPlaces=0, strExp="1"):
+    # roundScaledArray() for one value: abs(intScaled), a value with intPlaces
+    # places, rounded half up to the places of strExp (and still scaled)
+    intDivisor = 10 ** (intPlaces - getPlaces(strExp))
+
+    return (abs(intScaled) + intDivisor // 2) // intDivisor
+
+
+def formatScaledValue(intScaled=0, intPlaces=0, blnNegative=None):
+    # formatScaled() for one value; blnNegative gives the sign of a zero
+    if blnNegative is None:
+        blnNegative = intScaled < 0
+    intAbs = abs(intScaled)
+    strSign = "-" if blnNegative else ""
+    if not intPlaces:
+        return f"{strSign}{intAbs}"
+    intScale = 10**intPlaces
+
+    return f"{strSign}{intAbs // intScale}.{intAbs % intScale:0{intPlaces}d}"
+
+
 def calculateHeatStressCotton(
-    strTempAir="", strRelativeHumdity="", strVaporPressureDeficit="", strSolarRad=""
+    strTempAir="",
+    strRelativeHumdity="",
+    strVaporPressureDeficit="",
+    strSolarRad="",
+    missing=None,
 ):
     # Calculate Heat Stress Values for Cotton
+    if missing is None:
+        missing = defaultMissingValues
+
+    return calculateHeatStressCottonFromFloats(
+        missing.parse(strTempAir),
+        missing.parse(strRelativeHumdity),
+        missing.parse(strVaporPressureDeficit),
+        missing.parse(strSolarRad),
+    )
+
+
+def calculateHeatStressCottonFromFloats(
+    fltTempAir=math.nan,
+    fltRelativeHumdity=math.nan,
+    fltVaporPressureDeficit=math.nan,
+    fltSolarRad=math.nan,
+):
+    # calculateHeatStressCotton for values already parsed by MissingValues
     dictReturn = {}
     fltHeatStressCottonC = 0.000
     fltHeatStressCottonF = 0.000
-    if (
-        (
-            (strTempAir != "-7999")
-            and (strTempAir != "-6999")
-            and (strTempAir != "-9999.0")
-        )
-        and (
-            (strRelativeHumdity != "-7999")
-            and (strRelativeHumdity != "-6999")
-            and (strRelativeHumdity != "-9999.0")
-        )
-        and (
-            (strVaporPressureDeficit != "-7999")
-            and (strVaporPressureDeficit != "-6999")
-            and (strVaporPressureDeficit != "-9999.0")
-        )
-        and (
-            (strSolarRad != "-7999")
-            and (strSolarRad != "-6999")
-            and (strSolarRad != "-9999.0")
-        )
+    if not (
+        math.isnan(fltTempAir)
+        or math.isnan(fltRelativeHumdity)
+        or math.isnan(fltVaporPressureDeficit)
+        or math.isnan(fltSolarRad)
     ):
-        fltTempAir = float(decimal.Decimal(strTempAir))
-        fltSolarRad = float(decimal.Decimal(strSolarRad))
-        fltRelativeHumdity = float(decimal.Decimal(strRelativeHumdity))
-        fltVaporPressureDeficit = float(decimal.Decimal(strVaporPressureDeficit))
-
         fltEx = math.exp((17.27 * fltTempAir) / (237.2 + fltTempAir))
         fltEa = fltRelativeHumdity / 100 * 0.6108 * fltEx
 
@@ -90,6 +374,40 @@ def calculateHeatStressCotton(
     return dictReturn
 
 
+def calculateHeatStressCottonScaled(
+    fltTempAir=math.nan,
+    fltRelativeHumdity=math.nan,
+    fltVaporPressureDeficit=math.nan,
+    fltSolarRad=math.nan,
+):
+    # calculateHeatStressCottonFromFloats with each value as roundFloatToScaled()
+    # to 7 places, i.e. (C, C negative, F, F negative), instead of a Decimal;
+    # C and F are None when a field is missing
+    if (
+        math.isnan(fltTempAir)
+        or math.isnan(fltRelativeHumdity)
+        or math.isnan(fltVaporPressureDeficit)
+        or math.isnan(fltSolarRad)
+    ):
+        return None, True, None, True
+
+    fltEx = math.exp((17.27 * fltTempAir) / (237.2 + fltTempAir))
+    fltEa = fltRelativeHumdity / 100 * 0.6108 * fltEx
+    if fltSolarRad > 0:
+        fltHeatStressCottonC = 0.53 + fltTempAir - 1.43 * fltVaporPressureDeficit
+    else:
+        fltHeatStressCottonC = -5.93 + fltTempAir + 1.95 * fltEa
+    intC, blnNegativeC = roundFloatToScaled(fltHeatStressCottonC, 7)
+
+    # float() of the rounded Decimal, as convertCelsiusToFahrenheit() does
+    fltHeatStressCottonC = abs(intC) / 10**7
+    if blnNegativeC:
+        fltHeatStressCottonC = -fltHeatStressCottonC
+    intF, blnNegativeF = roundFloatToScaled(fltHeatStressCottonC * 1.8 + 32.0, 7)
+
+    return intC, blnNegativeC, intF, blnNegativeF
+
+
 def convertHeatUnitCelsiusToHeatUnitFahrenheit(strHUCelsius=""):
     ## convert Celsius heat units to Fahrenheit heat units
     decHUCelsius = decimal.Decimal(strHUCelsius)
@@ -98,140 +416,144 @@ def convertHeatUnitCelsiusToHeatUnitFahrenheit(strHUCelsius=""):
     return fltHUF
 
 
+# 'SI' sine wave table from the legacy BASIC heat unit routine
+aryFltSine = [
+    1.000,
+    0.981,
+    0.962,
+    0.944,
+    0.927,
+    0.910,
+    0.893,
+    0.876,
+    0.859,
+    0.843,
+    0.827,
+    0.811,
+    0.796,
+    0.780,
+    0.765,
+    0.750,
+    0.735,
+    0.721,
+    0.706,
+    0.692,
+    0.678,
+    0.664,
+    0.650,
+    0.636,
+    0.622,
+    0.609,
+    0.596,
+    0.583,
+    0.570,
+    0.557,
+    0.544,
+    0.532,
+    0.519,
+    0.507,
+    0.495,
+    0.483,
+    0.471,
+    0.459,
+    0.448,
+    0.436,
+    0.425,
+    0.413,
+    0.402,
+    0.391,
+    0.381,
+    0.370,
+    0.359,
+    0.349,
+    0.339,
+    0.328,
+    0.318,
+    0.308,
+    0.299,
+    0.289,
+    0.279,
+    0.270,
+    0.261,
+    0.251,
+    0.242,
+    0.233,
+    0.225,
+    0.216,
+    0.208,
+    0.199,
+    0.191,
+    0.183,
+    0.175,
+    0.167,
+    0.159,
+    0.152,
+    0.144,
+    0.137,
+    0.130,
+    0.123,
+    0.116,
+    0.109,
+    0.102,
+    0.096,
+    0.090,
+    0.084,
+    0.078,
+    0.072,
+    0.066,
+    0.061,
+    0.055,
+    0.050,
+    0.045,
+    0.040,
+    0.036,
+    0.031,
+    0.027,
+    0.023,
+    0.019,
+    0.016,
+    0.013,
+    0.010,
+    0.007,
+    0.004,
+    0.002,
+    0.001,
+    0.000,
+]
+
+
 def calculateHeatUnits(
-    strTempAirMax="", strTempAirMin="", strTempAirUpper="", strTempAirLower=""
+    strTempAirMax="",
+    strTempAirMin="",
+    strTempAirUpper="",
+    strTempAirLower="",
+    missing=None,
 ):
-    dictReturn = {}
-    aryFltSine = [
-        1.000,
-        0.981,
-        0.962,
-        0.944,
-        0.927,
-        0.910,
-        0.893,
-        0.876,
-        0.859,
-        0.843,
-        0.827,
-        0.811,
-        0.796,
-        0.780,
-        0.765,
-        0.750,
-        0.735,
-        0.721,
-        0.706,
-        0.692,
-        0.678,
-        0.664,
-        0.650,
-        0.636,
-        0.622,
-        0.609,
-        0.596,
-        0.583,
-        0.570,
-        0.557,
-        0.544,
-        0.532,
-        0.519,
-        0.507,
-        0.495,
-        0.483,
-        0.471,
-        0.459,
-        0.448,
-        0.436,
-        0.425,
-        0.413,
-        0.402,
-        0.391,
-        0.381,
-        0.370,
-        0.359,
-        0.349,
-        0.339,
-        0.328,
-        0.318,
-        0.308,
-        0.299,
-        0.289,
-        0.279,
-        0.270,
-        0.261,
-        0.251,
-        0.242,
-        0.233,
-        0.225,
-        0.216,
-        0.208,
-        0.199,
-        0.191,
-        0.183,
-        0.175,
-        0.167,
-        0.159,
-        0.152,
-        0.144,
-        0.137,
-        0.130,
-        0.123,
-        0.116,
-        0.109,
-        0.102,
-        0.096,
-        0.090,
-        0.084,
-        0.078,
-        0.072,
-        0.066,
-        0.061,
-        0.055,
-        0.050,
-        0.045,
-        0.040,
-        0.036,
-        0.031,
-        0.027,
-        0.023,
-        0.019,
-        0.016,
-        0.013,
-        0.010,
-        0.007,
-        0.004,
-        0.002,
-        0.001,
-        0.000,
-    ]
+    if missing is None:
+        missing = defaultMissingValues
 
-    if (
-        (
-            (strTempAirMax != "-7999")
-            and (strTempAirMax != "-6999")
-            and (strTempAirMax != "-9999.0")
-        )
-        and (
-            (strTempAirMin != "-7999")
-            and (strTempAirMin != "-6999")
-            and (strTempAirMin != "-9999.0")
-        )
-        and (
-            (strTempAirUpper != "-7999")
-            and (strTempAirUpper != "-6999")
-            and (strTempAirUpper != "-9999.0")
-        )
-        and (
-            (strTempAirLower != "-7999")
-            and (strTempAirLower != "-6999")
-            and (strTempAirLower != "-9999.0")
-        )
+    return calculateHeatUnitsFromFloats(
+        missing.parse(strTempAirMax),
+        missing.parse(strTempAirMin),
+        missing.parse(strTempAirUpper),
+        missing.parse(strTempAirLower),
+    )
+
+
+def calculateHeatUnitsFromFloats(
+    fltTempAirMax=math.nan,
+    fltTempAirMin=math.nan,
+    fltTempAirUpper=math.nan,
+    fltTempAirLower=math.nan,
+):
+    # calculateHeatUnits for values already parsed by MissingValues
+    dictReturn = {}
+    if not (
+        math.isnan(fltTempAirMax)
+        or math.isnan(fltTempAirMin)
+        or math.isnan(fltTempAirUpper)
+        or math.isnan(fltTempAirLower)
     ):
-        fltTempAirMax = float(decimal.Decimal(strTempAirMax))
-        fltTempAirMin = float(decimal.Decimal(strTempAirMin))
-        fltTempAirUpper = float(decimal.Decimal(strTempAirUpper))
-        fltTempAirLower = float(decimal.Decimal(strTempAirLower))
         fltHeatUnits = 0.0
         intSineWavePoint1 = 0
         intSineWavePoint2 = 0
@@ -333,302 +655,2977 @@ def calculateHeatUnits(
     return dictReturn
 
 
-def updateDerived(path_obs_hrly, path_derived_hrly, path_obs_dyly, path_derived_dyly):
-    data = []
-    dataHourly = {}
-    dataDaily = {}
-    dataHourlyOutput = []
-    dataDailyDerived = {}
-    dataHourlyDerived = {}
-    datDailyDerivedOutput = []
-    with open(path_obs_hrly, "r", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            strDailyOutputKey = row["obs_year"] + "." + row["obs_doy"]
-
-            if strDailyOutputKey not in dataDailyDerived:
-                dataDailyDerived[strDailyOutputKey] = {
-                    "obs_dyly_derived_chill_hours_0C": 0,
-                    "obs_dyly_derived_chill_hours_7C": 0,
-                    "obs_dyly_derived_chill_hours_20C": 0,
-                    "intHoursHeatStressCotton": 0,
-                    "fltAccumHeatStressC": 0.00,
-                    "fltAccumHeatStressF": 0.00,
-                    "obs_dyly_derived_heatstress_cotton_meanC": 0.00,
-                    "obs_dyly_derived_heatstress_cotton_meanF": 0.00,
-                }
+# Any file can be gzip (.gz) or zstd (.zst) compressed, by its extension, and
+# an input can be a member of a zip archive, given as the archive's path and
+# then the member's path in it, e.g.
+# azmet_legacy_1987-2019.zip/legacy/obs_hrly-tucson.csv. Files are decompressed
+# (or compressed) a buffer at a time as they are read (or written), so nothing
+# is extracted first. zstd needs pyarrow. Zip archives are only read: the
+# _updated output of a member goes where the member would have been extracted
+# to, gzip-compressed (legacy/obs_hrly_derived-tucson_updated.csv.gz next to
+# the archive), and repackArchive() writes a new archive with it.
+
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+# gzip's own default, nearly as small as 9 and several times faster to write
+GZIP_LEVEL = 6
+
+
+def splitArchivePath(strPath=""):
+    # ("azmet_legacy.zip", "legacy/obs_hrly-tucson.csv") for a member of a
+    # zip archive, (strPath, None) for any other path
+    strPath = os.fspath(strPath)
+    match = re.match(r"(.*?\.zip)[\\/](.+)$", strPath, flags=re.IGNORECASE)
+    if match is None or not os.path.isfile(match.group(1)):
+        return strPath, None
+
+    return match.group(1), match.group(2).replace("\\", "/")
+
 
-            dictHeatStress = calculateHeatStressCotton(
-                row["obs_hrly_temp_air"],
-                row["obs_hrly_relative_humidity"],
-                row["obs_hrly_vpd"],
-                row["obs_hrly_sol_rad_total"],
+def getCompression(strPath=""):
+    # "gzip" or "zstd" by the extension of strPath, None for neither
+    return COMPRESSIONS.get(os.path.splitext(os.fspath(strPath))[1].lower())
+
+
+def isFile(path):
+    # os.path.isfile(), or whether a zip archive has the member path points to
+    path_archive, strMember = splitArchivePath(path)
+    if strMember is None:
+        return os.path.isfile(path_archive)
+    with zipfile.ZipFile(path_archive) as archive:
+        return strMember in archive.NameToInfo
+
+
+def wrapCompressed(stack, file, strMode="rb", strCompression=None):
+    # file, decompressed as it is read or compressed as it is written; the
+    # ExitStack stack closes what it wraps it in
+    if strCompression == "gzip":
+        # without a name or time in the header, the same rows always
+        # compress to the same bytes
+        return stack.enter_context(
+            gzip.GzipFile(
+                filename="",
+                mode=strMode,
+                compresslevel=GZIP_LEVEL,
+                fileobj=file,
+                mtime=0,
             )
+        )
+    if strCompression == "zstd":
+        if pa is None:
+            raise ImportError("zstd compressed files require the pyarrow package")
+        if strMode == "rb":
+            file = pa.CompressedInputStream(pa.PythonFile(file, mode="r"), "zstd")
+        else:
+            file = pa.CompressedOutputStream(pa.PythonFile(file, mode="w"), "zstd")
+        return stack.enter_context(file)
+
+    return file
 
-            dataHourlyDerived[
-                row["obs_year"] + "." + row["obs_doy"] + "." + row["obs_hour"]
-            ] = {
-                "obs_hrly_derived_heatstress_cottonC": dictHeatStress[
-                    "heatStressCottonC"
-                ],
-                "obs_hrly_derived_heatstress_cottonF": dictHeatStress[
-                    "heatStressCottonF"
-                ],
-            }
 
-            dataDailyDerived[strDailyOutputKey]["intHoursHeatStressCotton"] = (
-                dataDailyDerived[strDailyOutputKey]["intHoursHeatStressCotton"] + 1
+@contextlib.contextmanager
+def openBinary(path, strMode="rb", path_compression=None):
+    # path, or the zip archive member it points to, as a binary file that is
+    # decompressed as it is read or compressed as it is written, by the
+    # extension of path_compression (path by default)
+    path_archive, strMember = splitArchivePath(path)
+    with contextlib.ExitStack() as stack:
+        if strMember is None:
+            file = stack.enter_context(open(path_archive, strMode))
+        elif strMode == "rb":
+            archive = stack.enter_context(zipfile.ZipFile(path_archive))
+            file = stack.enter_context(archive.open(strMember))
+        else:
+            raise ValueError(
+                f"can't write {path}: zip archives are only read, see repackArchive()"
             )
-            dataDailyDerived[strDailyOutputKey]["fltAccumHeatStressC"] = (
-                decimal.Decimal(
-                    dataDailyDerived[strDailyOutputKey]["fltAccumHeatStressC"]
+        yield wrapCompressed(
+            stack,
+            file,
+            strMode,
+            getCompression(path if path_compression is None else path_compression),
+        )
+
+
+@contextlib.contextmanager
+def openCsv(path, strMode="r", path_compression=None):
+    # openBinary() as text, for the csv module
+    with openBinary(path, strMode + "b", path_compression) as file, io.TextIOWrapper(
+        file, newline=""
+    ) as csvfile:
+        yield csvfile
+
+
+def repackArchive(path_archive, path_out, dictMembers=None):
+    # Write a copy of the zip archive at path_archive to path_out, a member
+    # at a time, with the members in dictMembers ({member: path}) added from
+    # the file at path (recompressed by the extension of the member), or left
+    # out where path is None. Returns the members written.
+    if dictMembers is None:
+        dictMembers = {}
+    listMembers = []
+    with zipfile.ZipFile(path_archive) as archive, openAtomic(
+        path_out, blnBinary=True
+    ) as fileOut, zipfile.ZipFile(
+        fileOut, "w", compression=zipfile.ZIP_DEFLATED
+    ) as archiveOut:
+        for info in archive.infolist():
+            if info.filename in dictMembers:
+                continue
+            with archive.open(info) as fileIn, archiveOut.open(
+                info, "w", force_zip64=True
+            ) as fileMember:
+                shutil.copyfileobj(fileIn, fileMember)
+            listMembers.append(info.filename)
+        for strMember, path in dictMembers.items():
+            if path is None:
+                continue
+            info = zipfile.ZipInfo(strMember, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with contextlib.ExitStack() as stack:
+                fileIn = stack.enter_context(openBinary(path))
+                fileMember = wrapCompressed(
+                    stack,
+                    stack.enter_context(archiveOut.open(info, "w", force_zip64=True)),
+                    "wb",
+                    getCompression(strMember),
                 )
-                + decimal.Decimal(dictHeatStress["heatStressCottonC"])
+                shutil.copyfileobj(fileIn, fileMember)
+            listMembers.append(strMember)
+
+    return listMembers
+
+
+@contextlib.contextmanager
+def openAtomic(path, blnBinary=False):
+    # Write to a temporary file next to path and rename it into place only once
+    # everything has been written, so a failed or killed run never leaves a
+    # half-written output behind; compressed by the extension of path
+    path_tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        if splitArchivePath(path)[1] is not None:
+            raise ValueError(
+                f"can't write {path}: zip archives are only read, see repackArchive()"
             )
-            dataDailyDerived[strDailyOutputKey]["fltAccumHeatStressF"] = (
-                decimal.Decimal(
-                    dataDailyDerived[strDailyOutputKey]["fltAccumHeatStressF"]
-                )
-                + decimal.Decimal(dictHeatStress["heatStressCottonF"])
+        # an archive member's output may go where nothing was extracted yet
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if blnBinary:
+            with openBinary(path_tmp, "wb", path) as file:
+                yield file
+        else:
+            with openCsv(path_tmp, "w", path) as csvfile:
+                yield csvfile
+        os.replace(path_tmp, path)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+
+
+def getUpdatedPath(strPath=""):
+    # obs_hrly_derived-tucson.csv -> obs_hrly_derived-tucson_updated.csv, and
+    # obs_hrly_derived-tucson.csv.gz -> obs_hrly_derived-tucson_updated.csv.gz;
+    # a member of a zip archive goes next to the archive, gzip-compressed
+    path_archive, strMember = splitArchivePath(strPath)
+    if strMember is not None:
+        strPath = os.path.join(os.path.dirname(path_archive), *strMember.split("/"))
+        if getCompression(strPath) is None:
+            strPath += ".gz"
+    strSuffix = ""
+    if getCompression(strPath) is not None:
+        strPath, strSuffix = os.path.splitext(strPath)
+
+    return re.sub(r"(.+)(\.\w+$)", r"\1_updated\2", strPath) + strSuffix
+
+
+class DailyAggregate:
+    # Sum, count, min and max of one column's values over a day, kept as
+    # integers scaled by 10**intPlaces, so that adding a value is exact and
+    # makes no Decimal. Missing values are counted in intMissing and left out
+    # of everything else. The get methods return strings, as
+    # format(decValue, "f") would, or None when every value was missing.
+    __slots__ = ("intPlaces", "intSum", "intCount", "intMissing", "intMin", "intMax")
+
+    def __init__(self, intPlaces=0):
+        self.intPlaces = intPlaces
+        self.intSum = 0
+        self.intCount = 0
+        self.intMissing = 0
+        self.intMin = None
+        self.intMax = None
+
+    def add(self, intScaled=None):
+        # a value scaled by 10**intPlaces, or None for a missing one
+        if intScaled is None:
+            self.intMissing += 1
+            return
+        self.intSum += intScaled
+        self.intCount += 1
+        if self.intMin is None or intScaled < self.intMin:
+            self.intMin = intScaled
+        if self.intMax is None or intScaled > self.intMax:
+            self.intMax = intScaled
+
+    def getSum(self):
+        if not self.intCount:
+            return None
+        return formatScaledValue(self.intSum, self.intPlaces)
+
+    def getMin(self):
+        if not self.intCount:
+            return None
+        return formatScaledValue(self.intMin, self.intPlaces)
+
+    def getMax(self):
+        if not self.intCount:
+            return None
+        return formatScaledValue(self.intMax, self.intPlaces)
+
+    def getMean(self, strExp="1"):
+        # the exact mean rounded half up to the places of strExp (no more
+        # than intPlaces), e.g. "-0.0" for a small negative mean
+        if not self.intCount:
+            return None
+        intPlaces = getPlaces(strExp)
+        intDivisor = self.intCount * 10 ** (self.intPlaces - intPlaces)
+        intRounded = (2 * abs(self.intSum) + intDivisor) // (2 * intDivisor)
+
+        return formatScaledValue(intRounded, intPlaces, self.intSum < 0)
+
+
+class HourlyDerived:
+    # The derived values of one hourly obs row, as calculateHeatStressCottonScaled()
+    # returns them. The in-memory backend keeps one of these for every hour
+    # of a station, so it has slots rather than a __dict__.
+    __slots__ = ("intHeatStressC", "blnNegativeC", "intHeatStressF", "blnNegativeF")
+
+    def __init__(self, intHeatStressC, blnNegativeC, intHeatStressF, blnNegativeF):
+        self.intHeatStressC = intHeatStressC
+        self.blnNegativeC = blnNegativeC
+        self.intHeatStressF = intHeatStressF
+        self.blnNegativeF = blnNegativeF
+
+
+class DailyDerived:
+    # Per-day accumulators rolled up from the hourly observations, plus the
+    # Celsius heat units of the day's daily obs row, in HEAT_UNIT_THRESHOLDS
+    # order, once accumulateDaily() has seen it. The heat stress values of
+    # the hours go into a DailyAggregate each, to 7 places.
+    __slots__ = (
+        "intChillHours0C",
+        "intChillHours7C",
+        "intChillHours20C",
+        "heatStressC",
+        "heatStressF",
+        "tplHeatUnits",
+    )
+
+    def __init__(self):
+        self.intChillHours0C = 0
+        self.intChillHours7C = 0
+        self.intChillHours20C = 0
+        self.heatStressC = DailyAggregate(7)
+        self.heatStressF = DailyAggregate(7)
+        self.tplHeatUnits = None
+
+
+# derived columns written by updateHourlyDerivedRow() and updateDailyDerivedRow(),
+# and what they get when there is nothing to calculate them from, e.g. the
+# daily heat stress mean of a day whose hours are all missing
+MISSING_DERIVED = "-9999.0"
+HOURLY_DERIVED_COLUMNS = (
+    "obs_hrly_derived_heatstress_cottonC",
+    "obs_hrly_derived_heatstress_cottonF",
+)
+DAILY_DERIVED_COLUMNS = (
+    "obs_dyly_derived_heatstress_cotton_meanC",
+    "obs_dyly_derived_heatstress_cotton_meanF",
+    "obs_dyly_derived_chill_hours_0C",
+    "obs_dyly_derived_chill_hours_7C",
+    "obs_dyly_derived_chill_hours_20C",
+    "obs_dyly_derived_chill_hours_32F",
+    "obs_dyly_derived_chill_hours_45F",
+    "obs_dyly_derived_chill_hours_68F",
+    "obs_dyly_derived_heat_units_13C",
+    "obs_dyly_derived_heat_units_55F",
+    "obs_dyly_derived_heat_units_10C",
+    "obs_dyly_derived_heat_units_50F",
+    "obs_dyly_derived_heat_units_7C",
+    "obs_dyly_derived_heat_units_45F",
+    "obs_dyly_derived_heat_units_3413C",
+    "obs_dyly_derived_heat_units_9455F",
+)
+
+
+def getColumnIndexes(listHeader, listColumns):
+    # {column: index} of listColumns in a csv.reader header, for the dictColumns
+    # of updateHourlyDerivedRow() and updateDailyDerivedRow(); empty for a file
+    # without a header, which has no rows to update
+    if not listHeader:
+        return {}
+
+    return {strColumn: listHeader.index(strColumn) for strColumn in listColumns}
+
+
+# Rows of the four files are joined on packed integer keys,
+# obs_year * 10**7 + obs_doy * 10**4 + obs_hour, e.g. 1987, "001", "0100" ->
+# 19870010100, so "1987.1" and "1987.001" are the same day. A day's key is its
+# key with obs_hour 0.
+def getObsKey(strYear="", strDoy="", strHour="0"):
+    # None when a part isn't an integer, e.g. an NA from readr
+    intDayKey = getDayPart(strYear, strDoy)
+    intHour = getHourPart(strHour)
+    if intDayKey is None or intHour is None:
+        return None
+
+    return intDayKey + intHour
+
+
+# a station has only a few thousand distinct days and 25 distinct hours, so
+# each is parsed once instead of once per row
+@functools.lru_cache(maxsize=None)
+def getDayPart(strYear="", strDoy=""):
+    try:
+        return int(strYear) * 10**7 + int(strDoy) * 10**4
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def getHourPart(strHour="0"):
+    try:
+        return int(strHour)
+    except (TypeError, ValueError):
+        return None
+
+
+def formatObsKey(intKey=0):
+    # 19870010100 -> "1987.001.0100", 19870010000 -> "1987.001" for a day
+    strKey = f"{intKey // 10**7}.{intKey // 10**4 % 1000:03d}"
+    if intKey % 10**4:
+        strKey += f".{intKey % 10**4:04d}"
+
+    return strKey
+
+
+class JoinReport:
+    # Counts the keys one file of a join has and the other doesn't, e.g.
+    # hourly obs without a matching hourly derived row, whose heat stress
+    # would otherwise be dropped without a word, and rows that can't be
+    # joined at all because their obs_year, obs_doy or obs_hour isn't a number
+
+    def __init__(self, intExamples=10):
+        self.intExamples = intExamples
+        self.dictUnmatched = collections.Counter()
+        self.dictExamples = collections.defaultdict(list)
+
+    def addUnmatched(self, strJoin="", iterKeys=()):
+        listExamples = self.dictExamples[strJoin]
+        for intKey in iterKeys:
+            self.dictUnmatched[strJoin] += 1
+            if len(listExamples) < self.intExamples:
+                listExamples.append(formatObsKey(intKey))
+
+    def compare(self, strLeft="", setLeftKeys=(), strRight="", setRightKeys=()):
+        # both directions of a join, in key order
+        self.addUnmatched(
+            f"{strLeft} without {strRight}", sorted(setLeftKeys - setRightKeys)
+        )
+        self.addUnmatched(
+            f"{strRight} without {strLeft}", sorted(setRightKeys - setLeftKeys)
+        )
+
+    def addInvalid(self, strFile="", intRows=1):
+        self.dictUnmatched[f"{strFile} rows with an invalid key"] += intRows
+
+    def getCounts(self):
+        # {join: {"unmatched": n, "examples": ["1987.001.0100", ...]}}, for the
+        # joins that had any misses
+        return {
+            strJoin: {
+                "unmatched": intUnmatched,
+                "examples": self.dictExamples.get(strJoin, []),
+            }
+            for strJoin, intUnmatched in self.dictUnmatched.items()
+            if intUnmatched
+        }
+
+    def addCounts(self, dictCounts):
+        # adds the getCounts() of another JoinReport; add them in key order to
+        # keep the examples the first ones
+        for strJoin, dictJoin in dictCounts.items():
+            self.dictUnmatched[strJoin] += dictJoin["unmatched"]
+            listExamples = self.dictExamples[strJoin]
+            listExamples.extend(
+                dictJoin["examples"][: self.intExamples - len(listExamples)]
             )
 
-            if (
-                (row["obs_hrly_temp_air"] != "-7999")
-                and (row["obs_hrly_temp_air"] != "-6999")
-                and (row["obs_hrly_temp_air"] != "-9999.0")
-            ):
-                if float(row["obs_hrly_temp_air"]) < 0.00000:
-                    dataDailyDerived[strDailyOutputKey][
-                        "obs_dyly_derived_chill_hours_0C"
-                    ] = (
-                        dataDailyDerived[strDailyOutputKey][
-                            "obs_dyly_derived_chill_hours_0C"
-                        ]
-                        + 1
-                    )
-                if float(row["obs_hrly_temp_air"]) < 7.22222:
-                    dataDailyDerived[strDailyOutputKey][
-                        "obs_dyly_derived_chill_hours_7C"
-                    ] = (
-                        dataDailyDerived[strDailyOutputKey][
-                            "obs_dyly_derived_chill_hours_7C"
-                        ]
-                        + 1
-                    )
-                if float(row["obs_hrly_temp_air"]) > 20.00000:
-                    dataDailyDerived[strDailyOutputKey][
-                        "obs_dyly_derived_chill_hours_20C"
-                    ] = (
-                        dataDailyDerived[strDailyOutputKey][
-                            "obs_dyly_derived_chill_hours_20C"
-                        ]
-                        + 1
-                    )
 
-            if strDailyOutputKey not in dataHourly:
-                dataHourly[strDailyOutputKey] = []
+# functions whose calls a ProfileReport counts and times
+PROFILED_FUNCTIONS = (
+    "roundValue",
+    "roundValues",
+    "calculateHeatStressCotton",
+    "calculateHeatStressCottonFromFloats",
+    "calculateHeatStressCottonScaled",
+    "calculateHeatStressCottonFromArrays",
+    "calculateHeatUnits",
+    "calculateHeatUnitsFromFloats",
+    "calculateHeatUnitsFromArrays",
+)
+
+
+def getPeakRss():
+    # peak resident set size of this process so far, in MB; ru_maxrss is in
+    # KB on Linux but bytes on macOS
+    if resource is None:
+        return None
+    intMaxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == "Darwin":
+        intMaxRss = intMaxRss / 1024
+
+    return round(intMaxRss / 1024, 1)
+
+
+class ProfileReport:
+    # Opt-in instrumentation for updateDerived: the time, rows and peak memory
+    # of each stage (a pass over one of the files, writing an output, the join
+    # checks), and the calls to and time spent in each of the
+    # PROFILED_FUNCTIONS. Function times include the functions they call, e.g.
+    # calculateHeatUnits includes its roundValue calls. A ProfileReport with
+    # blnEnabled False does nothing, and is what updateDerived uses by default.
+    #
+    # While it is counting calls the PROFILED_FUNCTIONS are swapped for
+    # counting wrappers in this module, so don't profile two updateDerived
+    # calls at once in the same process (separate processes are fine).
+
+    def __init__(self, blnEnabled=True):
+        self.blnEnabled = blnEnabled
+        self.fltSeconds = 0.0
+        self.dictStages = {}
+        self.dictFunctions = {}
+
+    def getStage(self, strStage=""):
+        if strStage not in self.dictStages:
+            self.dictStages[strStage] = {
+                "seconds": 0.0,
+                "calls": 0,
+                "rows": 0,
+                "peak_rss_mb": None,
+                "rss_increase_mb": 0.0,
+            }
+        return self.dictStages[strStage]
+
+    def stage(self, strStage=""):
+        # context manager timing one stage; stages that run more than once,
+        # e.g. once per day when streaming, add up
+        if not self.blnEnabled:
+            return contextlib.nullcontext()
+        return self.timeStage(strStage)
 
-            dataHourly[strDailyOutputKey].append(row)
+    @contextlib.contextmanager
+    def timeStage(self, strStage=""):
+        dictStage = self.getStage(strStage)
+        fltStartRss = getPeakRss()
+        fltStart = time.perf_counter()
+        try:
+            yield dictStage
+        finally:
+            dictStage["seconds"] += time.perf_counter() - fltStart
+            dictStage["calls"] += 1
+            fltPeakRss = getPeakRss()
+            if fltPeakRss is not None:
+                # the peak only goes up, so this is how much the stage raised it
+                dictStage["peak_rss_mb"] = fltPeakRss
+                dictStage["rss_increase_mb"] += fltPeakRss - fltStartRss
 
-    csvfile.close()
+    def addRows(self, strStage="", intRows=0):
+        if self.blnEnabled:
+            self.getStage(strStage)["rows"] += intRows
 
-    dataHourlyOutputFields = []
+    def countRows(self, strStage="", iterRows=()):
+        # iterRows, counting its rows towards strStage
+        if not self.blnEnabled:
+            return iterRows
+        return self.iterCounted(self.getStage(strStage), iterRows)
 
-    with open(path_derived_hrly, "r", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            strAccessKey = (
-                row["obs_year"] + "." + row["obs_doy"] + "." + row["obs_hour"]
+    def iterCounted(self, dictStage, iterRows):
+        for row in iterRows:
+            dictStage["rows"] += 1
+            yield row
+
+    @contextlib.contextmanager
+    def profile(self):
+        # times everything inside it, counting calls to the PROFILED_FUNCTIONS
+        if not self.blnEnabled:
+            yield self
+            return
+
+        dictGlobals = globals()
+        dictOriginals = {
+            strFunction: dictGlobals[strFunction] for strFunction in PROFILED_FUNCTIONS
+        }
+        for strFunction, fn in dictOriginals.items():
+            if strFunction not in self.dictFunctions:
+                self.dictFunctions[strFunction] = {"calls": 0, "seconds": 0.0}
+            dictGlobals[strFunction] = self.getCountingWrapper(
+                fn, self.dictFunctions[strFunction]
             )
-            dataHourlyOutputFields = list(row.keys())
-            if strAccessKey in dataHourlyDerived:
-                row["obs_hrly_derived_heatstress_cottonC"] = roundValue(
-                    dataHourlyDerived[strAccessKey][
-                        "obs_hrly_derived_heatstress_cottonC"
-                    ],
-                    "000.0",
+        fltStart = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.fltSeconds += time.perf_counter() - fltStart
+            dictGlobals.update(dictOriginals)
+
+    def getCountingWrapper(self, fn, dictFunction):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            dictFunction["calls"] += 1
+            fltStart = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dictFunction["seconds"] += time.perf_counter() - fltStart
+
+        return wrapper
+
+    def addReport(self, dictReport):
+        # adds the stages and function calls of another ProfileReport's
+        # getReport(), e.g. of one run in another process, but not its seconds,
+        # which may have overlapped with this one's
+        if not self.blnEnabled:
+            return
+        for strStage, dictCounts in dictReport["stages"].items():
+            dictStage = self.getStage(strStage)
+            for strCount in ("seconds", "calls", "rows", "rss_increase_mb"):
+                dictStage[strCount] += dictCounts[strCount]
+            if dictCounts["peak_rss_mb"] is not None:
+                dictStage["peak_rss_mb"] = max(
+                    dictStage["peak_rss_mb"] or 0, dictCounts["peak_rss_mb"]
                 )
-                row["obs_hrly_derived_heatstress_cottonF"] = roundValue(
-                    dataHourlyDerived[strAccessKey][
-                        "obs_hrly_derived_heatstress_cottonF"
-                    ],
-                    "000.0",
+        for strFunction, dictCounts in dictReport["functions"].items():
+            dictFunction = self.dictFunctions.setdefault(
+                strFunction, {"calls": 0, "seconds": 0.0}
+            )
+            dictFunction["calls"] += dictCounts["calls"]
+            dictFunction["seconds"] += dictCounts["seconds"]
+
+    def getReport(self):
+        # {"seconds": ..., "peak_rss_mb": ..., "stages": {stage: {...}},
+        # "functions": {function: {"calls": n, "seconds": ...}}}, in the order
+        # the stages first ran, and leaving out functions that weren't called
+        return {
+            "seconds": round(self.fltSeconds, 4),
+            "peak_rss_mb": getPeakRss(),
+            "stages": {
+                strStage: dict(
+                    dictStage,
+                    seconds=round(dictStage["seconds"], 4),
+                    rss_increase_mb=round(dictStage["rss_increase_mb"], 1),
                 )
+                for strStage, dictStage in self.dictStages.items()
+            },
+            "functions": {
+                strFunction: {
+                    "calls": dictFunction["calls"],
+                    "seconds": round(dictFunction["seconds"], 4),
+                }
+                for strFunction, dictFunction in self.dictFunctions.items()
+                if dictFunction["calls"]
+            },
+        }
 
-            dataHourlyOutput.append(row)
-    csvfile.close()
 
-    out_hrly = re.sub(r"(.+)(\.\w+$)", r"\1_updated\2", path_derived_hrly)
-    with open(out_hrly, "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=dataHourlyOutputFields)
-        writer.writeheader()
-        writer.writerows(dataHourlyOutput)
+# hourly obs fields used for heat stress, in calculateHeatStressCotton order
+HOURLY_FIELDS = (
+    "obs_hrly_temp_air",
+    "obs_hrly_relative_humidity",
+    "obs_hrly_vpd",
+    "obs_hrly_sol_rad_total",
+)
 
-    csvfile.close()
+# daily obs fields used for heat units, in calculateHeatUnits order; the
+# daily heat stress means come from the hours, so the daily obs means aren't
+# read
+DAILY_FIELDS = (
+    "obs_dyly_temp_air_max",
+    "obs_dyly_temp_air_min",
+)
 
-    with open(path_obs_dyly, "r", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            strOutputKey = row["obs_year"] + "." + row["obs_doy"]
+# (Celsius column, Fahrenheit column, upper threshold, lower threshold) for
+# each set of daily heat units
+HEAT_UNIT_THRESHOLDS = (
+    ("13C", "55F", "30.0", "12.7778"),
+    ("10C", "50F", "30.0", "10.0"),
+    ("7C", "45F", "30.0", "7.22222"),
+    ("3413C", "9455F", "34.4444", "12.7778"),
+)
 
-            dictHeatStress = calculateHeatStressCotton(
-                row["obs_dyly_temp_air_mean"],
-                row["obs_dyly_relative_humidity_mean"],
-                row["obs_dyly_vpd_mean"],
-                row["obs_dyly_sol_rad_total"],
-            )
+# Heat units only depend on the day's max and min temperatures, and the legacy
+# data has those to 0.1 degrees, so the same (Tmax, Tmin) pairs come up again
+# and again: a station has a few thousand distinct pairs over all its years.
+# getHeatUnits() keeps the rounded heat units of the most recent
+# HEAT_UNIT_CACHE_SIZE pairs; setHeatUnitCacheSize(0) turns the cache off.
+HEAT_UNIT_CACHE_SIZE = 2**16
 
-            dataDailyDerived[strOutputKey][
-                "obs_dyly_derived_heatstress_cotton_meanC"
-            ] = dictHeatStress["heatStressCottonC"]
-            dataDailyDerived[strOutputKey][
-                "obs_dyly_derived_heatstress_cotton_meanF"
-            ] = dictHeatStress["heatStressCottonF"]
-
-            dictHeatUnits = calculateHeatUnits(
-                row["obs_dyly_temp_air_max"],
-                row["obs_dyly_temp_air_min"],
-                "30.0",
-                "12.7778",
-            )
-            dataDailyDerived[strOutputKey]["obs_dyly_derived_heat_units_13C"] = (
-                roundValue(dictHeatUnits["fltHeatUnits"], "000.0")
-            )
-            #
-            dictHeatUnits = calculateHeatUnits(
-                row["obs_dyly_temp_air_max"],
-                row["obs_dyly_temp_air_min"],
-                "30.0",
-                "10.0",
-            )
-            dataDailyDerived[strOutputKey]["obs_dyly_derived_heat_units_10C"] = (
-                roundValue(dictHeatUnits["fltHeatUnits"], "000.0")
-            )
-            #
-            dictHeatUnits = calculateHeatUnits(
-                row["obs_dyly_temp_air_max"],
-                row["obs_dyly_temp_air_min"],
-                "30.0",
-                "7.22222",
-            )
-            dataDailyDerived[strOutputKey]["obs_dyly_derived_heat_units_7C"] = (
-                roundValue(dictHeatUnits["fltHeatUnits"], "000.0")
-            )
-            #
-            dictHeatUnits = calculateHeatUnits(
-                row["obs_dyly_temp_air_max"],
-                row["obs_dyly_temp_air_min"],
-                "34.4444",
-                "12.7778",
-            )
-            dataDailyDerived[strOutputKey]["obs_dyly_derived_heat_units_3413C"] = (
-                roundValue(dictHeatUnits["fltHeatUnits"], "000.0")
+
+def calculateHeatUnitsRounded(fltTempAirMax=math.nan, fltTempAirMin=math.nan):
+    # the "000.0" heat units for each of HEAT_UNIT_THRESHOLDS, in order
+    return tuple(
+        roundValue(
+            calculateHeatUnitsFromFloats(
+                fltTempAirMax,
+                fltTempAirMin,
+                float(strTempAirUpper),
+                float(strTempAirLower),
+            )["fltHeatUnits"],
+            "000.0",
+            "str",
+        )
+        for _, _, strTempAirUpper, strTempAirLower in HEAT_UNIT_THRESHOLDS
+    )
+
+
+def calculateHeatUnitsOnGrid(intTempAirMax=0, intTempAirMin=0):
+    # calculateHeatUnitsRounded for temperatures in tenths of a degree;
+    # intTempAirMax / 10 is exactly the float that float("25.3") parses to
+    return calculateHeatUnitsRounded(intTempAirMax / 10, intTempAirMin / 10)
+
+
+def setHeatUnitCacheSize(intSize=HEAT_UNIT_CACHE_SIZE):
+    # (re)create the getHeatUnits() cache with room for intSize (Tmax, Tmin)
+    # pairs, emptying it
+    global getHeatUnitsOnGrid
+    getHeatUnitsOnGrid = functools.lru_cache(maxsize=intSize)(calculateHeatUnitsOnGrid)
+
+
+setHeatUnitCacheSize()
+
+
+def getHeatUnits(fltTempAirMax=math.nan, fltTempAirMin=math.nan):
+    # calculateHeatUnitsRounded, looked up in the cache when both temperatures
+    # are on the 0.1 degree grid and calculated exactly when they aren't (or
+    # are missing). -0.0 and 0.0 share a key, which is safe because they give
+    # the same heat units.
+    if math.isfinite(fltTempAirMax) and math.isfinite(fltTempAirMin):
+        intTempAirMax = round(fltTempAirMax * 10)
+        intTempAirMin = round(fltTempAirMin * 10)
+        if intTempAirMax / 10 == fltTempAirMax and intTempAirMin / 10 == fltTempAirMin:
+            return getHeatUnitsOnGrid(intTempAirMax, intTempAirMin)
+
+    return calculateHeatUnitsRounded(fltTempAirMax, fltTempAirMin)
+
+
+@functools.lru_cache(maxsize=4096)
+def getHeatUnitsFahrenheit(strHeatUnitsC=""):
+    # Fahrenheit heat units from the rounded Celsius ones, which only take a
+    # few hundred distinct values
+    return roundValue(
+        convertHeatUnitCelsiusToHeatUnitFahrenheit(strHeatUnitsC), "000.0", "str"
+    )
+
+
+def accumulateHourly(dailyDerived, row, missing=None, listIndexes=None):
+    # Add one hourly obs row to its day's DailyDerived and return the
+    # HourlyDerived values for that row; listIndexes as in parseRow()
+    if missing is None:
+        missing = defaultMissingValues
+    listValues = missing.parseRow(row, HOURLY_FIELDS, listIndexes)
+    hourlyDerived = HourlyDerived(*calculateHeatStressCottonScaled(*listValues))
+    dailyDerived.heatStressC.add(hourlyDerived.intHeatStressC)
+    dailyDerived.heatStressF.add(hourlyDerived.intHeatStressF)
+
+    fltTempAir = listValues[0]
+    if not math.isnan(fltTempAir):
+        if fltTempAir < 0.00000:
+            dailyDerived.intChillHours0C += 1
+        if fltTempAir < 7.22222:
+            dailyDerived.intChillHours7C += 1
+        if fltTempAir > 20.00000:
+            dailyDerived.intChillHours20C += 1
+
+    return hourlyDerived
+
+
+def accumulateDaily(dailyDerived, row, missing=None, listIndexes=None):
+    # Add the heat units calculated from one daily obs row to that day's
+    # DailyDerived; listIndexes as in parseRow()
+    if missing is None:
+        missing = defaultMissingValues
+    listValues = missing.parseRow(row, DAILY_FIELDS, listIndexes)
+    dailyDerived.tplHeatUnits = tuple(getHeatUnits(*listValues))
+
+
+def updateHourlyDerivedRow(row, hourlyDerived, dictColumns=None):
+    # Write the recalculated heat stress values into an hourly derived row, a
+    # csv.DictReader row or, with the index of each column in dictColumns (see
+    # getColumnIndexes()), a csv.reader row
+    for strColumn, intValue, blnNegative in (
+        (
+            HOURLY_DERIVED_COLUMNS[0],
+            hourlyDerived.intHeatStressC,
+            hourlyDerived.blnNegativeC,
+        ),
+        (
+            HOURLY_DERIVED_COLUMNS[1],
+            hourlyDerived.intHeatStressF,
+            hourlyDerived.blnNegativeF,
+        ),
+    ):
+        row[strColumn if dictColumns is None else dictColumns[strColumn]] = (
+            MISSING_DERIVED
+            if intValue is None
+            else formatScaledValue(
+                roundScaledValue(intValue, 7, "000.0"), 1, blnNegative
             )
+        )
 
-    csvfile.close()
-
-    with open(path_derived_dyly, "r", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            strAccessKey = row["obs_year"] + "." + row["obs_doy"]
-            dataDailyDerivedOutputFields = list(row.keys())
-            if strAccessKey in dataDailyDerived:
-                row["obs_dyly_derived_heatstress_cotton_meanC"] = roundValue(
-                    (
-                        dataDailyDerived[strAccessKey]["fltAccumHeatStressC"]
-                        / dataDailyDerived[strAccessKey]["intHoursHeatStressCotton"]
-                    ),
-                    "000.0",
-                )
-                row["obs_dyly_derived_heatstress_cotton_meanF"] = roundValue(
-                    (
-                        dataDailyDerived[strAccessKey]["fltAccumHeatStressF"]
-                        / dataDailyDerived[strAccessKey]["intHoursHeatStressCotton"]
-                    ),
-                    "000.0",
-                )
-                #
-                row["obs_dyly_derived_chill_hours_0C"] = dataDailyDerived[strAccessKey][
-                    "obs_dyly_derived_chill_hours_0C"
-                ]
-                row["obs_dyly_derived_chill_hours_7C"] = dataDailyDerived[strAccessKey][
-                    "obs_dyly_derived_chill_hours_7C"
-                ]
-                row["obs_dyly_derived_chill_hours_20C"] = dataDailyDerived[
-                    strAccessKey
-                ]["obs_dyly_derived_chill_hours_20C"]
-                #
-                row["obs_dyly_derived_chill_hours_32F"] = dataDailyDerived[
-                    strAccessKey
-                ]["obs_dyly_derived_chill_hours_0C"]
-                row["obs_dyly_derived_chill_hours_45F"] = dataDailyDerived[
-                    strAccessKey
-                ]["obs_dyly_derived_chill_hours_7C"]
-                row["obs_dyly_derived_chill_hours_68F"] = dataDailyDerived[
-                    strAccessKey
-                ]["obs_dyly_derived_chill_hours_20C"]
-
-                row["obs_dyly_derived_heat_units_7C"] = dataDailyDerived[strAccessKey][
-                    "obs_dyly_derived_heat_units_7C"
-                ]
-                row["obs_dyly_derived_heat_units_10C"] = dataDailyDerived[strAccessKey][
-                    "obs_dyly_derived_heat_units_10C"
-                ]
-                row["obs_dyly_derived_heat_units_13C"] = dataDailyDerived[strAccessKey][
-                    "obs_dyly_derived_heat_units_13C"
-                ]
-                row["obs_dyly_derived_heat_units_3413C"] = dataDailyDerived[
-                    strAccessKey
-                ]["obs_dyly_derived_heat_units_3413C"]
-
-                row["obs_dyly_derived_heat_units_45F"] = roundValue(
-                    (
-                        convertHeatUnitCelsiusToHeatUnitFahrenheit(
-                            dataDailyDerived[strAccessKey][
-                                "obs_dyly_derived_heat_units_7C"
-                            ]
-                        )
-                    ),
-                    "000.0",
-                )
-                row["obs_dyly_derived_heat_units_50F"] = roundValue(
-                    (
-                        convertHeatUnitCelsiusToHeatUnitFahrenheit(
-                            dataDailyDerived[strAccessKey][
-                                "obs_dyly_derived_heat_units_10C"
-                            ]
-                        )
-                    ),
-                    "000.0",
-                )
-                row["obs_dyly_derived_heat_units_55F"] = roundValue(
-                    (
-                        convertHeatUnitCelsiusToHeatUnitFahrenheit(
-                            dataDailyDerived[strAccessKey][
-                                "obs_dyly_derived_heat_units_13C"
-                            ]
-                        )
-                    ),
-                    "000.0",
-                )
-                row["obs_dyly_derived_heat_units_9455F"] = roundValue(
-                    (
-                        convertHeatUnitCelsiusToHeatUnitFahrenheit(
-                            dataDailyDerived[strAccessKey][
-                                "obs_dyly_derived_heat_units_3413C"
-                            ]
-                        )
-                    ),
-                    "000.0",
-                )
+    return row
 
-            datDailyDerivedOutput.append(row)
-    csvfile.close()
-    out_dyly = re.sub(r"(.+)(\.\w+$)", r"\1_updated\2", path_derived_dyly)
-    with open(out_dyly, "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=dataDailyDerivedOutputFields)
-        writer.writeheader()
-        writer.writerows(datDailyDerivedOutput)
 
-    csvfile.close()
-    return [out_hrly, out_dyly]
+def updateDailyDerivedRow(row, dailyDerived, dictColumns=None):
+    # Write the accumulated chill hours, heat stress and heat units into a
+    # daily derived row; dictColumns as in updateHourlyDerivedRow()
+    listValues = [
+        dailyDerived.heatStressC.getMean("000.0") or MISSING_DERIVED,
+        dailyDerived.heatStressF.getMean("000.0") or MISSING_DERIVED,
+        dailyDerived.intChillHours0C,
+        dailyDerived.intChillHours7C,
+        dailyDerived.intChillHours20C,
+        dailyDerived.intChillHours0C,
+        dailyDerived.intChillHours7C,
+        dailyDerived.intChillHours20C,
+    ]
+    # Heat units come from the daily obs file, which may not have this day
+    if dailyDerived.tplHeatUnits is not None:
+        for strHeatUnits in dailyDerived.tplHeatUnits:
+            listValues.append(strHeatUnits)
+            listValues.append(getHeatUnitsFahrenheit(strHeatUnits))
+
+    for strColumn, value in zip(DAILY_DERIVED_COLUMNS, listValues):
+        row[strColumn if dictColumns is None else dictColumns[strColumn]] = value
+
+    return row
+
+
+# the AZMet database schema, for column types and keys; run.R runs from the
+# project root
+SCHEMA_PATH = "azmet.schema.20250516-1222-1.sql"
+
+
+def readCreateTable(path_schema=SCHEMA_PATH, strTable=""):
+    # The CREATE TABLE statement for strTable in a mysqldump schema, as
+    # {"columns": [(column, definition)], "primary_key": [column],
+    #  "keys": {key: [column]}}, e.g. ("obs_version", "int unsigned NOT NULL
+    # DEFAULT '0'") and {"station_year": ["station_id", "obs_year"]}
+    with open(path_schema, "r") as sqlfile:
+        strSql = sqlfile.read()
+
+    matchTable = re.search(
+        r"CREATE TABLE `" + re.escape(strTable) + r"` \((.*?)\n\)", strSql, re.S
+    )
+    if matchTable is None:
+        raise ValueError(f"{path_schema} has no table {strTable}")
+
+    dictTable = {"columns": [], "primary_key": [], "keys": {}}
+    for strLine in matchTable.group(1).splitlines():
+        strLine = strLine.strip().rstrip(",")
+        matchColumn = re.match(r"`(\w+)` (.+)", strLine)
+        matchKey = re.match(r"(PRIMARY KEY|KEY `(\w+)`) \((.+)\)", strLine)
+        if matchColumn:
+            dictTable["columns"].append(matchColumn.groups())
+        elif matchKey:
+            listColumns = re.findall(r"`(\w+)`", matchKey.group(3))
+            if matchKey.group(2) is None:
+                dictTable["primary_key"] = listColumns
+            else:
+                dictTable["keys"][matchKey.group(2)] = listColumns
+
+    return dictTable
+
+
+def updateDerived(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    streaming=False,
+    backend="python",
+    missing=None,
+    incremental=False,
+    path_parquet=None,
+    path_schema=SCHEMA_PATH,
+    joins=None,
+    profile=None,
+    dedup=None,
+    duplicates=None,
+):
+    # missing: a MissingValues, to use a different set of sentinels or to see
+    # how many values of each field were treated as missing afterwards.
+    # incremental: only recalculate days whose input rows changed since the
+    # last incremental run, see updateDerivedIncremental.
+    # path_parquet: also write the _updated outputs as Parquet datasets under
+    # this directory, see writeDerivedParquet.
+    # joins: a JoinReport, to see which days and hours of one file had no
+    # match in another
+    # profile: a ProfileReport, to see where the time and memory went
+    # dedup: one of DEDUP_POLICIES, to first rewrite the four input files with
+    # one row per hour or day, see dedupStation; duplicates: a DuplicateReport,
+    # to see which keys were duplicated
+    if missing is None:
+        missing = MissingValues()
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+    if path_parquet is not None:
+        requirePyarrow()
+    if incremental and (streaming or backend != "python"):
+        raise ValueError(
+            'incremental is only supported with backend = "python" and '
+            "streaming = False"
+        )
+    if backend == "numpy" and streaming:
+        raise ValueError('streaming is not supported with backend = "numpy"')
+    if backend not in ("python", "numpy"):
+        raise ValueError(f'backend must be "python" or "numpy", not "{backend}"')
+    if dedup is not None and dedup not in DEDUP_POLICIES:
+        raise ValueError(
+            f"dedup must be one of {', '.join(DEDUP_POLICIES)}, not {dedup!r}"
+        )
+
+    listPaths = [path_obs_hrly, path_derived_hrly, path_obs_dyly, path_derived_dyly]
+    with profile.profile():
+        if dedup is not None:
+            with profile.stage("dedup"):
+                dedupStation(*listPaths, dedup, missing, duplicates)
+
+        if incremental:
+            listOutputs = updateDerivedIncremental(*listPaths, missing, joins, profile)
+        elif backend == "numpy":
+            listOutputs = updateDerivedNumpy(*listPaths, missing, joins, profile)
+        elif streaming:
+            listOutputs = updateDerivedStreaming(*listPaths, missing, joins, profile)
+        else:
+            listOutputs = updateDerivedInMemory(*listPaths, missing, joins, profile)
+
+        if path_parquet is not None:
+            out_hrly, out_dyly = listOutputs
+            for path_csv, strTable in (
+                (out_hrly, "obs_hrly_derived"),
+                (out_dyly, "obs_dyly_derived"),
+            ):
+                with profile.stage(f"parquet {strTable}"):
+                    writeDerivedParquet(
+                        path_csv,
+                        path_parquet,
+                        strTable,
+                        path_schema,
+                        missing.setSentinels,
+                    )
+
+    return listOutputs
+
+
+def updateDerivedInMemory(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    missing=None,
+    joins=None,
+    profile=None,
+):
+    # Reads all four files into memory, keyed by day and hour, and writes the
+    # _updated versions of the two derived files. Rows are read as plain lists
+    # and the roll-ups are HourlyDerived and DailyDerived slots objects, which
+    # take a fraction of the memory of a dict per row.
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+
+    dataDailyDerived = {}
+    dataHourlyDerived = {}
+    with profile.stage("obs_hrly"), openCsv(path_obs_hrly) as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        fnKey = getListKeyFunction(listHeader, blnHour=True)
+        listIndexes = list(getColumnIndexes(listHeader, HOURLY_FIELDS).values())
+        for row in profile.countRows("obs_hrly", iterListRows(reader, len(listHeader))):
+            intKey = fnKey(row)
+            if intKey is None:
+                joins.addInvalid("obs_hrly")
+                continue
+            intDailyOutputKey = intKey - intKey % 10**4
+
+            if intDailyOutputKey not in dataDailyDerived:
+                dataDailyDerived[intDailyOutputKey] = DailyDerived()
+
+            dataHourlyDerived[intKey] = accumulateHourly(
+                dataDailyDerived[intDailyOutputKey], row, missing, listIndexes
+            )
+
+    setHourlyDerivedKeys = set()
+
+    with profile.stage("obs_hrly_derived"), openCsv(path_derived_hrly) as csvfile:
+        reader = csv.reader(csvfile)
+        dataHourlyOutputFields = next(reader, [])
+        fnKey = getListKeyFunction(dataHourlyOutputFields, blnHour=True)
+        dictColumns = getColumnIndexes(dataHourlyOutputFields, HOURLY_DERIVED_COLUMNS)
+        dataHourlyOutput = list(
+            profile.countRows(
+                "obs_hrly_derived", iterListRows(reader, len(dataHourlyOutputFields))
+            )
+        )
+        for row in dataHourlyOutput:
+            intAccessKey = fnKey(row)
+            if intAccessKey is None:
+                joins.addInvalid("obs_hrly_derived")
+            elif intAccessKey in dataHourlyDerived:
+                updateHourlyDerivedRow(
+                    row, dataHourlyDerived[intAccessKey], dictColumns
+                )
+            setHourlyDerivedKeys.add(intAccessKey)
+
+    setHourlyDerivedKeys.discard(None)
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dataHourlyDerived.keys(),
+            "obs_hrly_derived",
+            setHourlyDerivedKeys,
+        )
+
+    out_hrly = getUpdatedPath(path_derived_hrly)
+    profile.addRows("write obs_hrly_derived", len(dataHourlyOutput))
+    with profile.stage("write obs_hrly_derived"):
+        writeCsvRows(out_hrly, dataHourlyOutputFields, dataHourlyOutput)
+    del dataHourlyOutput, dataHourlyDerived
+
+    setDailyKeys = set()
+    with profile.stage("obs_dyly"), openCsv(path_obs_dyly) as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        fnKey = getListKeyFunction(listHeader)
+        listIndexes = list(getColumnIndexes(listHeader, DAILY_FIELDS).values())
+        for row in profile.countRows("obs_dyly", iterListRows(reader, len(listHeader))):
+            intOutputKey = fnKey(row)
+            if intOutputKey is None:
+                joins.addInvalid("obs_dyly")
+                continue
+            setDailyKeys.add(intOutputKey)
+            # days without any hourly obs are left as they are
+            if intOutputKey in dataDailyDerived:
+                accumulateDaily(
+                    dataDailyDerived[intOutputKey], row, missing, listIndexes
+                )
+
+    with profile.stage("joins"):
+        joins.compare("obs_hrly", dataDailyDerived.keys(), "obs_dyly", setDailyKeys)
+
+    setDailyDerivedKeys = set()
+
+    with profile.stage("obs_dyly_derived"), openCsv(path_derived_dyly) as csvfile:
+        reader = csv.reader(csvfile)
+        dataDailyDerivedOutputFields = next(reader, [])
+        fnKey = getListKeyFunction(dataDailyDerivedOutputFields)
+        dictColumns = getColumnIndexes(
+            dataDailyDerivedOutputFields, DAILY_DERIVED_COLUMNS
+        )
+        datDailyDerivedOutput = list(
+            profile.countRows(
+                "obs_dyly_derived",
+                iterListRows(reader, len(dataDailyDerivedOutputFields)),
+            )
+        )
+        for row in datDailyDerivedOutput:
+            intAccessKey = fnKey(row)
+            if intAccessKey is None:
+                joins.addInvalid("obs_dyly_derived")
+            elif intAccessKey in dataDailyDerived:
+                updateDailyDerivedRow(row, dataDailyDerived[intAccessKey], dictColumns)
+            setDailyDerivedKeys.add(intAccessKey)
+
+    setDailyDerivedKeys.discard(None)
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dataDailyDerived.keys(),
+            "obs_dyly_derived",
+            setDailyDerivedKeys,
+        )
+
+    out_dyly = getUpdatedPath(path_derived_dyly)
+    profile.addRows("write obs_dyly_derived", len(datDailyDerivedOutput))
+    with profile.stage("write obs_dyly_derived"):
+        writeCsvRows(out_dyly, dataDailyDerivedOutputFields, datDailyDerivedOutput)
+
+    return [out_hrly, out_dyly]
+
+
+def getDayKey(row):
+    # the getObsKey() of a row's day, so "1987.1" and "1987.001" sort together
+    return getObsKey(row["obs_year"], row["obs_doy"])
+
+
+class SortedRowStream:
+    # Wraps a csv.DictReader whose rows are sorted by day so that several files
+    # can be walked together one day at a time; fnDayKey gives the day key of
+    # a row, e.g. for a csv.reader
+
+    def __init__(self, reader, strName="", fnDayKey=getDayKey):
+        self.reader = reader
+        self.strName = strName
+        self.fnDayKey = fnDayKey
+        self.row = None
+        self.intDayKey = None
+        self.advance()
+
+    def advance(self):
+        intPreviousKey = self.intDayKey
+        self.row = next(self.reader, None)
+        if self.row is None:
+            self.intDayKey = None
+            return
+
+        self.intDayKey = self.fnDayKey(self.row)
+        if self.intDayKey is None:
+            # a row without a valid day stays where it is, with the day before
+            self.intDayKey = -1 if intPreviousKey is None else intPreviousKey
+        elif intPreviousKey is not None and self.intDayKey < intPreviousKey:
+            raise ValueError(
+                f"{self.strName} is not sorted by obs_year, obs_doy: "
+                f"{formatObsKey(self.intDayKey)} follows "
+                f"{formatObsKey(intPreviousKey)}"
+            )
+
+    def takeThrough(self, intDayKey=None):
+        # Yield every remaining row up to and including day intDayKey (or all
+        # remaining rows when intDayKey is None)
+        while self.row is not None and (
+            intDayKey is None or self.intDayKey <= intDayKey
+        ):
+            row = self.row
+            self.advance()
+            yield row
+
+    def takeDay(self):
+        # Yield every row belonging to the next day
+        intDayKey = self.intDayKey
+        return intDayKey, self.takeThrough(intDayKey)
+
+
+def iterListRows(reader, intColumns=0):
+    # csv.reader rows as csv.DictReader would read them: blank lines are
+    # skipped and short rows are padded out with ""
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < intColumns:
+            row += [""] * (intColumns - len(row))
+        yield row
+
+
+def getListKeyFunction(listHeader, blnHour=False):
+    # getDayKey() (or the hourly getObsKey()) for a csv.reader row of a file
+    # with the columns in listHeader
+    if not listHeader:
+        return getDayKey  # there are no rows to key
+
+    intYear = listHeader.index("obs_year")
+    intDoy = listHeader.index("obs_doy")
+    if not blnHour:
+        return lambda row: getObsKey(row[intYear], row[intDoy])
+
+    intHour = listHeader.index("obs_hour")
+    return lambda row: getObsKey(row[intYear], row[intDoy], row[intHour])
+
+
+def iterHourlyFused(
+    fileObsHrly,
+    fileDerivedHrly,
+    fileOutHrly,
+    missing=None,
+    joins=None,
+    profile=None,
+    strObsName="obs_hrly",
+    strDerivedName="obs_hrly_derived",
+):
+    # The hourly half of updateDerived in a single pass over two day-sorted
+    # files. Each day of hourly obs is parsed once, its hourly derived rows
+    # are patched with the recalculated heat stress and written to
+    # fileOutHrly straight away, and (day key, daily roll-ups) is yielded for
+    # the caller to join to the daily files; the roll-ups are None for a day
+    # whose obs rows all had invalid keys. Rows are read as plain lists, so
+    # only the key columns and HOURLY_FIELDS are ever looked at, and every
+    # other derived column is copied through as it was read.
+    if missing is None:
+        missing = defaultMissingValues
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+
+    readerObs = csv.reader(fileObsHrly)
+    listObsHeader = next(readerObs, [])
+    readerDerived = csv.reader(fileDerivedHrly)
+    listDerivedHeader = next(readerDerived, [])
+    writer = csv.writer(fileOutHrly)
+    writer.writerow(listDerivedHeader)
+
+    fnObsKey = getListKeyFunction(listObsHeader, blnHour=True)
+    fnDerivedKey = getListKeyFunction(listDerivedHeader, blnHour=True)
+    listIndexes = list(getColumnIndexes(listObsHeader, HOURLY_FIELDS).values())
+    dictColumns = getColumnIndexes(listDerivedHeader, HOURLY_DERIVED_COLUMNS)
+
+    streamObs = SortedRowStream(
+        iterListRows(readerObs, len(listObsHeader)),
+        strObsName,
+        getListKeyFunction(listObsHeader),
+    )
+    streamDerived = SortedRowStream(
+        iterListRows(readerDerived, len(listDerivedHeader)),
+        strDerivedName,
+        getListKeyFunction(listDerivedHeader),
+    )
+
+    while streamObs.row is not None:
+        intDayKey, iterRows = streamObs.takeDay()
+        dailyDerived = DailyDerived()
+        dataHourlyDerived = {}
+        with profile.stage("obs_hrly"):
+            for row in profile.countRows("obs_hrly", iterRows):
+                intKey = fnObsKey(row)
+                if intKey is None:
+                    joins.addInvalid("obs_hrly")
+                    continue
+                dataHourlyDerived[intKey] = accumulateHourly(
+                    dailyDerived, row, missing, listIndexes
+                )
+
+        # derived rows of earlier days, which had no hourly obs, pass
+        # through unchanged
+        setDerivedKeys = set()
+        with profile.stage("obs_hrly_derived"):
+            for row in profile.countRows(
+                "obs_hrly_derived", streamDerived.takeThrough(intDayKey)
+            ):
+                intKey = fnDerivedKey(row)
+                if intKey is None:
+                    joins.addInvalid("obs_hrly_derived")
+                elif intKey in dataHourlyDerived:
+                    updateHourlyDerivedRow(row, dataHourlyDerived[intKey], dictColumns)
+                setDerivedKeys.add(intKey)
+                writer.writerow(row)
+        setDerivedKeys.discard(None)
+        with profile.stage("joins"):
+            joins.compare(
+                "obs_hrly",
+                dataHourlyDerived.keys(),
+                "obs_hrly_derived",
+                setDerivedKeys,
+            )
+
+        yield intDayKey, dailyDerived if dataHourlyDerived else None
+
+    # whatever is left is for days after the last hourly obs
+    setKeys = set()
+    with profile.stage("obs_hrly_derived"):
+        for row in profile.countRows("obs_hrly_derived", streamDerived.takeThrough()):
+            intKey = fnDerivedKey(row)
+            if intKey is None:
+                joins.addInvalid("obs_hrly_derived")
+            else:
+                setKeys.add(intKey)
+            writer.writerow(row)
+    joins.addUnmatched("obs_hrly_derived without obs_hrly", sorted(setKeys))
+
+
+def updateDerivedStreaming(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    missing=None,
+    joins=None,
+    profile=None,
+):
+    # Same output as updateDerived, but the four files are walked together as
+    # day-sorted streams and each day is written out as soon as it is finished,
+    # so only one day of data is held in memory at a time. The hourly files go
+    # through iterHourlyFused, and each day it yields is joined to the daily
+    # files as it comes.
+    if missing is None:
+        missing = defaultMissingValues
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+    out_hrly = getUpdatedPath(path_derived_hrly)
+    out_dyly = getUpdatedPath(path_derived_dyly)
+
+    with contextlib.ExitStack() as stack:
+        fileObsHrly = stack.enter_context(openCsv(path_obs_hrly))
+        fileDerivedHrly = stack.enter_context(openCsv(path_derived_hrly))
+        fileObsDyly = stack.enter_context(openCsv(path_obs_dyly))
+        fileDerivedDyly = stack.enter_context(openCsv(path_derived_dyly))
+        fileOutHrly = stack.enter_context(openAtomic(out_hrly))
+        fileOutDyly = stack.enter_context(openAtomic(out_dyly))
+
+        readerDerivedDyly = csv.DictReader(fileDerivedDyly)
+        writerDyly = csv.DictWriter(
+            fileOutDyly, fieldnames=readerDerivedDyly.fieldnames or []
+        )
+        writerDyly.writeheader()
+
+        streamObsDyly = SortedRowStream(csv.DictReader(fileObsDyly), path_obs_dyly)
+        streamDerivedDyly = SortedRowStream(readerDerivedDyly, path_derived_dyly)
+
+        for intDayKey, dailyDerived in iterHourlyFused(
+            fileObsHrly,
+            fileDerivedHrly,
+            fileOutHrly,
+            missing,
+            joins,
+            profile,
+            path_obs_hrly,
+            path_derived_hrly,
+        ):
+            # an hourly obs day whose rows all had invalid keys has no roll-ups
+            setHourlyDays = set() if dailyDerived is None else {intDayKey}
+            setDailyKeys = set()
+            with profile.stage("obs_dyly"):
+                for row in profile.countRows(
+                    "obs_dyly", streamObsDyly.takeThrough(intDayKey)
+                ):
+                    intKey = getDayKey(row)
+                    if intKey is None:
+                        joins.addInvalid("obs_dyly")
+                        continue
+                    if intKey in setHourlyDays:
+                        accumulateDaily(dailyDerived, row, missing)
+                    setDailyKeys.add(intKey)
+            with profile.stage("joins"):
+                joins.compare("obs_hrly", setHourlyDays, "obs_dyly", setDailyKeys)
+
+            setDerivedKeys = set()
+            with profile.stage("obs_dyly_derived"):
+                for row in profile.countRows(
+                    "obs_dyly_derived", streamDerivedDyly.takeThrough(intDayKey)
+                ):
+                    intKey = getDayKey(row)
+                    if intKey is None:
+                        joins.addInvalid("obs_dyly_derived")
+                    elif intKey in setHourlyDays:
+                        updateDailyDerivedRow(row, dailyDerived)
+                    setDerivedKeys.add(intKey)
+                    writerDyly.writerow(row)
+            setDerivedKeys.discard(None)
+            with profile.stage("joins"):
+                joins.compare(
+                    "obs_hrly", setHourlyDays, "obs_dyly_derived", setDerivedKeys
+                )
+
+        # whatever is left is for days after the last hourly obs
+        for strFile, stream, writer in (
+            ("obs_dyly", streamObsDyly, None),
+            ("obs_dyly_derived", streamDerivedDyly, writerDyly),
+        ):
+            setKeys = set()
+            with profile.stage(strFile):
+                for row in profile.countRows(strFile, stream.takeThrough()):
+                    intKey = getDayKey(row)
+                    if intKey is None:
+                        joins.addInvalid(strFile)
+                    else:
+                        setKeys.add(intKey)
+                    if writer is not None:
+                        writer.writerow(row)
+            joins.addUnmatched(f"{strFile} without obs_hrly", sorted(setKeys))
+
+    return [out_hrly, out_dyly]
+
+
+# -----------------------------------------------------------------------------
+# Duplicates
+#
+# The legacy files have a few hours (mostly 1987-365-24) and days with more
+# than one observation. Left in, every copy is counted into the daily heat
+# stress and chill hours. dedupStation() rewrites the station's four input
+# files with one row per (station_id, obs_year, obs_doy[, obs_hour]) before the
+# derived pass. Each copy of a duplicated key goes into a _duplicates side file
+# next to its input, with whether it was kept and which columns differ. A
+# derived row keeps the same copy as the obs row it was split from, so the obs
+# and derived files stay in step.
+
+DEDUP_POLICIES = ("first", "last", "drop", "complete")
+
+
+class DuplicateReport:
+    # Counts the duplicated keys of each file and the rows dropped from them
+
+    def __init__(self, intExamples=10):
+        self.intExamples = intExamples
+        self.dictKeys = collections.Counter()
+        self.dictDropped = collections.Counter()
+        self.dictExamples = collections.defaultdict(list)
+
+    def addKey(self, strFile="", intKey=0, intDropped=0):
+        self.dictKeys[strFile] += 1
+        self.dictDropped[strFile] += intDropped
+        if len(self.dictExamples[strFile]) < self.intExamples:
+            self.dictExamples[strFile].append(formatObsKey(intKey))
+
+    def getCounts(self):
+        # {file: {"keys": n, "dropped": n, "examples": ["1987.365.2400", ...]}}
+        return {
+            strFile: {
+                "keys": intKeys,
+                "dropped": self.dictDropped[strFile],
+                "examples": self.dictExamples[strFile],
+            }
+            for strFile, intKeys in self.dictKeys.items()
+        }
+
+
+def getDuplicatesPath(strPath=""):
+    # obs_hrly-tucson.csv -> obs_hrly-tucson_duplicates.csv
+    return re.sub(r"(.+)(\.\w+$)", r"\1_duplicates\2", strPath)
+
+
+def getDedupKeyFunction(listHeader, blnHour=False):
+    # (station_id, getObsKey()) of a csv.reader row, None for an invalid key
+    fnKey = getListKeyFunction(listHeader, blnHour)
+    intStation = listHeader.index("station_id") if "station_id" in listHeader else None
+
+    def getKey(row):
+        intKey = fnKey(row)
+        if intKey is None:
+            return None
+        return ("" if intStation is None else row[intStation], intKey)
+
+    return getKey
+
+
+def chooseCopy(listCopies, strPolicy="first", missing=None):
+    # index of the copy of a duplicated key to keep, or None to drop them all;
+    # "complete" keeps the copy with the fewest missing values, the first of
+    # any tie
+    if strPolicy == "first":
+        return 0
+    if strPolicy == "last":
+        return len(listCopies) - 1
+    if strPolicy == "drop":
+        return None
+
+    listMissing = [sum(map(missing.isMissing, row)) for row in listCopies]
+    return listMissing.index(min(listMissing))
+
+
+def getColumnsDiff(listHeader, listCopies):
+    # the columns whose values differ between copies, as in the R download
+    # functions' cols_diff
+    return ", ".join(
+        strColumn
+        for strColumn, tplValues in zip(listHeader, zip(*listCopies))
+        if len(set(tplValues)) > 1
+    )
+
+
+def dedupFile(
+    path,
+    strPolicy="first",
+    blnHour=False,
+    missing=None,
+    duplicates=None,
+    strFile="",
+    dictChoices=None,
+):
+    # Rewrite the csv at path with one row per key, following strPolicy, and
+    # write every copy of a duplicated key to its getDuplicatesPath(). A key in
+    # dictChoices (from the obs file this derived file was split from) keeps
+    # the same copy as its obs row instead. Returns {key: copy kept or None}
+    # for the duplicated keys; a file without any is left untouched.
+    if missing is None:
+        missing = defaultMissingValues
+    if duplicates is None:
+        duplicates = DuplicateReport()
+    if dictChoices is None:
+        dictChoices = {}
+
+    # the row numbers of every key seen more than once
+    with openCsv(path) as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        if not listHeader:
+            return {}
+        fnKey = getDedupKeyFunction(listHeader, blnHour)
+        dictFirst = {}
+        dictCopies = {}
+        for intRow, row in enumerate(iterListRows(reader, len(listHeader))):
+            tplKey = fnKey(row)
+            if tplKey is None:
+                continue
+            if tplKey in dictCopies:
+                dictCopies[tplKey].append(intRow)
+            elif tplKey in dictFirst:
+                dictCopies[tplKey] = [dictFirst[tplKey], intRow]
+            else:
+                dictFirst[tplKey] = intRow
+    del dictFirst
+    # a derived key dropped with its obs row goes even without a copy
+    setDropped = {
+        tplKey
+        for tplKey, intChoice in dictChoices.items()
+        if intChoice is None and tplKey not in dictCopies
+    }
+    if not dictCopies and not setDropped:
+        return {}
+
+    dictRowKeys = {
+        intRow: tplKey for tplKey, listRows in dictCopies.items() for intRow in listRows
+    }
+    dictCopyRows = collections.defaultdict(list)
+    with openCsv(path) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, [])
+        for intRow, row in enumerate(iterListRows(reader, len(listHeader))):
+            if intRow in dictRowKeys:
+                dictCopyRows[dictRowKeys[intRow]].append(row)
+
+    # the copy kept for each key takes the place of its first copy, so a sorted
+    # file stays sorted; every other copy is dropped
+    dictReplace = {}
+    dictKept = {}
+    listConflicts = []
+    for tplKey in sorted(dictCopies, key=lambda tplKey: dictCopies[tplKey][0]):
+        listRows = dictCopies[tplKey]
+        listCopies = dictCopyRows[tplKey]
+        intChoice = dictChoices.get(tplKey)
+        if tplKey not in dictChoices or (
+            intChoice is not None and intChoice >= len(listCopies)
+        ):
+            intChoice = chooseCopy(listCopies, strPolicy, missing)
+        dictKept[tplKey] = intChoice
+        for intRow in listRows:
+            dictReplace[intRow] = None
+        if intChoice is not None:
+            dictReplace[listRows[0]] = listCopies[intChoice]
+        duplicates.addKey(strFile, tplKey[1], len(listRows) - (intChoice is not None))
+        strColumnsDiff = getColumnsDiff(listHeader, listCopies)
+        for intCopy, row in enumerate(listCopies):
+            listConflicts.append(
+                ["kept" if intCopy == intChoice else "dropped", strColumnsDiff] + row
+            )
+    if dictCopies:
+        with openAtomic(getDuplicatesPath(path)) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["dedup", "cols_diff"] + listHeader)
+            writer.writerows(listConflicts)
+
+    with openCsv(path) as csvfile, openAtomic(path) as outfile:
+        reader = csv.reader(csvfile)
+        writer = csv.writer(outfile)
+        writer.writerow(next(reader, []))
+        for intRow, row in enumerate(iterListRows(reader, len(listHeader))):
+            if intRow in dictReplace:
+                row = dictReplace[intRow]
+                if row is None:
+                    continue
+            elif setDropped:
+                tplKey = fnKey(row)
+                if tplKey in setDropped:
+                    duplicates.addKey(strFile, tplKey[1], 1)
+                    continue
+            writer.writerow(row)
+
+    return dictKept
+
+
+def dedupStation(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    strPolicy="first",
+    missing=None,
+    duplicates=None,
+):
+    # dedupFile() for the hourly and daily obs files and then their derived
+    # files, in place
+    if strPolicy not in DEDUP_POLICIES:
+        raise ValueError(
+            f"dedup must be one of {', '.join(DEDUP_POLICIES)}, not {strPolicy!r}"
+        )
+    if duplicates is None:
+        duplicates = DuplicateReport()
+
+    for path_obs, path_derived, blnHour, strObs, strDerived in (
+        (path_obs_hrly, path_derived_hrly, True, "obs_hrly", "obs_hrly_derived"),
+        (path_obs_dyly, path_derived_dyly, False, "obs_dyly", "obs_dyly_derived"),
+    ):
+        dictChoices = dedupFile(
+            path_obs, strPolicy, blnHour, missing, duplicates, strObs
+        )
+        dedupFile(
+            path_derived,
+            strPolicy,
+            blnHour,
+            missing,
+            duplicates,
+            strDerived,
+            dictChoices,
+        )
+
+
+# -----------------------------------------------------------------------------
+# Incremental updates
+#
+# A manifest next to the _updated outputs records a hash of every input row
+# belonging to each day (hourly and daily obs and derived rows). On the next
+# run only days whose hash changed are recalculated; the rows of every other
+# day are copied from the previous _updated output. Bump MANIFEST_VERSION
+# whenever a change to the calculations should force a full rebuild.
+
+MANIFEST_VERSION = 3
+
+
+def getManifestPath(strPath=""):
+    # obs_dyly_derived-tucson_updated.csv ->
+    # obs_dyly_derived-tucson_updated.manifest.json
+    return re.sub(r"\.\w+$", ".manifest.json", strPath)
+
+
+def getDayKeys(listHeader, listRows):
+    # the getObsKey() day key of each row, None where it isn't valid
+    intYear = listHeader.index("obs_year")
+    intDoy = listHeader.index("obs_doy")
+
+    return [getObsKey(row[intYear], row[intDoy]) for row in listRows]
+
+
+def hashDays(dictHashes, strTag, listRows, listDayKeys):
+    # add each row to the running hash of its day; strTag keeps a row from
+    # hashing the same whichever of the four files it is in
+    for row, intDayKey in zip(listRows, listDayKeys):
+        if intDayKey not in dictHashes:
+            dictHashes[intDayKey] = hashlib.sha256()
+        dictHashes[intDayKey].update(
+            (strTag + "\x1e" + "\x1f".join(row) + "\n").encode()
+        )
+
+
+def readManifest(path_manifest, strSettings=""):
+    # day hashes from the previous run, or {} if there wasn't one or it was
+    # made with different settings
+    try:
+        with open(path_manifest, "r") as jsonfile:
+            dictManifest = json.load(jsonfile)
+    except (OSError, ValueError):
+        return {}
+
+    if dictManifest.get("settings") != strSettings:
+        return {}
+
+    return {
+        int(strDayKey): strHash
+        for strDayKey, strHash in dictManifest.get("days", {}).items()
+    }
+
+
+def readPreviousRows(path, listHeader):
+    # rows of a previous _updated output grouped by day, or {} if it is
+    # missing or no longer has the same columns as its input
+    try:
+        listPreviousHeader, listRows = readCsvRows(path)
+    except OSError:
+        return {}
+
+    if listRows and listPreviousHeader != listHeader:
+        return {}
+
+    dictRows = collections.defaultdict(collections.deque)
+    for row, intDayKey in zip(listRows, getDayKeys(listPreviousHeader, listRows)):
+        dictRows[intDayKey].append(row)
+
+    return dictRows
+
+
+def spliceRows(listHeader, listRows, listDayKeys, dictPreviousRows, fnUpdate):
+    # rows of an output in input order: recalculated with fnUpdate for days
+    # missing from dictPreviousRows, copied from dictPreviousRows otherwise
+    listOutput = []
+    for row, intDayKey in zip(listRows, listDayKeys):
+        if intDayKey in dictPreviousRows:
+            listOutput.append(dictPreviousRows[intDayKey].popleft())
+        else:
+            dictRow = fnUpdate(dict(zip(listHeader, row)))
+            listOutput.append([dictRow.get(strField, "") for strField in listHeader])
+
+    return listOutput
+
+
+def updateDerivedIncremental(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    missing=None,
+    joins=None,
+    profile=None,
+):
+    # Same output as updateDerived, but only days whose input rows changed
+    # since the last incremental run are recalculated (and only those days
+    # are checked for join misses)
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+    out_hrly = getUpdatedPath(path_derived_hrly)
+    out_dyly = getUpdatedPath(path_derived_dyly)
+    path_manifest = getManifestPath(out_dyly)
+
+    dictInputs = {}
+    dictHashes = {}
+    for strTag, path in (
+        ("obs_hrly", path_obs_hrly),
+        ("derived_hrly", path_derived_hrly),
+        ("obs_dyly", path_obs_dyly),
+        ("derived_dyly", path_derived_dyly),
+    ):
+        with profile.stage(f"read {strTag}"):
+            listHeader, listRows = readCsvRows(path)
+            listDayKeys = getDayKeys(listHeader, listRows) if listRows else []
+            hashDays(dictHashes, strTag, listRows, listDayKeys)
+            dictInputs[strTag] = (listHeader, listRows, listDayKeys)
+        profile.addRows(f"read {strTag}", len(listRows))
+
+    # rows with an invalid key can't be matched to anything, so they are
+    # always passed through again rather than kept in the manifest
+    dictDays = {
+        intDayKey: hashDay.hexdigest()
+        for intDayKey, hashDay in dictHashes.items()
+        if intDayKey is not None
+    }
+    strSettings = hashlib.sha256(
+        json.dumps(
+            {
+                "version": MANIFEST_VERSION,
+                "sentinels": sorted(missing.setSentinels),
+                "headers": [dictInputs[strTag][0] for strTag in dictInputs],
+            }
+        ).encode()
+    ).hexdigest()
+    listHeaderHrly, listRowsHrly, listDayKeysHrly = dictInputs["derived_hrly"]
+    listHeaderDyly, listRowsDyly, listDayKeysDyly = dictInputs["derived_dyly"]
+    with profile.stage("read previous outputs"):
+        dictPreviousDays = readManifest(path_manifest, strSettings)
+        dictPreviousHrly = readPreviousRows(out_hrly, listHeaderHrly)
+        dictPreviousDyly = readPreviousRows(out_dyly, listHeaderDyly)
+
+    # a day can only be copied if the previous outputs still have all its rows
+    dictRowCountsHrly = collections.Counter(listDayKeysHrly)
+    dictRowCountsDyly = collections.Counter(listDayKeysDyly)
+    setChanged = {
+        intDayKey
+        for intDayKey, strHash in dictDays.items()
+        if dictPreviousDays.get(intDayKey) != strHash
+        or len(dictPreviousHrly.get(intDayKey, ())) != dictRowCountsHrly[intDayKey]
+        or len(dictPreviousDyly.get(intDayKey, ())) != dictRowCountsDyly[intDayKey]
+    }
+    if (
+        not setChanged
+        and None not in dictHashes
+        and dictDays.keys() == dictPreviousDays.keys()
+    ):
+        return [out_hrly, out_dyly]  # the previous outputs are up to date
+
+    setChanged.add(None)
+    for dictPreviousRows in (dictPreviousHrly, dictPreviousDyly):
+        for intDayKey in setChanged:
+            dictPreviousRows.pop(intDayKey, None)
+
+    dataDailyDerived = {}
+    dataHourlyDerived = {}
+    listHeader, listRows, listDayKeys = dictInputs["obs_hrly"]
+    with profile.stage("obs_hrly"):
+        for row, intDayKey in zip(listRows, listDayKeys):
+            if intDayKey in setChanged:
+                row = dict(zip(listHeader, row))
+                intKey = getObsKey(row["obs_year"], row["obs_doy"], row["obs_hour"])
+                if intKey is None:
+                    joins.addInvalid("obs_hrly")
+                    continue
+                if intDayKey not in dataDailyDerived:
+                    dataDailyDerived[intDayKey] = DailyDerived()
+                dataHourlyDerived[intKey] = accumulateHourly(
+                    dataDailyDerived[intDayKey], row, missing
+                )
+    profile.addRows("obs_hrly", len(dataHourlyDerived))
+
+    setDailyKeys = set()
+    listHeader, listRows, listDayKeys = dictInputs["obs_dyly"]
+    with profile.stage("obs_dyly"):
+        for row, intDayKey in zip(listRows, listDayKeys):
+            if intDayKey not in setChanged:
+                continue
+            if intDayKey is None:
+                joins.addInvalid("obs_dyly")
+                continue
+            setDailyKeys.add(intDayKey)
+            # days without any hourly obs are left as they are
+            if intDayKey in dataDailyDerived:
+                accumulateDaily(
+                    dataDailyDerived[intDayKey], dict(zip(listHeader, row)), missing
+                )
+    profile.addRows("obs_dyly", len(setDailyKeys))
+    with profile.stage("joins"):
+        joins.compare("obs_hrly", dataDailyDerived.keys(), "obs_dyly", setDailyKeys)
+
+    setHourlyDerivedKeys = set()
+    setDailyDerivedKeys = set()
+
+    def updateHourly(row):
+        intAccessKey = getObsKey(row["obs_year"], row["obs_doy"], row["obs_hour"])
+        if intAccessKey is None:
+            joins.addInvalid("obs_hrly_derived")
+        else:
+            setHourlyDerivedKeys.add(intAccessKey)
+            if intAccessKey in dataHourlyDerived:
+                updateHourlyDerivedRow(row, dataHourlyDerived[intAccessKey])
+        return row
+
+    def updateDaily(row):
+        intAccessKey = getObsKey(row["obs_year"], row["obs_doy"])
+        if intAccessKey is None:
+            joins.addInvalid("obs_dyly_derived")
+        else:
+            setDailyDerivedKeys.add(intAccessKey)
+            if intAccessKey in dataDailyDerived:
+                updateDailyDerivedRow(row, dataDailyDerived[intAccessKey])
+        return row
+
+    # updating the derived rows of changed days and writing out all of them
+    with profile.stage("obs_hrly_derived"):
+        writeCsvRows(
+            out_hrly,
+            listHeaderHrly,
+            spliceRows(
+                listHeaderHrly,
+                listRowsHrly,
+                listDayKeysHrly,
+                dictPreviousHrly,
+                updateHourly,
+            ),
+        )
+    profile.addRows("obs_hrly_derived", len(listRowsHrly))
+    with profile.stage("obs_dyly_derived"):
+        writeCsvRows(
+            out_dyly,
+            listHeaderDyly,
+            spliceRows(
+                listHeaderDyly,
+                listRowsDyly,
+                listDayKeysDyly,
+                dictPreviousDyly,
+                updateDaily,
+            ),
+        )
+    profile.addRows("obs_dyly_derived", len(listRowsDyly))
+
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dataHourlyDerived.keys(),
+            "obs_hrly_derived",
+            setHourlyDerivedKeys,
+        )
+        joins.compare(
+            "obs_hrly",
+            dataDailyDerived.keys(),
+            "obs_dyly_derived",
+            setDailyDerivedKeys,
+        )
+
+    # written last, so an interrupted run at worst recalculates days again
+    with openAtomic(path_manifest) as jsonfile:
+        json.dump({"settings": strSettings, "days": dictDays}, jsonfile)
+
+    return [out_hrly, out_dyly]
+
+
+# -----------------------------------------------------------------------------
+# NumPy backend
+#
+# Column-oriented versions of calculateHeatStressCotton, calculateHeatUnits and
+# roundValue that work on whole arrays at once. Missing value sentinels become
+# boolean masks, and rounded values are carried as integers scaled by
+# 10**places plus a sign mask (so Decimal's "-0.0" survives) until they are
+# written out. Results are identical to the scalar functions: exp() goes through
+# math.exp, and any value close enough to a rounding tie for float error to
+# matter is rounded with Decimal instead.
+
+
+def requireNumpy():
+    if np is None:
+        raise ImportError('backend = "numpy" requires the numpy package')
+
+
+def getPlaces(strExp="1"):
+    # number of decimal places in a roundValue() exponent, e.g. "000.0" -> 1
+    return getQuantizer(strExp)[1]
+
+
+def roundHalfUpInt(aryFltValues):
+    # roundValue(value, "1", "int") for every element: round half away from
+    # zero on the exact binary value (floor and the fraction are exact)
+    aryFltAbs = np.abs(aryFltValues)
+    aryFltFloor = np.floor(aryFltAbs)
+    with np.errstate(invalid="ignore"):  # NaN for missing values
+        aryIntRounded = aryFltFloor.astype(np.int64) + (aryFltAbs - aryFltFloor >= 0.5)
+
+    return np.where(aryFltValues < 0, -aryIntRounded, aryIntRounded)
+
+
+def roundArray(aryFltValues, strExp="1"):
+    # roundValue(value, strExp) for every element of a float array. Returns the
+    # rounded values as integers scaled by 10**places and a mask of which
+    # values are negative (including those that round to "-0.0").
+    intPlaces = getPlaces(strExp)
+    aryFltValues = np.asarray(aryFltValues, dtype=np.float64)
+    aryNegative = np.signbit(aryFltValues)
+
+    aryFltScaled = np.abs(aryFltValues) * 10.0**intPlaces
+    aryFltFloor = np.floor(aryFltScaled)
+    aryFltFraction = aryFltScaled - aryFltFloor
+    with np.errstate(invalid="ignore"):  # NaN for missing values
+        aryIntScaled = aryFltFloor.astype(np.int64) + (aryFltFraction >= 0.5)
+
+    # the scaling multiply is off by at most half an ulp, which only matters
+    # for values sitting right on a tie
+    aryNearTie = np.abs(aryFltFraction - 0.5) <= 4 * np.spacing(aryFltScaled)
+    for intIndex in np.flatnonzero(aryNearTie):
+        decRounded = roundValue(float(aryFltValues[intIndex]), strExp)
+        aryIntScaled[intIndex] = abs(int(decRounded.scaleb(intPlaces)))
+
+    return np.where(aryNegative, -aryIntScaled, aryIntScaled), aryNegative
+
+
+def roundScaledArray(aryIntScaled, aryNegative, intPlaces, strExp="1"):
+    # roundValue(decValue, strExp) where decValue is already a Decimal with
+    # intPlaces places, e.g. rounding a 7 place heat stress value to "000.0"
+    intDivisor = 10 ** (intPlaces - getPlaces(strExp))
+    aryIntRounded = (np.abs(aryIntScaled) + intDivisor // 2) // intDivisor
+
+    return np.where(aryNegative, -aryIntRounded, aryIntRounded), aryNegative
+
+
+def scaledToFloat(aryIntScaled, aryNegative, intPlaces):
+    # float(decValue) for Decimals stored as scaled integers
+    aryFltValues = np.abs(aryIntScaled) / 10.0**intPlaces
+
+    return np.where(aryNegative, -aryFltValues, aryFltValues)
+
+
+def formatScaled(aryIntScaled, aryNegative, intPlaces):
+    # str(decValue) for Decimals stored as scaled integers
+    intScale = 10**intPlaces
+    listWhole = (np.abs(aryIntScaled) // intScale).tolist()
+    listSign = np.where(aryNegative, "-", "").tolist()
+    if intPlaces == 0:
+        return [
+            strSign + str(intWhole) for strSign, intWhole in zip(listSign, listWhole)
+        ]
+
+    listFraction = (np.abs(aryIntScaled) % intScale + intScale).tolist()
+
+    # the leading "1" of intScale + fraction keeps the fraction's zero padding
+    return [
+        strSign + str(intWhole) + "." + str(intFraction)[1:]
+        for strSign, intWhole, intFraction in zip(listSign, listWhole, listFraction)
+    ]
+
+
+def calculateHeatStressCottonArray(
+    aryStrTempAir,
+    aryStrRelativeHumdity,
+    aryStrVaporPressureDeficit,
+    aryStrSolRad,
+    missing=None,
+):
+    # calculateHeatStressCotton for whole columns. Heat stress values are
+    # returned as integers scaled by 10**7 ("000.0000000") with sign masks.
+    requireNumpy()
+    if missing is None:
+        missing = defaultMissingValues
+
+    return calculateHeatStressCottonFromArrays(
+        missing.parseArray(aryStrTempAir)[0],
+        missing.parseArray(aryStrRelativeHumdity)[0],
+        missing.parseArray(aryStrVaporPressureDeficit)[0],
+        missing.parseArray(aryStrSolRad)[0],
+    )
+
+
+def calculateHeatStressCottonFromArrays(
+    aryFltTempAir, aryFltRelativeHumdity, aryFltVaporPressureDeficit, aryFltSolRad
+):
+    # calculateHeatStressCottonArray for columns already parsed by MissingValues
+    aryMissing = (
+        np.isnan(aryFltTempAir)
+        | np.isnan(aryFltRelativeHumdity)
+        | np.isnan(aryFltVaporPressureDeficit)
+        | np.isnan(aryFltSolRad)
+    )
+
+    # np.exp is not always bit-identical to math.exp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aryFltExponent = (17.27 * aryFltTempAir) / (237.2 + aryFltTempAir)
+    aryFltEx = np.fromiter(
+        map(math.exp, aryFltExponent.tolist()),
+        dtype=np.float64,
+        count=len(aryFltExponent),
+    )
+    with np.errstate(invalid="ignore"):
+        aryFltEa = aryFltRelativeHumdity / 100 * 0.6108 * aryFltEx
+        aryFltHeatStressCottonC = np.where(
+            aryFltSolRad > 0,
+            0.53 + aryFltTempAir - 1.43 * aryFltVaporPressureDeficit,
+            -5.93 + aryFltTempAir + 1.95 * aryFltEa,
+        )
+    aryIntC, aryNegativeC = roundArray(
+        np.where(aryMissing, 0.0, aryFltHeatStressCottonC), "000.0000000"
+    )
+
+    aryFltHeatStressCottonF = scaledToFloat(aryIntC, aryNegativeC, 7) * 1.8 + 32.0
+    aryIntF, aryNegativeF = roundArray(aryFltHeatStressCottonF, "000.0000000")
+
+    # missing values come back as -9999.0, like the scalar function
+    aryIntC = np.where(aryMissing, -99990000000, aryIntC)
+    aryIntF = np.where(aryMissing, -99990000000, aryIntF)
+
+    return {
+        "heatStressCottonC": aryIntC,
+        "heatStressCottonF": aryIntF,
+        "negativeC": aryNegativeC | aryMissing,
+        "negativeF": aryNegativeF | aryMissing,
+        "missing": aryMissing,
+    }
+
+
+def calculateHeatUnitsArray(
+    aryStrTempAirMax,
+    aryStrTempAirMin,
+    strTempAirUpper="",
+    strTempAirLower="",
+    missing=None,
+):
+    # calculateHeatUnits for whole columns of daily max and min temperatures
+    # and a single pair of upper and lower thresholds
+    requireNumpy()
+    if missing is None:
+        missing = defaultMissingValues
+
+    return calculateHeatUnitsFromArrays(
+        missing.parseArray(aryStrTempAirMax)[0],
+        missing.parseArray(aryStrTempAirMin)[0],
+        missing.parse(strTempAirUpper),
+        missing.parse(strTempAirLower),
+    )
+
+
+def calculateHeatUnitsFromArrays(
+    aryFltTempAirMax,
+    aryFltTempAirMin,
+    fltTempAirUpper=math.nan,
+    fltTempAirLower=math.nan,
+):
+    # calculateHeatUnitsArray for columns already parsed by MissingValues
+    aryMissing = (
+        np.isnan(aryFltTempAirMax)
+        | np.isnan(aryFltTempAirMin)
+        | math.isnan(fltTempAirUpper)
+        | math.isnan(fltTempAirLower)
+    )
+    aryFltSineTable = np.array(aryFltSine, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 15020 TM = (X + N) / 2
+        aryFltTempAirMean = (aryFltTempAirMax + aryFltTempAirMin) / 2.0
+        # 15040 A = (X - N) / 2
+        aryFltTempAirAlpha = (aryFltTempAirMax - aryFltTempAirMin) / 2.0
+        # CINT(((TL - N) / (X - N)) * 100) and CINT(((TU - N) / (X - N)) * 100)
+        aryFltSineWavePointLower = (
+            (fltTempAirLower - aryFltTempAirMin)
+            / (aryFltTempAirMax - aryFltTempAirMin)
+            * 100
+        )
+        aryFltSineWavePointUpper = (
+            (fltTempAirUpper - aryFltTempAirMin)
+            / (aryFltTempAirMax - aryFltTempAirMin)
+            * 100
+        )
+    aryFinite = np.isfinite(aryFltSineWavePointLower) & np.isfinite(
+        aryFltSineWavePointUpper
+    )
+    aryIntSineWavePointLower = np.clip(
+        roundHalfUpInt(np.where(aryFinite, aryFltSineWavePointLower, 0.0)), 0, 100
+    )
+    aryIntSineWavePointUpper = np.clip(
+        roundHalfUpInt(np.where(aryFinite, aryFltSineWavePointUpper, 0.0)), 0, 100
+    )
+
+    aryAboveUpper = aryFltTempAirMax > fltTempAirUpper
+    aryBelowLower = aryFltTempAirMin < fltTempAirLower
+    aryAboveLower = aryFltTempAirMin > fltTempAirLower
+
+    # 15300 - 15340: H = A * (SI(R1) - SI(R2))
+    aryFltBothCutoffs = aryFltTempAirAlpha * (
+        aryFltSineTable[aryIntSineWavePointLower]
+        - aryFltSineTable[aryIntSineWavePointUpper]
+    )
+    # 15220 - 15240: IF R < 0 THEN H = TU - TL, ELSE H = (TM - TL) - SI(R) * A
+    aryFltUpperCutoff = np.where(
+        aryFltSineWavePointUpper < 0.0,
+        fltTempAirUpper - fltTempAirLower,
+        (aryFltTempAirMean - fltTempAirLower)
+        - aryFltSineTable[aryIntSineWavePointUpper] * aryFltTempAirAlpha,
+    )
+    # 15080: H = TM - TL
+    aryFltNoCutoff = aryFltTempAirMean - fltTempAirLower
+    # 15100 - 15120: H = A * SI(R)
+    aryFltLowerCutoff = aryFltTempAirAlpha * aryFltSineTable[aryIntSineWavePointLower]
+
+    aryFltHeatUnits = np.where(
+        aryAboveUpper,
+        np.where(aryBelowLower, aryFltBothCutoffs, aryFltUpperCutoff),
+        np.where(aryAboveLower, aryFltNoCutoff, aryFltLowerCutoff),
+    )
+
+    # X = N divides by zero everywhere but the 15080 branch; raise like the
+    # scalar version does
+    aryZeroDivision = (
+        ~aryMissing
+        & (aryAboveUpper | ~aryAboveLower)
+        & (aryFltTempAirMax == aryFltTempAirMin)
+    )
+    if aryZeroDivision.any():
+        intIndex = int(np.flatnonzero(aryZeroDivision)[0])
+        calculateHeatUnitsFromFloats(
+            float(aryFltTempAirMax[intIndex]),
+            float(aryFltTempAirMin[intIndex]),
+            fltTempAirUpper,
+            fltTempAirLower,
+        )
+
+    return {"fltHeatUnits": np.where(aryMissing, -9999.0, aryFltHeatUnits)}
+
+
+def readCsvRows(path):
+    # header and rows of a csv file as plain lists, read as csv.DictReader
+    # would read them
+    with openCsv(path) as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        listRows = list(iterListRows(reader, len(listHeader)))
+
+    return listHeader, listRows
+
+
+def writeCsvRows(path, listHeader, listRows):
+    with openAtomic(path) as csvfile:
+        writer = csv.writer(csvfile)
+        # updateDerived takes the header from the last row, so an input
+        # without any rows is written out with an empty header
+        writer.writerow(listHeader if listRows else [])
+        writer.writerows(listRows)
+
+
+def getColumn(listHeader, listRows, strColumn):
+    intIndex = listHeader.index(strColumn)
+
+    return [row[intIndex] for row in listRows]
+
+
+def getObsKeyArray(listHeader, listRows, blnHour=False):
+    # getObsKey() for every row as an int64 array, with -1 for invalid keys
+    listColumns = ["obs_year", "obs_doy"] + (["obs_hour"] if blnHour else [])
+    if not listRows:
+        return np.zeros(0, dtype=np.int64)
+
+    return getKeyArray(
+        [getColumn(listHeader, listRows, strColumn) for strColumn in listColumns]
+    )
+
+
+def getKeyArray(listKeyColumns):
+    # getObsKey() for the year, doy and (optionally) hour columns, lists of
+    # strings or bytes arrays, as an int64 array with -1 for invalid keys
+    try:
+        aryKeys = np.array(listKeyColumns[0], dtype=np.int64) * 10**7
+        aryKeys += np.array(listKeyColumns[1], dtype=np.int64) * 10**4
+        if len(listKeyColumns) > 2:
+            aryKeys += np.array(listKeyColumns[2], dtype=np.int64)
+    except ValueError:
+        # at least one row isn't a number, so go row by row
+        aryKeys = np.array(
+            [
+                -1 if intKey is None else intKey
+                for intKey in map(getObsKey, *listKeyColumns)
+            ],
+            dtype=np.int64,
+        )
+
+    return aryKeys
+
+
+def calculateHourlyArrays(aryHourKeys, listValues):
+    # The NumPy backend's calculations on the hourly obs, given their (valid)
+    # keys and HOURLY_FIELDS values:
+    #   hourly_c, hourly_f: each row's heat stress, formatted for the hourly
+    #     derived rows
+    #   day_keys: the days with hourly obs, in order
+    #   daily: {obs_dyly_derived column: its formatted value for each of
+    #     day_keys}, the heat stress means and chill hours
+    dictHeatStress = calculateHeatStressCottonFromArrays(*listValues)
+    aryDayKeys, aryDayIndex = np.unique(
+        aryHourKeys - aryHourKeys % 10**4, return_inverse=True
+    )
+    aryDayIndex = aryDayIndex.reshape(-1)
+    intDays = len(aryDayKeys)
+
+    def sumByDay(aryValues):
+        # integer sums stay exact in float64 well past anything a day can hold
+        return np.rint(
+            np.bincount(aryDayIndex, weights=aryValues, minlength=intDays)
+        ).astype(np.int64)
+
+    # missing hours are left out of the heat stress means, as DailyAggregate does
+    aryMissing = dictHeatStress["missing"]
+    aryIntHours = sumByDay(~aryMissing)
+    aryIntAccumC = sumByDay(
+        np.where(aryMissing, 0, dictHeatStress["heatStressCottonC"]).astype(np.float64)
+    )
+    aryIntAccumF = sumByDay(
+        np.where(aryMissing, 0, dictHeatStress["heatStressCottonF"]).astype(np.float64)
+    )
+
+    # comparisons with NaN (missing) are always False
+    aryFltTempAir = listValues[0]
+    listChillHours0C = [
+        str(intHours) for intHours in sumByDay(aryFltTempAir < 0.00000).tolist()
+    ]
+    listChillHours7C = [
+        str(intHours) for intHours in sumByDay(aryFltTempAir < 7.22222).tolist()
+    ]
+    listChillHours20C = [
+        str(intHours) for intHours in sumByDay(aryFltTempAir > 20.00000).tolist()
+    ]
+
+    # daily mean of the 7 place hourly heat stress values rounded to "000.0",
+    # exactly, in integers, as DailyAggregate.getMean() does
+    aryIntDivisor = np.maximum(aryIntHours, 1) * 1000000
+    listMeanC = formatScaled(
+        (2 * np.abs(aryIntAccumC) + aryIntDivisor) // (2 * aryIntDivisor),
+        aryIntAccumC < 0,
+        1,
+    )
+    listMeanF = formatScaled(
+        (2 * np.abs(aryIntAccumF) + aryIntDivisor) // (2 * aryIntDivisor),
+        aryIntAccumF < 0,
+        1,
+    )
+    for intDay in np.flatnonzero(aryIntHours == 0).tolist():
+        listMeanC[intDay] = listMeanF[intDay] = MISSING_DERIVED
+
+    return {
+        # heat stress rounded from 7 places to "000.0"
+        "hourly_c": formatScaled(
+            *roundScaledArray(
+                dictHeatStress["heatStressCottonC"],
+                dictHeatStress["negativeC"],
+                7,
+                "000.0",
+            ),
+            1,
+        ),
+        "hourly_f": formatScaled(
+            *roundScaledArray(
+                dictHeatStress["heatStressCottonF"],
+                dictHeatStress["negativeF"],
+                7,
+                "000.0",
+            ),
+            1,
+        ),
+        "day_keys": aryDayKeys,
+        "daily": {
+            "obs_dyly_derived_heatstress_cotton_meanC": listMeanC,
+            "obs_dyly_derived_heatstress_cotton_meanF": listMeanF,
+            "obs_dyly_derived_chill_hours_0C": listChillHours0C,
+            "obs_dyly_derived_chill_hours_7C": listChillHours7C,
+            "obs_dyly_derived_chill_hours_20C": listChillHours20C,
+            "obs_dyly_derived_chill_hours_32F": listChillHours0C,
+            "obs_dyly_derived_chill_hours_45F": listChillHours7C,
+            "obs_dyly_derived_chill_hours_68F": listChillHours20C,
+        },
+    }
+
+
+def calculateHeatUnitColumns(aryFltTempAirMax, aryFltTempAirMin):
+    # {obs_dyly_derived heat unit column: its formatted value for each day}
+    dictHeatUnits = {}
+    for (
+        strColumnC,
+        strColumnF,
+        strTempAirUpper,
+        strTempAirLower,
+    ) in HEAT_UNIT_THRESHOLDS:
+        aryIntHeatUnits, aryNegative = roundArray(
+            calculateHeatUnitsFromArrays(
+                aryFltTempAirMax,
+                aryFltTempAirMin,
+                float(strTempAirUpper),
+                float(strTempAirLower),
+            )["fltHeatUnits"],
+            "000.0",
+        )
+        dictHeatUnits["obs_dyly_derived_heat_units_" + strColumnC] = formatScaled(
+            aryIntHeatUnits, aryNegative, 1
+        )
+        dictHeatUnits["obs_dyly_derived_heat_units_" + strColumnF] = formatScaled(
+            *roundArray(scaledToFloat(aryIntHeatUnits, aryNegative, 1) * 1.8, "000.0"),
+            1,
+        )
+
+    return dictHeatUnits
+
+
+def updateDerivedNumpy(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    missing=None,
+    joins=None,
+    profile=None,
+):
+    # Same output as updateDerived, with the calculations done a column at a
+    # time by the NumPy backend
+    requireNumpy()
+    if missing is None:
+        missing = MissingValues()
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+
+    # hourly obs -> hourly heat stress and the daily roll-ups
+    with profile.stage("read obs_hrly"):
+        aryHourKeys, listValues = readObsArrays(
+            path_obs_hrly, HOURLY_FIELDS, missing, blnHour=True
+        )
+    profile.addRows("read obs_hrly", len(aryHourKeys))
+    with profile.stage("obs_hrly"):
+        aryValid = aryHourKeys >= 0
+        joins.addInvalid("obs_hrly", int(np.count_nonzero(~aryValid)))
+        aryHourKeys = aryHourKeys[aryValid]
+        dictHourly = calculateHourlyArrays(
+            aryHourKeys, [aryValues[aryValid] for aryValues in listValues]
+        )
+        listHourlyC = dictHourly["hourly_c"]
+        listHourlyF = dictHourly["hourly_f"]
+        dictDayIndex = dict(
+            zip(dictHourly["day_keys"].tolist(), range(len(dictHourly["day_keys"])))
+        )
+        # the last obs row for an hour wins
+        dictHourIndex = dict(zip(aryHourKeys.tolist(), range(len(aryHourKeys))))
+
+    with profile.stage("read obs_hrly_derived"):
+        listHeader, listRows = readCsvRows(path_derived_hrly)
+        intC = (
+            listHeader.index("obs_hrly_derived_heatstress_cottonC") if listRows else 0
+        )
+        intF = (
+            listHeader.index("obs_hrly_derived_heatstress_cottonF") if listRows else 0
+        )
+        aryDerivedKeys = getObsKeyArray(listHeader, listRows, blnHour=True)
+    profile.addRows("read obs_hrly_derived", len(listRows))
+    with profile.stage("obs_hrly_derived"):
+        joins.addInvalid("obs_hrly_derived", int(np.count_nonzero(aryDerivedKeys < 0)))
+        for row, intKey in zip(listRows, aryDerivedKeys.tolist()):
+            intIndex = dictHourIndex.get(intKey)
+            if intIndex is not None:
+                row[intC] = listHourlyC[intIndex]
+                row[intF] = listHourlyF[intIndex]
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dictHourIndex.keys(),
+            "obs_hrly_derived",
+            set(aryDerivedKeys[aryDerivedKeys >= 0].tolist()),
+        )
+
+    profile.addRows("write obs_hrly_derived", len(listRows))
+    with profile.stage("write obs_hrly_derived"):
+        out_hrly = getUpdatedPath(path_derived_hrly)
+        writeCsvRows(out_hrly, listHeader, listRows)
+        del listRows
+
+    # daily obs -> heat units; the last obs row for a day wins, and days
+    # without any hourly obs are left as they are
+    with profile.stage("read obs_dyly"):
+        # days without any hourly obs aren't counted, as they aren't used
+        aryDailyKeys, (aryFltTempAirMax, aryFltTempAirMin) = readObsArrays(
+            path_obs_dyly,
+            DAILY_FIELDS,
+            missing,
+            aryCountKeys=dictHourly["day_keys"],
+        )
+    profile.addRows("read obs_dyly", len(aryDailyKeys))
+    with profile.stage("obs_dyly"):
+        joins.addInvalid("obs_dyly", int(np.count_nonzero(aryDailyKeys < 0)))
+        dictDailyIndex = {}
+        for intIndex, intKey in enumerate(aryDailyKeys.tolist()):
+            if intKey in dictDayIndex:
+                dictDailyIndex[intKey] = intIndex
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dictDayIndex.keys(),
+            "obs_dyly",
+            set(aryDailyKeys[aryDailyKeys >= 0].tolist()),
+        )
+    with profile.stage("obs_dyly"):
+        dictHeatUnits = calculateHeatUnitColumns(aryFltTempAirMax, aryFltTempAirMin)
+
+    # hourly roll-ups and heat units into the daily derived rows
+    with profile.stage("read obs_dyly_derived"):
+        listHeader, listRows = readCsvRows(path_derived_dyly)
+        aryDerivedKeys = getObsKeyArray(listHeader, listRows)
+        joins.addInvalid("obs_dyly_derived", int(np.count_nonzero(aryDerivedKeys < 0)))
+    profile.addRows("read obs_dyly_derived", len(listRows))
+    with profile.stage("joins"):
+        joins.compare(
+            "obs_hrly",
+            dictDayIndex.keys(),
+            "obs_dyly_derived",
+            set(aryDerivedKeys[aryDerivedKeys >= 0].tolist()),
+        )
+    with profile.stage("obs_dyly_derived"):
+        dictDaily = dictHourly["daily"]
+        if listRows:
+            dictColumns = getColumnIndexes(listHeader, dictDaily)
+            dictHeatUnitColumns = getColumnIndexes(listHeader, dictHeatUnits)
+
+        for row, intKey in zip(listRows, aryDerivedKeys.tolist()):
+            intDay = dictDayIndex.get(intKey)
+            if intDay is None:
+                continue
+
+            for strColumn, intColumn in dictColumns.items():
+                row[intColumn] = dictDaily[strColumn][intDay]
+
+            intDailyIndex = dictDailyIndex.get(intKey)
+            if intDailyIndex is not None:
+                for strColumn, intColumn in dictHeatUnitColumns.items():
+                    row[intColumn] = dictHeatUnits[strColumn][intDailyIndex]
+
+    with profile.stage("write obs_dyly_derived"):
+        out_dyly = getUpdatedPath(path_derived_dyly)
+        writeCsvRows(out_dyly, listHeader, listRows)
+    profile.addRows("write obs_dyly_derived", len(listRows))
+
+    return [out_hrly, out_dyly]
+
+
+# -----------------------------------------------------------------------------
+# In-memory tables
+#
+# updateDerivedTables() is updateDerived() for tables already in memory, e.g.
+# the data frames of the R download functions handed over through reticulate,
+# so that the derived tables don't go through a CSV and back on their way to
+# the _updated output. A table can be an Arrow Table or RecordBatch
+# (arrow::as_arrow_table() in R, passed without a copy), a pandas DataFrame (a
+# data frame converted by reticulate) or a dict of NumPy arrays or lists. Only
+# the key and input columns of the obs tables are read, as arrays, and the
+# derived tables come back as tables of the same kind with just the
+# recalculated columns replaced; every other column is passed through as it
+# is. The calculations are the NumPy backend's, so the values are the same as
+# those updateDerived() writes.
+
+
+def getTableColumn(table, strColumn=""):
+    # a column of a table as a NumPy array, without a copy where its type
+    # allows it; NA is NaN in a numeric column and None in any other
+    if pa is not None and isinstance(table, (pa.Table, pa.RecordBatch)):
+        return table.column(strColumn).to_numpy(zero_copy_only=False)
+
+    return np.asarray(table[strColumn])
+
+
+def getTableLength(table):
+    if pa is not None and isinstance(table, (pa.Table, pa.RecordBatch)):
+        return table.num_rows
+    if isinstance(table, dict):
+        return len(next(iter(table.values()), []))
+
+    return len(table)
+
+
+def setTableColumns(table, dictColumns):
+    # a copy of a table with the columns in dictColumns (name: array of
+    # strings) replaced, as strings, as the R download functions leave them
+    if pa is not None and isinstance(table, pa.Table):
+        for strColumn, aryValues in dictColumns.items():
+            table = table.set_column(
+                table.schema.get_field_index(strColumn),
+                strColumn,
+                pa.array(aryValues, type=pa.string()),
+            )
+        return table
+    if pa is not None and isinstance(table, pa.RecordBatch):
+        return pa.RecordBatch.from_arrays(
+            [
+                (
+                    pa.array(dictColumns[strColumn], type=pa.string())
+                    if strColumn in dictColumns
+                    else table.column(intColumn)
+                )
+                for intColumn, strColumn in enumerate(table.schema.names)
+            ],
+            names=table.schema.names,
+        )
+    if isinstance(table, dict):
+        return dict(table, **dictColumns)
+
+    return table.assign(**dictColumns)
+
+
+def parseIntColumn(aryColumn):
+    # (int64 array, valid mask) of a key column, which comes as integers,
+    # floats (an R integer column with NA, through pandas) or strings
+    if aryColumn.dtype.kind in "iu":
+        return aryColumn.astype(np.int64), np.ones(len(aryColumn), dtype=bool)
+    if aryColumn.dtype.kind == "f":
+        aryValid = np.isfinite(aryColumn)
+        aryValid[aryValid] = aryColumn[aryValid] == np.floor(aryColumn[aryValid])
+        return np.where(aryValid, aryColumn, 0).astype(np.int64), aryValid
+
+    # strings, like the CSVs' "1987", "001" and "0100"; None for NA
+    listInts = list(map(getHourPart, aryColumn.tolist()))
+    aryValid = np.array([intValue is not None for intValue in listInts], dtype=bool)
+
+    return (
+        np.array([intValue or 0 for intValue in listInts], dtype=np.int64),
+        aryValid,
+    )
+
+
+def getTableKeyArray(table, blnHour=False):
+    # getObsKey() for every row of a table as an int64 array, with -1 for
+    # invalid keys
+    listKeyColumns = ["obs_year", "obs_doy"] + (["obs_hour"] if blnHour else [])
+    aryKeys = np.zeros(getTableLength(table), dtype=np.int64)
+    aryValid = np.ones(len(aryKeys), dtype=bool)
+    for strColumn, intScale in zip(listKeyColumns, (10**7, 10**4, 1)):
+        aryInts, aryColumnValid = parseIntColumn(getTableColumn(table, strColumn))
+        aryKeys += aryInts * intScale
+        aryValid &= aryColumnValid
+
+    return np.where(aryValid, aryKeys, -1)
+
+
+def getTableValues(table, listFields, missing, aryCounted=None):
+    # MissingValues.parseNumbers() (or parseArray(), for a column of strings)
+    # of each of listFields, counting the rows where aryCounted is true
+    listValues = []
+    for strField in listFields:
+        aryColumn = getTableColumn(table, strField)
+        if aryColumn.dtype.kind in "fiu":
+            listValues.append(missing.parseNumbers(aryColumn, strField, aryCounted)[0])
+        else:
+            listValues.append(
+                missing.parseArray(
+                    [
+                        "NA" if value is None else str(value)
+                        for value in aryColumn.tolist()
+                    ],
+                    strField,
+                    aryCounted,
+                )[0]
+            )
+
+    return listValues
+
+
+def getLastRows(aryKeys):
+    # (distinct keys in order, index of the last row with each)
+    aryUnique, aryFirst = np.unique(aryKeys[::-1], return_index=True)
+
+    return aryUnique, len(aryKeys) - 1 - aryFirst
+
+
+def findKeys(aryUnique, aryKeys):
+    # index in aryUnique of each of aryKeys, -1 where it isn't there
+    aryIndexes = np.searchsorted(aryUnique, aryKeys)
+    aryFound = aryIndexes < len(aryUnique)
+    aryFound[aryFound] = aryUnique[aryIndexes[aryFound]] == aryKeys[aryFound]
+
+    return np.where(aryFound, aryIndexes, -1)
+
+
+def replaceMatched(table, dictValues, aryIndexes):
+    # {column: table's column, with the rows that have an index in aryIndexes
+    # set to that element of dictValues[column]}
+    aryMatched = aryIndexes >= 0
+    dictColumns = {}
+    for strColumn, listValues in dictValues.items():
+        aryColumn = getTableColumn(table, strColumn).astype(object)
+        aryColumn[aryMatched] = np.array(listValues, dtype=object)[
+            aryIndexes[aryMatched]
+        ]
+        dictColumns[strColumn] = aryColumn
+
+    return dictColumns
+
+
+def updateDerivedTables(
+    obs_hrly,
+    derived_hrly,
+    obs_dyly,
+    derived_dyly,
+    missing=None,
+    joins=None,
+    profile=None,
+):
+    # [updated derived_hrly, updated derived_dyly] of the four tables of a
+    # station, the same values updateDerived() would write for their CSVs;
+    # missing, joins and profile as for updateDerived()
+    requireNumpy()
+    if missing is None:
+        missing = MissingValues()
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+
+    with profile.profile():
+        with profile.stage("obs_hrly"):
+            aryHourKeys = getTableKeyArray(obs_hrly, blnHour=True)
+            aryValid = aryHourKeys >= 0
+            joins.addInvalid("obs_hrly", int(np.count_nonzero(~aryValid)))
+            aryHourKeys = aryHourKeys[aryValid]
+            dictHourly = calculateHourlyArrays(
+                aryHourKeys,
+                [
+                    aryValues[aryValid]
+                    for aryValues in getTableValues(
+                        obs_hrly, HOURLY_FIELDS, missing, aryValid
+                    )
+                ],
+            )
+            # the last obs row for an hour wins
+            aryHours, aryLastHours = getLastRows(aryHourKeys)
+            aryDays = dictHourly["day_keys"]
+        profile.addRows("obs_hrly", len(aryHourKeys))
+
+        with profile.stage("obs_hrly_derived"):
+            aryDerivedKeys = getTableKeyArray(derived_hrly, blnHour=True)
+            joins.addInvalid(
+                "obs_hrly_derived", int(np.count_nonzero(aryDerivedKeys < 0))
+            )
+            aryIndexes = findKeys(aryHours, aryDerivedKeys)
+            aryIndexes[aryIndexes >= 0] = aryLastHours[aryIndexes[aryIndexes >= 0]]
+            derived_hrly = setTableColumns(
+                derived_hrly,
+                replaceMatched(
+                    derived_hrly,
+                    {
+                        "obs_hrly_derived_heatstress_cottonC": dictHourly["hourly_c"],
+                        "obs_hrly_derived_heatstress_cottonF": dictHourly["hourly_f"],
+                    },
+                    aryIndexes,
+                ),
+            )
+        profile.addRows("obs_hrly_derived", len(aryDerivedKeys))
+        with profile.stage("joins"):
+            joins.compare(
+                "obs_hrly",
+                set(aryHours.tolist()),
+                "obs_hrly_derived",
+                set(aryDerivedKeys[aryDerivedKeys >= 0].tolist()),
+            )
+
+        # daily obs -> heat units; the last obs row for a day wins, and days
+        # without any hourly obs are left as they are
+        with profile.stage("obs_dyly"):
+            aryDailyKeys = getTableKeyArray(obs_dyly)
+            joins.addInvalid("obs_dyly", int(np.count_nonzero(aryDailyKeys < 0)))
+            dictHeatUnits = calculateHeatUnitColumns(
+                *getTableValues(
+                    obs_dyly, DAILY_FIELDS, missing, np.isin(aryDailyKeys, aryDays)
+                )
+            )
+            aryDailyDays, aryLastDays = getLastRows(aryDailyKeys)
+        profile.addRows("obs_dyly", len(aryDailyKeys))
+        with profile.stage("joins"):
+            joins.compare(
+                "obs_hrly",
+                set(aryDays.tolist()),
+                "obs_dyly",
+                set(aryDailyKeys[aryDailyKeys >= 0].tolist()),
+            )
+
+        with profile.stage("obs_dyly_derived"):
+            aryDerivedKeys = getTableKeyArray(derived_dyly)
+            joins.addInvalid(
+                "obs_dyly_derived", int(np.count_nonzero(aryDerivedKeys < 0))
+            )
+            aryIndexes = findKeys(aryDays, aryDerivedKeys)
+            dictColumns = replaceMatched(derived_dyly, dictHourly["daily"], aryIndexes)
+            # heat units only for days with hourly obs too
+            aryDailyIndexes = findKeys(aryDailyDays, aryDerivedKeys)
+            aryDailyIndexes[aryIndexes < 0] = -1
+            aryDailyIndexes[aryDailyIndexes >= 0] = aryLastDays[
+                aryDailyIndexes[aryDailyIndexes >= 0]
+            ]
+            dictColumns.update(
+                replaceMatched(derived_dyly, dictHeatUnits, aryDailyIndexes)
+            )
+            derived_dyly = setTableColumns(derived_dyly, dictColumns)
+        profile.addRows("obs_dyly_derived", len(aryDerivedKeys))
+        with profile.stage("joins"):
+            joins.compare(
+                "obs_hrly",
+                set(aryDays.tolist()),
+                "obs_dyly_derived",
+                set(aryDerivedKeys[aryDerivedKeys >= 0].tolist()),
+            )
+
+    return [derived_hrly, derived_dyly]
+
+
+# -----------------------------------------------------------------------------
+# Memory-mapped column reader
+#
+# The obs files are read for a handful of their columns. Instead of a list of
+# strings for every field of every row, the file is memory-mapped and walked a
+# chunk of whole records at a time: NumPy finds every comma and newline in the
+# chunk, and only the fields of the wanted columns are copied out, into
+# fixed-width bytes arrays that convert straight to int64 and float64. A chunk
+# with quotes, blank lines or ragged rows goes through the csv module instead,
+# so readr's quoting ("Parker, AZ", "a ""b""") and NA come out the same either
+# way. Only the typed arrays are kept, so a file larger than memory can still
+# be read.
+
+CSV_CHUNK_BYTES = 2**24
+
+
+def findRecordEnd(mm, aryBytes, intStart=0, intTarget=0):
+    # offset just past the first newline at or after intTarget that isn't
+    # inside a quoted field of the records starting at intStart, or the end
+    # of the file
+    intEnd = max(intStart, intTarget)
+    while True:
+        intNewline = mm.find(b"\n", intEnd)
+        if intNewline < 0:
+            return len(mm)
+        intEnd = intNewline + 1
+        if np.count_nonzero(aryBytes[intStart:intNewline] == ord('"')) % 2 == 0:
+            return intEnd
+
+
+def gatherFields(aryBytes, aryStarts, aryEnds):
+    # the bytes aryBytes[start:end] of each field as a fixed-width bytes
+    # array; NumPy drops the NUL padding when the values are read
+    aryLengths = aryEnds - aryStarts
+    intWidth = max(int(aryLengths.max(initial=0)), 1)
+    aryOffsets = np.arange(intWidth)
+    aryIndex = np.minimum(aryStarts[:, None] + aryOffsets, len(aryBytes) - 1)
+    aryFields = np.where(
+        aryOffsets < aryLengths[:, None], aryBytes[aryIndex], 0
+    ).astype(np.uint8)
+
+    return aryFields.view(f"S{intWidth}").reshape(-1)
+
+
+def splitChunk(aryChunk, intColumns, listIndexes):
+    # [bytes array of each column in listIndexes] for a chunk of records
+    # without quotes, or None unless every record has intColumns fields
+    if aryChunk[-1] != ord("\n"):
+        aryChunk = np.append(aryChunk, np.uint8(ord("\n")))
+    aryNewline = aryChunk == ord("\n")
+    aryDelimiters = np.flatnonzero(aryNewline | (aryChunk == ord(",")))
+    if len(aryDelimiters) % intColumns:
+        return None
+    aryDelimiters = aryDelimiters.reshape(-1, intColumns)
+    # as many records as newlines, each ending at one, leaves only commas
+    # between the fields of each record
+    if np.count_nonzero(aryNewline) != len(aryDelimiters) or not np.all(
+        aryNewline[aryDelimiters[:, -1]]
+    ):
+        return None
+
+    aryRowStarts = np.concatenate(([0], aryDelimiters[:-1, -1] + 1))
+    listColumns = []
+    for intIndex in listIndexes:
+        aryStarts = (
+            aryRowStarts if intIndex == 0 else aryDelimiters[:, intIndex - 1] + 1
+        )
+        aryEnds = aryDelimiters[:, intIndex]
+        if intIndex == intColumns - 1:
+            # \r\n line endings
+            aryEnds = aryEnds - (aryChunk[np.maximum(aryEnds - 1, 0)] == ord("\r"))
+            aryEnds = np.maximum(aryEnds, aryStarts)
+        listColumns.append(gatherFields(aryChunk, aryStarts, aryEnds))
+
+    return listColumns
+
+
+def splitChunkCsv(aryChunk, intColumns, listIndexes):
+    # splitChunk() with the csv module, for anything else; blank lines are
+    # skipped and short rows padded with "", as csv.DictReader would
+    listRows = [
+        row + [""] * (intColumns - len(row))
+        for row in csv.reader(io.StringIO(aryChunk.tobytes().decode(), newline=""))
+        if row
+    ]
+
+    return [
+        np.array([row[intIndex].encode() for row in listRows], dtype=bytes)
+        for intIndex in listIndexes
+    ]
+
+
+def iterMappedChunks(path, intChunkBytes=CSV_CHUNK_BYTES):
+    # Yields the header record of the csv at path, then chunks of whole
+    # records of about intChunkBytes, as uint8 views of the memory-mapped file
+    with open(path, "rb") as csvfile:
+        if os.fstat(csvfile.fileno()).st_size == 0:
+            return
+        # the mapping stays open until the last view of it is gone
+        mm = mmap.mmap(csvfile.fileno(), 0, access=mmap.ACCESS_READ)
+    aryBytes = np.frombuffer(mm, dtype=np.uint8)
+
+    intStart = findRecordEnd(mm, aryBytes)
+    yield aryBytes[:intStart]
+    while intStart < len(mm):
+        intEnd = findRecordEnd(mm, aryBytes, intStart, intStart + intChunkBytes)
+        yield aryBytes[intStart:intEnd]
+        intStart = intEnd
+
+
+def getRecordEnds(aryBytes):
+    # offsets just past every newline of aryBytes that isn't inside a quoted
+    # field, for bytes that start at the start of a record
+    aryNewlines = np.flatnonzero(aryBytes == ord("\n"))
+    aryQuotes = np.cumsum(aryBytes == ord('"'))
+
+    return aryNewlines[aryQuotes[aryNewlines] % 2 == 0] + 1
+
+
+def iterStreamChunks(path, intChunkBytes=CSV_CHUNK_BYTES):
+    # iterMappedChunks() for a compressed file or a zip archive member, which
+    # can't be mapped: it is decompressed intChunkBytes at a time, and
+    # whatever follows the last whole record is carried over to the next
+    with openBinary(path) as file:
+        bytBuffer = b""
+        blnHeader = True
+        for bytRead in iter(functools.partial(file.read, intChunkBytes), b""):
+            bytBuffer += bytRead
+            aryEnds = getRecordEnds(np.frombuffer(bytBuffer, dtype=np.uint8))
+            if blnHeader and len(aryEnds):
+                blnHeader = False
+                yield np.frombuffer(bytBuffer[: aryEnds[0]], dtype=np.uint8)
+                bytBuffer = bytBuffer[aryEnds[0] :]
+                aryEnds = aryEnds[1:] - aryEnds[0]
+            if not blnHeader and len(aryEnds):
+                yield np.frombuffer(bytBuffer[: aryEnds[-1]], dtype=np.uint8)
+                bytBuffer = bytBuffer[aryEnds[-1] :]
+        if bytBuffer:
+            yield np.frombuffer(bytBuffer, dtype=np.uint8)
+
+
+def iterCsvColumns(path, listColumns, intChunkBytes=CSV_CHUNK_BYTES):
+    # Yields {column: bytes array of its fields} for each chunk of about
+    # intChunkBytes of the csv at path, for just the columns in listColumns
+    requireNumpy()
+    if getCompression(path) is None and splitArchivePath(path)[1] is None:
+        iterChunks = iterMappedChunks(path, intChunkBytes)
+    else:
+        iterChunks = iterStreamChunks(path, intChunkBytes)
+
+    aryHeader = next(iterChunks, None)
+    if aryHeader is None:
+        return
+    listHeader = next(
+        csv.reader(io.StringIO(aryHeader.tobytes().decode(), newline="")), []
+    )
+    listIndexes = [listHeader.index(strColumn) for strColumn in listColumns]
+    for aryChunk in iterChunks:
+        listFields = None
+        if not np.any(aryChunk == ord('"')):
+            listFields = splitChunk(aryChunk, len(listHeader), listIndexes)
+        if listFields is None:
+            listFields = splitChunkCsv(aryChunk, len(listHeader), listIndexes)
+        yield dict(zip(listColumns, listFields))
+
+
+def readObsArrays(
+    path,
+    listFields,
+    missing=None,
+    blnHour=False,
+    intChunkBytes=CSV_CHUNK_BYTES,
+    aryCountKeys=None,
+):
+    # (getObsKeyArray() of each row, [MissingValues.parseArray() values of
+    # each of listFields]) for an obs file, read with iterCsvColumns(). Only
+    # the values of rows with a valid key are counted in missing, as the
+    # other backends skip the rest, and with aryCountKeys only
+    # those of rows whose key is in it.
+    if missing is None:
+        missing = defaultMissingValues
+    listKeyColumns = ["obs_year", "obs_doy"] + (["obs_hour"] if blnHour else [])
+    listKeys = [np.zeros(0, dtype=np.int64)]
+    # parsing no values at all still lists each field in missing.getCounts()
+    listValues = [
+        [missing.parseBytes(np.zeros(0, dtype="S1"), strField)[0]]
+        for strField in listFields
+    ]
+    for dictChunk in iterCsvColumns(
+        path, listKeyColumns + list(listFields), intChunkBytes
+    ):
+        aryKeys = getKeyArray([dictChunk[strColumn] for strColumn in listKeyColumns])
+        listKeys.append(aryKeys)
+        if aryCountKeys is None:
+            aryCounted = aryKeys >= 0
+        else:
+            aryCounted = np.isin(aryKeys, aryCountKeys)
+        for listChunks, strField in zip(listValues, listFields):
+            listChunks.append(
+                missing.parseBytes(dictChunk[strField], strField, aryCounted)[0]
+            )
+
+    return np.concatenate(listKeys), [
+        np.concatenate(listChunks) for listChunks in listValues
+    ]
+
+
+# -----------------------------------------------------------------------------
+# Parquet output
+#
+# The _updated CSVs written as Parquet datasets partitioned by station and
+# year, <path_parquet>/<table>/station_id=az01/obs_year=1987/part-0.parquet,
+# so that validation and loading can read just the columns and years they
+# need. Column types come from the CREATE TABLE statements in the AZMet SQL
+# schema; nearly everything there is a varchar, so values are kept exactly as
+# they appear in the CSVs ("-0.0", "-9999.0", "0428").
+
+
+def requirePyarrow():
+    if pa is None:
+        raise ImportError("Parquet output requires the pyarrow package")
+
+
+def getArrowType(strSqlType=""):
+    # Arrow type for a MySQL column type, e.g. "int unsigned" -> uint32
+    strSqlType = strSqlType.lower()
+    blnUnsigned = "unsigned" in strSqlType
+    strBaseType = re.match(r"\w+", strSqlType).group()
+    if strBaseType in ("datetime", "timestamp"):
+        return pa.timestamp("s")
+    if strBaseType == "date":
+        return pa.date32()
+    if strBaseType in ("tinyint", "smallint", "int", "bigint"):
+        intBits = {"tinyint": 8, "smallint": 16, "int": 32, "bigint": 64}[strBaseType]
+        return getattr(pa, f"{'u' if blnUnsigned else ''}int{intBits}")()
+    if strBaseType in ("float", "double"):
+        return pa.float64()
+
+    return pa.string()
+
+
+def readSchemaTypes(path_schema=SCHEMA_PATH, strTable=""):
+    # {column: Arrow type} from the CREATE TABLE statement for strTable
+    return {
+        strColumn: getArrowType(strDefinition)
+        for strColumn, strDefinition in readCreateTable(path_schema, strTable)[
+            "columns"
+        ]
+    }
+
+
+def castBatch(batch, schema, setMissing):
+    # a batch of string columns as the types in schema; missing values in
+    # non-string columns become nulls
+    listColumns = []
+    for field, column in zip(schema, batch.columns):
+        if field.type != pa.string():
+            column = pc.if_else(
+                pc.is_in(column, value_set=pa.array(sorted(setMissing))),
+                pa.scalar(None, pa.string()),
+                column,
+            ).cast(field.type)
+        listColumns.append(column)
+
+    return pa.RecordBatch.from_arrays(listColumns, schema=schema)
+
+
+def writeDerivedParquet(
+    path_csv, path_parquet, strTable="", path_schema=SCHEMA_PATH, setMissing=None
+):
+    # Write one _updated CSV into the strTable dataset under path_parquet,
+    # replacing any files already there for the same stations and years. The
+    # CSV is read in batches, so memory use stays flat however large it is.
+    requirePyarrow()
+    if setMissing is None:
+        setMissing = MISSING_SENTINELS
+
+    with openCsv(path_csv) as csvfile:
+        listHeader = next(csv.reader(csvfile), [])
+    if not listHeader:
+        return  # nothing to write for a station without any rows
+
+    dictTypes = readSchemaTypes(path_schema, strTable)
+    schema = pa.schema(
+        [(strColumn, dictTypes.get(strColumn, pa.string())) for strColumn in listHeader]
+    )
+    # read through openBinary(), so that it can be compressed
+    with openBinary(path_csv) as file:
+        reader = pacsv.open_csv(
+            file,
+            convert_options=pacsv.ConvertOptions(
+                column_types={strColumn: pa.string() for strColumn in listHeader},
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+
+        pads.write_dataset(
+            (castBatch(batch, schema, setMissing) for batch in reader),
+            os.path.join(path_parquet, strTable),
+            schema=schema,
+            format="parquet",
+            partitioning=pads.partitioning(
+                pa.schema([("station_id", pa.string()), ("obs_year", pa.string())]),
+                flavor="hive",
+            ),
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+            file_options=pads.ParquetFileFormat().make_write_options(
+                compression="zstd",
+                # timestamps and counters are nearly all distinct, but sorted, so
+                # delta encode them instead of building a dictionary
+                use_dictionary=[
+                    field.name for field in schema if field.type == pa.string()
+                ],
+                column_encoding={
+                    field.name: "DELTA_BINARY_PACKED"
+                    for field in schema
+                    if field.type != pa.string()
+                },
+            ),
+        )
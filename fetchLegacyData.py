@@ -0,0 +1,370 @@
+# Download the raw legacy AZMET files (one hourly and one daily file per
+# station and year, e.g. http://azmet.arizona.edu/azmet/data/0187rh.txt) into a
+# local cache, many at a time, instead of one after another with a
+# Sys.sleep(3) between stations as run.R does. Requests are capped globally
+# (--concurrency) and spaced out per host (--rate), and every file is kept with
+# its ETag and Last-Modified so that a rerun only asks the server whether it
+# changed. Point the R download functions at the cache with
+# raw_dir = "legacy/raw" and they read these files instead of the URLs.
+#
+# python fetchLegacyData.py fetch legacy/raw azmet-station-list.csv --years 1987 2019
+#
+# "serve" stands in for the AZMET server when testing offline: it serves the
+# files under a directory with ETags and answers conditional requests with 304.
+#
+# python fetchLegacyData.py serve fixtures --port 8000
+# python fetchLegacyData.py fetch raw azmet-station-list.csv --base-url http://127.0.0.1:8000/
+
+import argparse
+import asyncio
+import csv
+import functools
+import http.client
+import http.server
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from csvParseAndProcess import openAtomic
+
+BASE_URL = "http://azmet.arizona.edu/azmet/data/"
+# the same years as run.R, limited to each station's start_yr and end_yr
+YEARS = (1986, 2019)
+# file name suffix of each resolution, as in the R download functions
+SUFFIXES = {"hourly": "rh.txt", "daily": "rd.txt"}
+
+
+def readStations(path_station_list):
+    # [(stn, stn_no, start_yr, end_yr)] from azmet-station-list.csv
+    with open(path_station_list, "r", newline="") as csvfile:
+        return [
+            (row["stn"], int(row["stn_no"]), int(row["start_yr"]), int(row["end_yr"]))
+            for row in csv.DictReader(csvfile)
+        ]
+
+
+def getFileName(intStationNumber=1, intYear=1987, strResolution="hourly"):
+    # 1, 1987, "hourly" -> "0187rh.txt", the name on the server
+    return f"{intStationNumber:02d}{intYear % 100:02d}{SUFFIXES[strResolution]}"
+
+
+def listRawFiles(
+    listStations, intStartYear=YEARS[0], intEndYear=YEARS[1], listResolutions=None
+):
+    # [{"station", "year", "resolution", "name"}] for every file to fetch
+    if listResolutions is None:
+        listResolutions = list(SUFFIXES)
+
+    return [
+        {
+            "station": strStation,
+            "year": intYear,
+            "resolution": strResolution,
+            "name": getFileName(intStationNumber, intYear, strResolution),
+        }
+        for strResolution in listResolutions
+        for strStation, intStationNumber, intStart, intEnd in listStations
+        for intYear in range(max(intStart, intStartYear), min(intEnd, intEndYear) + 1)
+    ]
+
+
+def getMetadataPath(path=""):
+    # raw/0187rh.txt -> raw/0187rh.txt.json
+    return f"{path}.json"
+
+
+def readMetadata(path=""):
+    # what the server said about the cached copy of path last time, or {}
+    # if there isn't one
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(getMetadataPath(path), "r") as jsonfile:
+            return json.load(jsonfile)
+    except (OSError, ValueError):
+        return {}
+
+
+def requestUrl(strUrl="", dictHeaders=None, fltTimeout=60.0):
+    # (status, headers, body) of a GET; blocking, so run in a thread. HTTP
+    # errors, including 304 Not Modified, come back as a status, not raised.
+    request = urllib.request.Request(strUrl, headers=dictHeaders or {})
+    try:
+        with urllib.request.urlopen(request, timeout=fltTimeout) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers or {}), b""
+
+
+class HostRateLimiter:
+    # Spaces out the start of requests to the same host to at most fltRate a
+    # second, in place of run.R's fixed Sys.sleep(3)
+
+    def __init__(self, fltRate=5.0):
+        self.fltInterval = 1 / fltRate if fltRate else 0.0
+        self.dictNext = {}
+        self.dictLocks = {}
+
+    async def wait(self, strHost=""):
+        lock = self.dictLocks.setdefault(strHost, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            fltNext = self.dictNext.get(strHost, 0.0)
+            if fltNext > loop.time():
+                await asyncio.sleep(fltNext - loop.time())
+            self.dictNext[strHost] = loop.time() + self.fltInterval
+
+
+async def fetchFile(
+    dictFile,
+    path_cache,
+    strBaseUrl=BASE_URL,
+    semaphore=None,
+    limiter=None,
+    intRetries=3,
+    fltTimeout=60.0,
+):
+    # Fetch one file into path_cache unless the cached copy is still current.
+    # Returns dictFile with "url", "path", "status" ("downloaded",
+    # "not modified", "missing" for a 404, or "error") and "bytes". A 404
+    # removes any cached copy, so raw_dir readers don't load a file the
+    # server no longer has.
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+    if limiter is None:
+        limiter = HostRateLimiter(0)
+    strUrl = urllib.parse.urljoin(strBaseUrl, dictFile["name"])
+    path = os.path.join(path_cache, dictFile["name"])
+    dictResult = dict(dictFile, url=strUrl, path=path, status="error", bytes=0)
+
+    dictMetadata = readMetadata(path)
+    dictHeaders = {}
+    if dictMetadata.get("etag"):
+        dictHeaders["If-None-Match"] = dictMetadata["etag"]
+    if dictMetadata.get("last_modified"):
+        dictHeaders["If-Modified-Since"] = dictMetadata["last_modified"]
+
+    fltStart = time.perf_counter()
+    for intAttempt in range(intRetries + 1):
+        if intAttempt:
+            await asyncio.sleep(2**intAttempt)  # back off before each retry
+        async with semaphore:
+            await limiter.wait(urllib.parse.urlsplit(strUrl).netloc)
+            try:
+                intStatus, dictResponseHeaders, bytContent = await asyncio.to_thread(
+                    requestUrl, strUrl, dictHeaders, fltTimeout
+                )
+            except (OSError, ValueError, http.client.HTTPException) as e:
+                # connection errors, timeouts and truncated responses
+                dictResult["error"] = f"{type(e).__name__}: {e}"
+                continue
+
+        dictResult.pop("error", None)
+        if intStatus == 304:
+            dictResult["status"] = "not modified"
+            dictResult["bytes"] = os.path.getsize(path)
+        elif intStatus == 404:
+            dictResult["status"] = "missing"
+            for path_cached in (path, getMetadataPath(path)):
+                if os.path.exists(path_cached):
+                    os.remove(path_cached)
+        elif intStatus == 200:
+            with openAtomic(path, blnBinary=True) as file:
+                file.write(bytContent)
+            with openAtomic(getMetadataPath(path)) as jsonfile:
+                json.dump(
+                    {
+                        "url": strUrl,
+                        "etag": dictResponseHeaders.get("ETag"),
+                        "last_modified": dictResponseHeaders.get("Last-Modified"),
+                    },
+                    jsonfile,
+                )
+            dictResult["status"] = "downloaded"
+            dictResult["bytes"] = len(bytContent)
+        else:
+            dictResult["error"] = f"HTTP {intStatus}"
+            if intStatus == 429 or intStatus >= 500:
+                continue  # worth another try
+        break
+    dictResult["seconds"] = round(time.perf_counter() - fltStart, 3)
+
+    return dictResult
+
+
+async def fetchFiles(
+    listFiles,
+    path_cache,
+    strBaseUrl=BASE_URL,
+    intConcurrency=4,
+    fltRate=5.0,
+    intRetries=3,
+    fltTimeout=60.0,
+    fnReport=None,
+):
+    # fetchFile() for every file, at most intConcurrency at a time and
+    # fltRate a second per host. Returns the results in listFiles order;
+    # fnReport is called with each one as soon as it is done.
+    os.makedirs(path_cache, exist_ok=True)
+    semaphore = asyncio.Semaphore(intConcurrency)
+    limiter = HostRateLimiter(fltRate)
+
+    async def fetchAndReport(dictFile):
+        dictResult = await fetchFile(
+            dictFile,
+            path_cache,
+            strBaseUrl,
+            semaphore,
+            limiter,
+            intRetries,
+            fltTimeout,
+        )
+        if fnReport is not None:
+            fnReport(dictResult)
+        return dictResult
+
+    return await asyncio.gather(*(fetchAndReport(dictFile) for dictFile in listFiles))
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler plus an ETag on every file, and 304 Not
+    # Modified for a request whose If-None-Match still matches it
+
+    def send_head(self):
+        self.strEtag = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.strEtag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.headers.get("If-None-Match") == self.strEtag:
+                self.send_response(http.server.HTTPStatus.NOT_MODIFIED)
+                self.end_headers()
+                return None
+
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, "strEtag", None):
+            self.send_header("ETag", self.strEtag)
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass  # no line per request on stderr
+
+
+def serveFixtures(path_fixtures, strHost="127.0.0.1", intPort=8000):
+    # An HTTP server for the files under path_fixtures; call serve_forever() on
+    # it, or run it in a thread. intPort=0 picks a free port, see
+    # server.server_address.
+    return http.server.ThreadingHTTPServer(
+        (strHost, intPort), functools.partial(FixtureHandler, directory=path_fixtures)
+    )
+
+
+def printResult(dictResult):
+    if dictResult["status"] == "error":
+        print(
+            f"{dictResult['name']} ({dictResult['station']}): "
+            f"{dictResult['status']} - {dictResult['error']}",
+            file=sys.stderr,
+            flush=True,
+        )
+    elif dictResult["status"] == "downloaded":
+        print(
+            f"{dictResult['name']} ({dictResult['station']}): downloaded "
+            f"{dictResult['bytes']} bytes ({dictResult['seconds']}s)",
+            flush=True,
+        )
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch the raw legacy AZMET files into a local cache"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parserFetch = subparsers.add_parser("fetch", help="fetch into a cache directory")
+    parserFetch.add_argument("cache", help="directory to keep the raw files in")
+    parserFetch.add_argument("station_list", help="e.g. azmet-station-list.csv")
+    parserFetch.add_argument(
+        "--years", type=int, nargs=2, default=YEARS, metavar=("START", "END")
+    )
+    parserFetch.add_argument(
+        "--resolution", choices=list(SUFFIXES), action="append", dest="resolutions"
+    )
+    parserFetch.add_argument("--base-url", default=BASE_URL)
+    parserFetch.add_argument(
+        "--concurrency", type=int, default=4, help="requests in flight at once"
+    )
+    parserFetch.add_argument(
+        "--rate",
+        type=float,
+        default=5.0,
+        help="requests a second to any one host (0 for no limit)",
+    )
+    parserFetch.add_argument("--retries", type=int, default=3)
+    parserFetch.add_argument("--timeout", type=float, default=60.0)
+    parserFetch.add_argument(
+        "--report", help="write per-file results to this JSON file"
+    )
+
+    parserServe = subparsers.add_parser(
+        "serve", help="serve a directory of fixture files for offline testing"
+    )
+    parserServe.add_argument("fixtures", help="directory with e.g. 0187rh.txt")
+    parserServe.add_argument("--host", default="127.0.0.1")
+    parserServe.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(listArgs)
+
+    if args.command == "serve":
+        server = serveFixtures(args.fixtures, args.host, args.port)
+        strHost, intPort = server.server_address[:2]
+        print(f"serving {args.fixtures} on http://{strHost}:{intPort}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+        return 0
+
+    fltStart = time.perf_counter()
+    listResults = asyncio.run(
+        fetchFiles(
+            listRawFiles(
+                readStations(args.station_list), *args.years, args.resolutions
+            ),
+            args.cache,
+            args.base_url,
+            intConcurrency=args.concurrency,
+            fltRate=args.rate,
+            intRetries=args.retries,
+            fltTimeout=args.timeout,
+            fnReport=printResult,
+        )
+    )
+    fltSeconds = round(time.perf_counter() - fltStart, 3)
+
+    dictStatuses = {}
+    for dictResult in listResults:
+        dictStatuses[dictResult["status"]] = (
+            dictStatuses.get(dictResult["status"], 0) + 1
+        )
+    print(
+        f"{len(listResults)} files in {fltSeconds}s: "
+        + ", ".join(
+            f"{intCount} {strStatus}" for strStatus, intCount in dictStatuses.items()
+        )
+    )
+    if args.report:
+        with open(args.report, "w") as jsonfile:
+            json.dump({"seconds": fltSeconds, "files": listResults}, jsonfile, indent=2)
+
+    return 1 if dictStatuses.get("error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
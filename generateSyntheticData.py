@@ -0,0 +1,652 @@
+# Write synthetic legacy CSVs for any number of stations and years, in the same
+# layout, formatting and missing value codes as the files run.R scrapes into
+# legacy/, so updateDerived() can be benchmarked and tested without network
+# access. The weather is made up (a seasonal and daily temperature cycle plus
+# noise), but it is self-consistent: daily obs are the max, min and mean of the
+# hourly obs, and derived values are the R unit conversions of the obs.
+#
+# python generateSyntheticData.py synthetic --stations 4 --years 1987 1990 --missing 0.02
+
+import argparse
+import contextlib
+import csv
+import datetime
+import math
+import os
+import random
+import sys
+
+from batchUpdateDerived import getStationPaths
+
+# how azmet_hourly_data_download() and azmet_daily_data_download() write NA,
+# by the number of digits a column is rounded to
+NA_VALUES = {2: "-999.00", 1: "-9999.0", 0: "-99999"}
+
+# sentinels left in by the AZMET loggers themselves, which the R code passes
+# through unchanged
+LOGGER_SENTINELS = ("-7999", "-6999")
+
+OBS_HRLY_HEADER = (
+    "station_id",
+    "station_number",
+    "obs_datetime",
+    "obs_year",
+    "obs_doy",
+    "obs_hour",
+    "obs_seconds",
+    "obs_version",
+    "obs_creation_reason",
+    "obs_needs_review",
+    "obs_prg_code",
+)
+
+# (column, digits) of the measured values, in file order
+OBS_HRLY_VALUES = (
+    ("obs_hrly_temp_air", 1),
+    ("obs_hrly_relative_humidity", 0),
+    ("obs_hrly_vpd", 2),
+    ("obs_hrly_sol_rad_total", 2),
+    ("obs_hrly_precip_total", 1),
+    ("obs_hrly_temp_soil_10cm", 1),
+    ("obs_hrly_temp_soil_50cm", 1),
+    ("obs_hrly_wind_spd", 1),
+    ("obs_hrly_wind_vector_magnitude", 1),
+    ("obs_hrly_wind_vector_dir", 0),
+    ("obs_hrly_wind_vector_dir_stand_dev", 0),
+    ("obs_hrly_wind_spd_max", 1),
+    ("obs_hrly_wind_2min_vector_dir", 0),
+    ("obs_hrly_wind_2min_spd_max", 1),
+    ("obs_hrly_wind_2min_spd_mean", 1),
+    ("obs_hrly_wind_2min_timestamp", 0),
+    ("obs_hrly_actual_vp", 2),
+    ("obs_hrly_bat_volt", 2),
+)
+
+DERIVED_HRLY_HEADER = (
+    "station_id",
+    "obs_year",
+    "obs_doy",
+    "obs_hour",
+    "obs_seconds",
+    "obs_datetime",
+    "obs_version",
+    "obs_creation_reason",
+)
+
+# None for columns the R code doesn't round, which are written as NA
+DERIVED_HRLY_VALUES = (
+    ("obs_hrly_derived_temp_airF", 1),
+    ("obs_hrly_sol_rad_total_ly", 2),
+    ("obs_hrly_derived_precip_total_in", 2),
+    ("obs_hrly_derived_temp_soil_10cmF", 1),
+    ("obs_hrly_derived_temp_soil_50cmF", 1),
+    ("obs_hrly_derived_wind_spd_mph", 1),
+    ("obs_hrly_wind_vector_magnitude_mph", None),
+    ("obs_hrly_derived_wind_spd_max_mph", 1),
+    ("obs_hrly_derived_wind_2min_spd_max_mph", 1),
+    ("obs_hrly_derived_wind_2min_spd_mean_mph", 1),
+    ("obs_hrly_derived_dwpt", 1),
+    ("obs_hrly_derived_dwptF", 1),
+    ("obs_hrly_derived_eto_azmet", 1),
+    ("obs_hrly_derived_eto_azmet_in", 2),
+    ("obs_hrly_derived_heatstress_cottonC", 1),
+    ("obs_hrly_derived_heatstress_cottonF", 1),
+)
+
+OBS_DYLY_HEADER = (
+    "station_id",
+    "station_number",
+    "obs_year",
+    "obs_doy",
+    "obs_datetime",
+    "obs_hour",
+    "obs_seconds",
+    "obs_version",
+    "obs_creation_reason",
+    "obs_needs_review",
+    "obs_prg_code",
+)
+
+OBS_DYLY_VALUES = (
+    ("obs_dyly_temp_air_max", 1),
+    ("obs_dyly_temp_air_min", 1),
+    ("obs_dyly_temp_air_mean", 1),
+    ("obs_dyly_relative_humidity_max", 0),
+    ("obs_dyly_relative_humidity_min", 0),
+    ("obs_dyly_relative_humidity_mean", 0),
+    ("obs_dyly_vpd_mean", 2),
+    ("obs_dyly_sol_rad_total", 2),
+    ("obs_dyly_precip_total", 1),
+    ("obs_dyly_temp_soil_10cm_max", 1),
+    ("obs_dyly_temp_soil_10cm_min", 1),
+    ("obs_dyly_temp_soil_10cm_mean", 1),
+    ("obs_dyly_temp_soil_50cm_max", 1),
+    ("obs_dyly_temp_soil_50cm_min", 1),
+    ("obs_dyly_temp_soil_50cm_mean", 1),
+    ("obs_dyly_wind_spd_mean", 1),
+    ("obs_dyly_wind_vector_magnitude", 1),
+    ("obs_dyly_wind_vector_dir", 0),
+    ("obs_dyly_wind_vector_dir_stand_dev", 0),
+    ("obs_dyly_wind_spd_max", 1),
+    ("obs_dyly_bat_volt_max", 2),
+    ("obs_dyly_bat_volt_min", 2),
+    ("obs_dyly_bat_volt_mean", 2),
+    ("obs_dyly_actual_vp_max", 2),
+    ("obs_dyly_actual_vp_min", 2),
+    ("obs_dyly_actual_vp_mean", 2),
+    ("obs_dyly_wind_2min_spd_mean", 1),
+    ("obs_dyly_wind_2min_spd_max", 1),
+    ("obs_dyly_wind_2min_timestamp", 0),
+    ("obs_dyly_wind_2min_vector_dir", 0),
+)
+
+DERIVED_DYLY_HEADER = (
+    "station_id",
+    "obs_year",
+    "obs_doy",
+    "obs_datetime",
+    "obs_version",
+    "obs_creation_reason",
+)
+
+DERIVED_DYLY_VALUES = (
+    ("obs_dyly_derived_temp_air_maxF", 1),
+    ("obs_dyly_derived_temp_air_minF", 1),
+    ("obs_dyly_derived_temp_air_meanF", 1),
+    ("obs_dyly_derived_sol_rad_total_ly", 2),
+    ("obs_dyly_derived_precip_total_in", 2),
+    ("obs_dyly_derived_temp_soil_10cm_maxF", 1),
+    ("obs_dyly_derived_temp_soil_10cm_minF", 1),
+    ("obs_dyly_derived_temp_soil_10cm_meanF", 1),
+    ("obs_dyly_derived_temp_soil_50cm_maxF", 1),
+    ("obs_dyly_derived_temp_soil_50cm_minF", 1),
+    ("obs_dyly_derived_temp_soil_50cm_meanF", 1),
+    ("obs_dyly_derived_wind_spd_mean_mph", 1),
+    ("obs_dyly_derived_wind_vector_magnitude_mph", 1),
+    ("obs_dyly_derived_wind_spd_max_mph", 1),
+    ("obs_dyly_derived_dwpt_mean", 1),
+    ("obs_dyly_derived_dwpt_meanF", 1),
+    ("obs_dyly_derived_eto_azmet", 1),
+    ("obs_dyly_derived_eto_azmet_in", 2),
+    ("obs_dyly_derived_eto_pen_mon", 1),
+    ("obs_dyly_derived_eto_pen_mon_in", 2),
+    ("obs_dyly_derived_chill_hours_32F", 0),
+    ("obs_dyly_derived_chill_hours_45F", 0),
+    ("obs_dyly_derived_chill_hours_68F", 0),
+    ("obs_dyly_derived_chill_hours_0C", 0),
+    ("obs_dyly_derived_chill_hours_7C", 0),
+    ("obs_dyly_derived_chill_hours_20C", 0),
+    ("obs_dyly_derived_heat_units_7C", 1),
+    ("obs_dyly_derived_heat_units_10C", 1),
+    ("obs_dyly_derived_heat_units_13C", 1),
+    ("obs_dyly_derived_heat_units_3413C", 1),
+    ("obs_dyly_derived_heat_units_45F", 1),
+    ("obs_dyly_derived_heat_units_50F", 1),
+    ("obs_dyly_derived_heat_units_55F", 1),
+    ("obs_dyly_derived_heat_units_9455F", 1),
+    ("obs_dyly_derived_heatstress_cotton_meanC", 1),
+    ("obs_dyly_derived_heatstress_cotton_meanF", 1),
+    ("obs_dyly_derived_wind_2min_spd_mean_mph", 1),
+    ("obs_dyly_derived_wind_2min_spd_max_mph", 1),
+)
+
+
+def formatValue(fltValue=math.nan, intDigits=1):
+    # as.character(round(x, digits)) in R, e.g. 12.0 -> "12", and NA as the
+    # download functions write it
+    if intDigits is None:
+        return "NA"
+    if math.isnan(fltValue):
+        return NA_VALUES[intDigits]
+
+    return format(round(fltValue, intDigits) + 0.0, ".15g")
+
+
+def toFahrenheit(fltValue=math.nan):
+    return fltValue * (9 / 5) + 32
+
+
+def toInches(fltValue=math.nan):
+    return fltValue * 1 / 25.4
+
+
+def toMph(fltValue=math.nan):
+    return fltValue * 2.2369362920544
+
+
+def toLangleys(fltValue=math.nan):
+    return fltValue * 23.9005736137667
+
+
+def getDewPoint(fltActualVp=math.nan):
+    fltLog = math.log(fltActualVp / 0.6108)
+
+    return 237.3 * fltLog / (17.27 - fltLog)
+
+
+def getSaturationVp(fltTempAir=math.nan):
+    return 0.6108 * math.exp(17.27 * fltTempAir / (fltTempAir + 237.3))
+
+
+def getMean(listValues):
+    listValues = [fltValue for fltValue in listValues if not math.isnan(fltValue)]
+
+    return sum(listValues) / len(listValues) if listValues else math.nan
+
+
+def getMax(listValues):
+    listValues = [fltValue for fltValue in listValues if not math.isnan(fltValue)]
+
+    return max(listValues) if listValues else math.nan
+
+
+def getMin(listValues):
+    listValues = [fltValue for fltValue in listValues if not math.isnan(fltValue)]
+
+    return min(listValues) if listValues else math.nan
+
+
+class SyntheticStation:
+    # One station's weather, day by day. fltMissing is the fraction of
+    # measured values written as missing, about half as the R NA code for the
+    # column and half as a logger sentinel.
+    def __init__(self, intStationNumber=1, fltMissing=0.02, intSeed=0):
+        self.strStationNumber = f"{intStationNumber:02d}"
+        self.strStationId = f"az{self.strStationNumber}"
+        self.fltMissing = fltMissing
+        self.rng = random.Random(f"{intSeed}-{intStationNumber}")
+        # stations differ in climate, from the low desert to the high country
+        self.fltMeanTemp = self.rng.uniform(14, 24)
+        self.fltSeasonalRange = self.rng.uniform(8, 13)
+
+    def formatObs(self, fltValue=math.nan, intDigits=1):
+        # an observed value, which might be missing
+        if self.rng.random() < self.fltMissing:
+            if self.rng.random() < 0.5:
+                return self.rng.choice(LOGGER_SENTINELS)
+            return NA_VALUES[intDigits]
+
+        return formatValue(fltValue, intDigits)
+
+    def getHours(self, dateDay):
+        # the 24 hourly observations of a day, 01:00 to 24:00
+        rng = self.rng
+        intDoy = dateDay.timetuple().tm_yday
+        fltDayTemp = (
+            self.fltMeanTemp
+            + self.fltSeasonalRange * math.sin((intDoy - 105) / 365.25 * 2 * math.pi)
+            + rng.gauss(0, 2)
+        )
+        fltDayRange = rng.uniform(5, 11)
+        fltCloud = rng.uniform(0.3, 1) if rng.random() < 0.2 else 1
+        fltRain = rng.expovariate(0.5) if rng.random() < 0.05 else 0
+        fltWindDir = rng.uniform(0, 360)
+
+        listHours = []
+        for intHour in range(1, 25):
+            fltTempAir = (
+                fltDayTemp
+                + fltDayRange * math.sin((intHour - 9) / 24 * 2 * math.pi)
+                + rng.gauss(0, 0.7)
+            )
+            fltRelativeHumidity = min(
+                100,
+                max(
+                    2,
+                    45
+                    - 2 * (fltTempAir - fltDayTemp)
+                    + 30 * bool(fltRain)
+                    + rng.gauss(0, 8),
+                ),
+            )
+            fltSaturationVp = getSaturationVp(fltTempAir)
+            fltActualVp = fltSaturationVp * fltRelativeHumidity / 100
+            fltWindSpd = max(0.1, rng.gammavariate(2, 1.2))
+            listHours.append(
+                {
+                    "obs_hrly_temp_air": fltTempAir,
+                    "obs_hrly_relative_humidity": fltRelativeHumidity,
+                    "obs_hrly_vpd": fltSaturationVp - fltActualVp,
+                    "obs_hrly_sol_rad_total": (
+                        fltCloud
+                        * 3.4
+                        * math.sin((intHour - 6) / 13 * math.pi)
+                        * (1 + 0.3 * math.sin((intDoy - 80) / 365.25 * 2 * math.pi))
+                        if 6 < intHour < 19
+                        else 0.0
+                    ),
+                    "obs_hrly_precip_total": (
+                        fltRain * rng.random() if rng.random() < 0.3 else 0.0
+                    ),
+                    "obs_hrly_temp_soil_10cm": fltDayTemp
+                    + 4
+                    + 3 * math.sin((intHour - 12) / 24 * 2 * math.pi),
+                    "obs_hrly_temp_soil_50cm": fltDayTemp + 3,
+                    "obs_hrly_wind_spd": fltWindSpd,
+                    "obs_hrly_wind_vector_magnitude": fltWindSpd * rng.uniform(0.6, 1),
+                    "obs_hrly_wind_vector_dir": (fltWindDir + rng.gauss(0, 30)) % 360,
+                    "obs_hrly_wind_vector_dir_stand_dev": rng.uniform(5, 60),
+                    "obs_hrly_wind_spd_max": fltWindSpd * rng.uniform(1.3, 2.5),
+                    "obs_hrly_wind_2min_vector_dir": math.nan,
+                    "obs_hrly_wind_2min_spd_max": math.nan,
+                    "obs_hrly_wind_2min_spd_mean": math.nan,
+                    "obs_hrly_wind_2min_timestamp": math.nan,
+                    "obs_hrly_actual_vp": fltActualVp,
+                    "obs_hrly_bat_volt": math.nan,
+                    "obs_hrly_derived_dwpt": getDewPoint(fltActualVp),
+                    "obs_hrly_derived_eto_azmet": max(
+                        0.0, 0.12 * fltSaturationVp * (1 - fltRelativeHumidity / 100)
+                    ),
+                }
+            )
+
+        return listHours
+
+    def getHourlyRows(self, dateDay, listHours):
+        strYear = str(dateDay.year)
+        strDoy = f"{dateDay.timetuple().tm_yday:03d}"
+        listObsRows = []
+        listDerivedRows = []
+        for intHour, dictHour in enumerate(listHours, start=1):
+            # AZMET's midnight is 24:00 of the day that is ending, which the R
+            # code writes as 23:59:59
+            if intHour == 24:
+                strDatetime = f"{dateDay.isoformat()} 23:59:59"
+            else:
+                strDatetime = f"{dateDay.isoformat()} {intHour:02d}:00:00"
+            strHour = f"{intHour:02d}00"
+
+            listObsRows.append(
+                [
+                    self.strStationId,
+                    self.strStationNumber,
+                    strDatetime,
+                    strYear,
+                    strDoy,
+                    strHour,
+                    "0",
+                    "1",
+                    "legacy data transcription",
+                    "0",
+                    "0428",
+                ]
+                + [
+                    self.formatObs(dictHour[strColumn], intDigits)
+                    for strColumn, intDigits in OBS_HRLY_VALUES
+                ]
+            )
+
+            fltEto = dictHour["obs_hrly_derived_eto_azmet"]
+            fltDewPoint = dictHour["obs_hrly_derived_dwpt"]
+            listDerived = [
+                toFahrenheit(dictHour["obs_hrly_temp_air"]),
+                toLangleys(dictHour["obs_hrly_sol_rad_total"]),
+                toInches(dictHour["obs_hrly_precip_total"]),
+                toFahrenheit(dictHour["obs_hrly_temp_soil_10cm"]),
+                toFahrenheit(dictHour["obs_hrly_temp_soil_50cm"]),
+                toMph(dictHour["obs_hrly_wind_spd"]),
+                math.nan,
+                toMph(dictHour["obs_hrly_wind_spd_max"]),
+                math.nan,
+                math.nan,
+                fltDewPoint,
+                toFahrenheit(fltDewPoint),
+                fltEto,
+                toInches(fltEto),
+                math.nan,
+                math.nan,
+            ]
+            listDerivedRows.append(
+                [
+                    self.strStationId,
+                    strYear,
+                    strDoy,
+                    strHour,
+                    "0",
+                    strDatetime,
+                    "1",
+                    "legacy data transcription",
+                ]
+                + [
+                    formatValue(fltValue, intDigits)
+                    for fltValue, (_, intDigits) in zip(
+                        listDerived, DERIVED_HRLY_VALUES
+                    )
+                ]
+            )
+
+        return listObsRows, listDerivedRows
+
+    def getDailyRows(self, dateDay, listHours):
+        strYear = str(dateDay.year)
+        strDoy = f"{dateDay.timetuple().tm_yday:03d}"
+
+        def getColumn(strColumn):
+            return [dictHour[strColumn] for dictHour in listHours]
+
+        dictDay = {}
+        for strName in (
+            "temp_air",
+            "relative_humidity",
+            "temp_soil_10cm",
+            "temp_soil_50cm",
+            "actual_vp",
+        ):
+            listValues = getColumn(f"obs_hrly_{strName}")
+            dictDay[f"obs_dyly_{strName}_max"] = getMax(listValues)
+            dictDay[f"obs_dyly_{strName}_min"] = getMin(listValues)
+            dictDay[f"obs_dyly_{strName}_mean"] = getMean(listValues)
+        dictDay["obs_dyly_vpd_mean"] = getMean(getColumn("obs_hrly_vpd"))
+        # hourly solar radiation is MJ/m2; the daily total is too
+        dictDay["obs_dyly_sol_rad_total"] = sum(getColumn("obs_hrly_sol_rad_total"))
+        dictDay["obs_dyly_precip_total"] = sum(getColumn("obs_hrly_precip_total"))
+        dictDay["obs_dyly_wind_spd_mean"] = getMean(getColumn("obs_hrly_wind_spd"))
+        dictDay["obs_dyly_wind_vector_magnitude"] = getMean(
+            getColumn("obs_hrly_wind_vector_magnitude")
+        )
+        dictDay["obs_dyly_wind_vector_dir"] = getMean(
+            getColumn("obs_hrly_wind_vector_dir")
+        )
+        dictDay["obs_dyly_wind_vector_dir_stand_dev"] = getMean(
+            getColumn("obs_hrly_wind_vector_dir_stand_dev")
+        )
+        dictDay["obs_dyly_wind_spd_max"] = getMax(getColumn("obs_hrly_wind_spd_max"))
+        dictDay["obs_dyly_derived_dwpt_mean"] = getMean(
+            getColumn("obs_hrly_derived_dwpt")
+        )
+        dictDay["obs_dyly_derived_eto_azmet"] = sum(
+            getColumn("obs_hrly_derived_eto_azmet")
+        )
+
+        # the R code only ever has NA for the 2min winds and battery voltage
+        # of legacy days
+        listObsRow = [
+            self.strStationId,
+            self.strStationNumber,
+            strYear,
+            strDoy,
+            dateDay.isoformat(),
+            "0000",
+            "0",
+            "1",
+            "legacy data transcription",
+            "0",
+            "0428",
+        ] + [
+            self.formatObs(dictDay.get(strColumn, math.nan), intDigits)
+            for strColumn, intDigits in OBS_DYLY_VALUES
+        ]
+
+        fltEto = dictDay["obs_dyly_derived_eto_azmet"]
+        fltDewPoint = dictDay["obs_dyly_derived_dwpt_mean"]
+        listDerived = [
+            toFahrenheit(dictDay["obs_dyly_temp_air_max"]),
+            toFahrenheit(dictDay["obs_dyly_temp_air_min"]),
+            toFahrenheit(dictDay["obs_dyly_temp_air_mean"]),
+            toLangleys(dictDay["obs_dyly_sol_rad_total"]),
+            toInches(dictDay["obs_dyly_precip_total"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_10cm_max"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_10cm_min"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_10cm_mean"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_50cm_max"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_50cm_min"]),
+            toFahrenheit(dictDay["obs_dyly_temp_soil_50cm_mean"]),
+            toMph(dictDay["obs_dyly_wind_spd_mean"]),
+            toMph(dictDay["obs_dyly_wind_vector_magnitude"]),
+            toMph(dictDay["obs_dyly_wind_spd_max"]),
+            fltDewPoint,
+            toFahrenheit(fltDewPoint),
+            fltEto,
+            toInches(fltEto),
+            fltEto * 1.1,
+            toInches(fltEto * 1.1),
+        ]
+        # chill hours, heat units, heat stress and 2min winds are NA until
+        # updateDerived() fills them in
+        listDerived += [math.nan] * (len(DERIVED_DYLY_VALUES) - len(listDerived))
+        listDerivedRow = [
+            self.strStationId,
+            strYear,
+            strDoy,
+            dateDay.isoformat(),
+            "1",
+            "legacy data transcription",
+        ] + [
+            formatValue(fltValue, intDigits)
+            for fltValue, (_, intDigits) in zip(listDerived, DERIVED_DYLY_VALUES)
+        ]
+
+        return listObsRow, listDerivedRow
+
+
+def generateStation(
+    path_legacy,
+    strStation="",
+    intStationNumber=1,
+    intStartYear=1987,
+    intEndYear=1987,
+    fltMissing=0.02,
+    intSeed=0,
+):
+    # Write the four legacy CSVs of one station, with every hour and day from
+    # the start of intStartYear to the end of intEndYear. Returns the number of
+    # rows written to each file.
+    station = SyntheticStation(intStationNumber, fltMissing, intSeed)
+    dictPaths = getStationPaths(path_legacy, strStation)
+    dictRows = {}
+    with contextlib.ExitStack() as stack:
+        dictWriters = {}
+        for strPath, listHeader in (
+            ("path_obs_hrly", OBS_HRLY_HEADER + tuple(c for c, _ in OBS_HRLY_VALUES)),
+            (
+                "path_derived_hrly",
+                DERIVED_HRLY_HEADER + tuple(c for c, _ in DERIVED_HRLY_VALUES),
+            ),
+            ("path_obs_dyly", OBS_DYLY_HEADER + tuple(c for c, _ in OBS_DYLY_VALUES)),
+            (
+                "path_derived_dyly",
+                DERIVED_DYLY_HEADER + tuple(c for c, _ in DERIVED_DYLY_VALUES),
+            ),
+        ):
+            csvfile = stack.enter_context(open(dictPaths[strPath], "w", newline=""))
+            dictWriters[strPath] = csv.writer(csvfile)
+            dictWriters[strPath].writerow(listHeader)
+            dictRows[strPath] = 0
+
+        dateDay = datetime.date(intStartYear, 1, 1)
+        while dateDay.year <= intEndYear:
+            listHours = station.getHours(dateDay)
+            listObsRows, listDerivedRows = station.getHourlyRows(dateDay, listHours)
+            dictWriters["path_obs_hrly"].writerows(listObsRows)
+            dictWriters["path_derived_hrly"].writerows(listDerivedRows)
+            listObsRow, listDerivedRow = station.getDailyRows(dateDay, listHours)
+            dictWriters["path_obs_dyly"].writerow(listObsRow)
+            dictWriters["path_derived_dyly"].writerow(listDerivedRow)
+            dictRows["path_obs_hrly"] += len(listObsRows)
+            dictRows["path_derived_hrly"] += len(listDerivedRows)
+            dictRows["path_obs_dyly"] += 1
+            dictRows["path_derived_dyly"] += 1
+            dateDay += datetime.timedelta(days=1)
+
+    return dictRows
+
+
+def generateStations(
+    path_legacy,
+    intStations=1,
+    intStartYear=1987,
+    intEndYear=1987,
+    fltMissing=0.02,
+    intSeed=0,
+):
+    # Write intStations stations ("Synthetic 1", "Synthetic 2", ...) and a
+    # station list in the same format as azmet-station-list.csv, for
+    # batchUpdateDerived.py. Returns the station list path and the number of
+    # rows written to each station's files.
+    os.makedirs(path_legacy, exist_ok=True)
+    dictStations = {}
+    for intStationNumber in range(1, intStations + 1):
+        strStation = f"Synthetic {intStationNumber}"
+        dictStations[strStation] = generateStation(
+            path_legacy,
+            strStation,
+            intStationNumber,
+            intStartYear,
+            intEndYear,
+            fltMissing,
+            intSeed,
+        )
+
+    path_station_list = os.path.join(path_legacy, "synthetic-station-list.csv")
+    with open(path_station_list, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["stn", "stn_no", "start_yr", "end_yr"])
+        for intStationNumber, strStation in enumerate(dictStations, start=1):
+            writer.writerow([strStation, intStationNumber, intStartYear, intEndYear])
+
+    return path_station_list, dictStations
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Write synthetic legacy CSVs for benchmarking updateDerived()"
+    )
+    parser.add_argument("legacy", help="directory to write the CSVs to")
+    parser.add_argument("--stations", type=int, default=1)
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs=2,
+        default=[1987, 1987],
+        metavar=("START", "END"),
+        help="first and last year, inclusive",
+    )
+    parser.add_argument(
+        "--missing",
+        type=float,
+        default=0.02,
+        help="fraction of observed values written as missing (default: 0.02)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(listArgs)
+    if not 0 <= args.missing <= 1:
+        parser.error("--missing must be between 0 and 1")
+
+    path_station_list, dictStations = generateStations(
+        args.legacy,
+        args.stations,
+        args.years[0],
+        args.years[1],
+        args.missing,
+        args.seed,
+    )
+    intRows = sum(sum(dictRows.values()) for dictRows in dictStations.values())
+    print(
+        f"wrote {intRows} rows for {len(dictStations)} stations, see {path_station_list}"
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+# Bulk load the legacy obs_hrly and obs_dyly CSVs and the _updated derived
+# CSVs into the obs_hrly, obs_hrly_derived, obs_dyly and obs_dyly_derived
+# tables of azmet.schema.20250516-1222-1.sql, in large batched INSERTs with one
+# transaction per station and year.
+#
+# Works with any DB-API connection: sqlite3 for testing (--sqlite creates the
+# tables from the schema) or MariaDB/MySQL through the mariadb or pymysql
+# package.
+#
+# python loadObsTables.py legacy azmet-station-list.csv --sqlite azmet.sqlite
+# python loadObsTables.py legacy azmet-station-list.csv --mariadb azmet \
+#     --host localhost --user azmet --disable-keys
+
+import argparse
+import csv
+import getpass
+import itertools
+import operator
+import os
+import sqlite3
+import sys
+import time
+
+from batchUpdateDerived import getStationPaths, readStationList
+from csvParseAndProcess import (
+    SCHEMA_PATH,
+    getUpdatedPath,
+    iterListRows,
+    readCreateTable,
+)
+
+# the SQL schema sits next to this script, wherever it is run from
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), SCHEMA_PATH)
+
+# (table, key of the CSV in getStationPaths(), whether it is an _updated output)
+TABLE_FILES = (
+    ("obs_hrly", "path_obs_hrly", False),
+    ("obs_hrly_derived", "path_derived_hrly", True),
+    ("obs_dyly", "path_obs_dyly", False),
+    ("obs_dyly_derived", "path_derived_dyly", True),
+)
+
+# values loaded as NULL in the typed (int, datetime, timestamp) columns; the
+# varchar columns keep every value, sentinels included, exactly as written
+NULL_VALUES = frozenset(["", "NA"])
+
+
+class SqliteDialect:
+    # sqlite3 runs executemany() as one prepared statement, which is its
+    # fastest bulk path
+    strParam = "?"
+    blnMultiRow = False
+    intMaxParams = None
+    dictInsert = {
+        "error": "INSERT INTO",
+        "replace": "INSERT OR REPLACE INTO",
+        "ignore": "INSERT OR IGNORE INTO",
+    }
+
+    def getIndexName(self, strTable="", strKey=""):
+        # index names are global in SQLite, not per table
+        return f"{strTable}_{strKey}"
+
+    def createTable(self, cursor, strTable="", dictTable=None):
+        listDefinitions = [
+            f"`{strColumn}` " + strDefinition.replace("ON UPDATE CURRENT_TIMESTAMP", "")
+            for strColumn, strDefinition in dictTable["columns"]
+        ]
+        listDefinitions.append(
+            "PRIMARY KEY ("
+            + ", ".join(f"`{strColumn}`" for strColumn in dictTable["primary_key"])
+            + ")"
+        )
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS `{strTable}` ({', '.join(listDefinitions)})"
+        )
+        self.createKeys(cursor, strTable, dictTable["keys"])
+
+    def dropKeys(self, cursor, strTable="", dictKeys=None):
+        for strKey in dictKeys:
+            cursor.execute(
+                f"DROP INDEX IF EXISTS `{self.getIndexName(strTable, strKey)}`"
+            )
+
+    def createKeys(self, cursor, strTable="", dictKeys=None):
+        for strKey, listColumns in dictKeys.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS `{self.getIndexName(strTable, strKey)}` "
+                f"ON `{strTable}` ({', '.join(f'`{strColumn}`' for strColumn in listColumns)})"
+            )
+
+
+class MysqlDialect:
+    # MariaDB/MySQL load fastest from a single INSERT with many VALUES rows,
+    # but a prepared statement takes at most 65535 parameters
+    blnMultiRow = True
+    intMaxParams = 65535
+    dictInsert = {
+        "error": "INSERT INTO",
+        "replace": "REPLACE INTO",
+        "ignore": "INSERT IGNORE INTO",
+    }
+
+    def __init__(self, strParamStyle="format"):
+        # mariadb uses qmark, pymysql format
+        self.strParam = "?" if strParamStyle == "qmark" else "%s"
+
+    def dropKeys(self, cursor, strTable="", dictKeys=None):
+        # one ALTER TABLE, so InnoDB rebuilds the table only once
+        cursor.execute(f"SHOW INDEX FROM `{strTable}` WHERE Key_name <> 'PRIMARY'")
+        setExisting = {row[2] for row in cursor.fetchall()}
+        listDrops = [
+            f"DROP INDEX `{strKey}`" for strKey in dictKeys if strKey in setExisting
+        ]
+        if listDrops:
+            cursor.execute(f"ALTER TABLE `{strTable}` {', '.join(listDrops)}")
+
+    def createKeys(self, cursor, strTable="", dictKeys=None):
+        cursor.execute(f"SHOW INDEX FROM `{strTable}` WHERE Key_name <> 'PRIMARY'")
+        setExisting = {row[2] for row in cursor.fetchall()}
+        listAdds = [
+            f"ADD INDEX `{strKey}` ({', '.join(f'`{strColumn}`' for strColumn in listColumns)})"
+            for strKey, listColumns in dictKeys.items()
+            if strKey not in setExisting
+        ]
+        if listAdds:
+            cursor.execute(f"ALTER TABLE `{strTable}` {', '.join(listAdds)}")
+
+
+def getStationYear(listHeader):
+    # key function for grouping rows by (station_id, obs_year)
+    intStation = listHeader.index("station_id")
+    intYear = listHeader.index("obs_year")
+
+    return lambda row: (row[intStation], row[intYear])
+
+
+def loadRows(
+    connection,
+    dialect,
+    strTable="",
+    dictTable=None,
+    listHeader=None,
+    iterRows=(),
+    intBatchSize=10000,
+    strOnDuplicate="error",
+):
+    # Insert rows (lists of strings in listHeader order) into strTable, in
+    # batches of intBatchSize rows (fewer if a multi-row INSERT of that many
+    # would have more parameters than the dialect allows), committing after
+    # each station-year. CSV columns that aren't in the table are skipped. A
+    # failed station-year is rolled back before the error is raised. Returns
+    # the number of rows.
+    dictDefinitions = dict(dictTable["columns"])
+    listColumns = [
+        strColumn for strColumn in listHeader if strColumn in dictDefinitions
+    ]
+    getColumns = operator.itemgetter(
+        *[listHeader.index(strColumn) for strColumn in listColumns]
+    )
+    # typed columns get NULL for an empty or NA value instead of a string
+    listTyped = [
+        intPosition
+        for intPosition, strColumn in enumerate(listColumns)
+        if not dictDefinitions[strColumn].startswith(("varchar", "char"))
+    ]
+
+    strPlaceholders = "(" + ", ".join([dialect.strParam] * len(listColumns)) + ")"
+    if dialect.intMaxParams:
+        intBatchSize = max(
+            1, min(intBatchSize, dialect.intMaxParams // len(listColumns))
+        )
+    strInsert = (
+        f"{dialect.dictInsert[strOnDuplicate]} `{strTable}` "
+        f"({', '.join(f'`{strColumn}`' for strColumn in listColumns)}) VALUES "
+    )
+
+    def getValues(row):
+        listValues = list(getColumns(row))
+        for intPosition in listTyped:
+            if listValues[intPosition] in NULL_VALUES:
+                listValues[intPosition] = None
+        return listValues
+
+    intRows = 0
+    cursor = connection.cursor()
+    for _, iterGroup in itertools.groupby(iterRows, getStationYear(listHeader)):
+        try:
+            while True:
+                listBatch = [
+                    getValues(row) for row in itertools.islice(iterGroup, intBatchSize)
+                ]
+                if not listBatch:
+                    break
+                if dialect.blnMultiRow:
+                    cursor.execute(
+                        strInsert + ", ".join([strPlaceholders] * len(listBatch)),
+                        [value for listValues in listBatch for value in listValues],
+                    )
+                else:
+                    cursor.executemany(strInsert + strPlaceholders, listBatch)
+                intRows += len(listBatch)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    return intRows
+
+
+def loadCsv(
+    connection,
+    dialect,
+    strTable="",
+    path_csv="",
+    path_schema=SCHEMA_FILE,
+    **dictOptions,
+):
+    # loadRows() for a CSV file, streamed a batch at a time, with blank lines
+    # skipped and short rows padded as updateDerived() reads them
+    dictTable = readCreateTable(path_schema, strTable)
+    with open(path_csv, "r", newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        if not listHeader:
+            return 0
+        return loadRows(
+            connection,
+            dialect,
+            strTable,
+            dictTable,
+            listHeader,
+            iterListRows(reader, len(listHeader)),
+            **dictOptions,
+        )
+
+
+def loadStations(
+    connection,
+    dialect,
+    path_legacy,
+    listStations,
+    path_schema=SCHEMA_FILE,
+    blnDisableKeys=False,
+    fnReport=None,
+    **dictOptions,
+):
+    # Load the four files of every station. With blnDisableKeys the secondary
+    # keys of each table are dropped for the load and rebuilt once at the end,
+    # which is much faster than updating every index on every insert.
+    dictTables = {
+        strTable: readCreateTable(path_schema, strTable)
+        for strTable, _, _ in TABLE_FILES
+    }
+    cursor = connection.cursor()
+    if blnDisableKeys:
+        for strTable, dictTable in dictTables.items():
+            dialect.dropKeys(cursor, strTable, dictTable["keys"])
+        connection.commit()
+
+    try:
+        for strStation in listStations:
+            dictPaths = getStationPaths(path_legacy, strStation)
+            for strTable, strPathKey, blnUpdated in TABLE_FILES:
+                path_csv = dictPaths[strPathKey]
+                if blnUpdated:
+                    path_csv = getUpdatedPath(path_csv)
+                fltStart = time.perf_counter()
+                intRows = loadCsv(
+                    connection, dialect, strTable, path_csv, path_schema, **dictOptions
+                )
+                if fnReport is not None:
+                    fnReport(
+                        strStation, strTable, intRows, time.perf_counter() - fltStart
+                    )
+    finally:
+        if blnDisableKeys:
+            for strTable, dictTable in dictTables.items():
+                dialect.createKeys(cursor, strTable, dictTable["keys"])
+            connection.commit()
+
+
+def connectMysql(strDatabase="", strHost="localhost", intPort=3306, strUser=""):
+    # MariaDB Connector/Python if it is installed, otherwise PyMySQL; returns
+    # the connection and its dialect
+    strPassword = os.environ.get("AZMET_DB_PASSWORD") or getpass.getpass()
+    try:
+        import mariadb as driver
+    except ImportError:
+        try:
+            import pymysql as driver
+        except ImportError:
+            raise ImportError("--mariadb requires the mariadb or pymysql package")
+
+    connection = driver.connect(
+        host=strHost,
+        port=intPort,
+        user=strUser,
+        password=strPassword,
+        database=strDatabase,
+        autocommit=False,
+    )
+
+    return connection, MysqlDialect(driver.paramstyle)
+
+
+def printLoaded(strStation, strTable, intRows, fltSeconds):
+    print(
+        f"{strStation} {strTable}: {intRows} rows ({round(fltSeconds, 3)}s, "
+        f"{round(intRows / fltSeconds) if fltSeconds else intRows} rows/s)",
+        flush=True,
+    )
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk load the legacy and _updated CSVs into the obs_* tables"
+    )
+    parser.add_argument("legacy", help="directory with the legacy and _updated CSVs")
+    parser.add_argument("station_list", help="e.g. azmet-station-list.csv")
+    groupDatabase = parser.add_mutually_exclusive_group(required=True)
+    groupDatabase.add_argument(
+        "--sqlite", help="SQLite database file; the tables are created if needed"
+    )
+    groupDatabase.add_argument("--mariadb", help="MariaDB/MySQL database name")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument(
+        "--user",
+        default=getpass.getuser(),
+        help="the password is read from AZMET_DB_PASSWORD or prompted for",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="rows per INSERT, at most 65535 parameters' worth on MariaDB/MySQL",
+    )
+    parser.add_argument(
+        "--on-duplicate",
+        choices=["error", "replace", "ignore"],
+        default="error",
+        help="what to do with a row whose (station_id, obs_datetime, "
+        "obs_version) is already loaded (default: error)",
+    )
+    parser.add_argument(
+        "--disable-keys",
+        action="store_true",
+        help="drop the secondary keys during the load and rebuild them after",
+    )
+    args = parser.parse_args(listArgs)
+
+    if args.sqlite:
+        connection = sqlite3.connect(args.sqlite)
+        dialect = SqliteDialect()
+        cursor = connection.cursor()
+        for strTable, _, _ in TABLE_FILES:
+            dialect.createTable(
+                cursor, strTable, readCreateTable(SCHEMA_FILE, strTable)
+            )
+        connection.commit()
+    else:
+        connection, dialect = connectMysql(
+            args.mariadb, args.host, args.port, args.user
+        )
+
+    fltStart = time.perf_counter()
+    try:
+        loadStations(
+            connection,
+            dialect,
+            args.legacy,
+            readStationList(args.station_list),
+            blnDisableKeys=args.disable_keys,
+            fnReport=printLoaded,
+            intBatchSize=args.batch_size,
+            strOnDuplicate=args.on_duplicate,
+        )
+    finally:
+        connection.close()
+    print(f"loaded in {round(time.perf_counter() - fltStart, 3)}s")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+# A station/year/doy index over the obs_dyly_derived-*_updated.csv files that
+# updateDerived() writes, with running totals of their chill hour and heat unit
+# columns, so that the total over any range of days of a station is the
+# difference of two running totals found by bisection, instead of a pass over
+# the CSV. "build" indexes the stations whose _updated file changed since the
+# last build; "query" answers from the index alone.
+#
+# python queryDerived.py build legacy azmet-station-list.csv
+# python queryDerived.py query legacy/derived_index chill_hours_7C --years 1990 2019 --months 11 2
+#
+# The second gives the chill hours below 7.2 C of every station for each
+# November to February from 1990-91 to 2019-20.
+
+import argparse
+import array
+import bisect
+import calendar
+import csv
+import datetime
+import decimal
+import json
+import os
+import sys
+
+from batchUpdateDerived import getStationPaths, readStationList
+from csvParseAndProcess import (
+    DAILY_DERIVED_COLUMNS,
+    MISSING_SENTINELS,
+    getObsKey,
+    getUpdatedPath,
+    iterListRows,
+    openAtomic,
+    openCsv,
+)
+
+INDEX_VERSION = 1
+# where "build" puts the index, under the legacy directory
+INDEX_DIRECTORY = "derived_index"
+# the columns with running totals, and the decimal places they are kept to
+INDEX_COLUMNS = {
+    strColumn: 0 if "_chill_hours_" in strColumn else 1
+    for strColumn in DAILY_DERIVED_COLUMNS
+    if "_chill_hours_" in strColumn or "_heat_units_" in strColumn
+}
+
+
+def getColumnName(strColumn=""):
+    # "chill_hours_7C" -> "obs_dyly_derived_chill_hours_7C"
+    if strColumn not in INDEX_COLUMNS:
+        strColumn = "obs_dyly_derived_" + strColumn
+    if strColumn not in INDEX_COLUMNS:
+        raise ValueError(
+            f"{strColumn} isn't indexed, only {', '.join(INDEX_COLUMNS)} are"
+        )
+
+    return strColumn
+
+
+def getDateKey(date):
+    # the getObsKey() of a day, e.g. 1987-02-01 -> 19870320000
+    return getObsKey(str(date.year), str(date.timetuple().tm_yday))
+
+
+def getScaled(strValue="", intPlaces=0):
+    # "12.3", 1 -> 123, rounded half up if it has more places than that
+    return int(
+        decimal.Decimal(strValue)
+        .scaleb(intPlaces)
+        .to_integral_value(rounding=decimal.ROUND_HALF_UP)
+    )
+
+
+def readStationDays(path_derived, setSentinels):
+    # (day keys in order, {column: values scaled by INDEX_COLUMNS, None for
+    # missing}, rows with an invalid key) of a daily derived file. Duplicated
+    # days are all kept, so they are all counted, as in the file.
+    with openCsv(path_derived) as csvfile:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, [])
+        listRows = []
+        intInvalid = 0
+        if listHeader:
+            intYear = listHeader.index("obs_year")
+            intDoy = listHeader.index("obs_doy")
+            listIndexes = [listHeader.index(strColumn) for strColumn in INDEX_COLUMNS]
+        for row in iterListRows(reader, len(listHeader)):
+            intKey = getObsKey(row[intYear], row[intDoy])
+            if intKey is None:
+                intInvalid += 1
+                continue
+            listRows.append(
+                (
+                    intKey,
+                    [
+                        (
+                            None
+                            if row[intIndex] in setSentinels
+                            else getScaled(row[intIndex], intPlaces)
+                        )
+                        for intIndex, intPlaces in zip(
+                            listIndexes, INDEX_COLUMNS.values()
+                        )
+                    ],
+                )
+            )
+    listRows.sort(key=lambda tplRow: tplRow[0])
+
+    return (
+        [intKey for intKey, _ in listRows],
+        {
+            strColumn: [listValues[intColumn] for _, listValues in listRows]
+            for intColumn, strColumn in enumerate(INDEX_COLUMNS)
+        },
+        intInvalid,
+    )
+
+
+def getRunningTotals(listValues):
+    # (totals, counts of values that weren't missing) of the values before
+    # each position, one longer than listValues
+    arySums = array.array("q", [0])
+    aryCounts = array.array("q", [0])
+    intSum = intCount = 0
+    for intValue in listValues:
+        if intValue is not None:
+            intSum += intValue
+            intCount += 1
+        arySums.append(intSum)
+        aryCounts.append(intCount)
+
+    return arySums, aryCounts
+
+
+def getSourceSignature(path):
+    stat = os.stat(path)
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def buildIndex(
+    path_legacy,
+    listStations,
+    path_index=None,
+    listSentinels=MISSING_SENTINELS,
+    fnReport=None,
+):
+    # Index the obs_dyly_derived _updated file of each station into
+    # path_index (legacy/derived_index by default): index.json, and per
+    # station a binary file of int64 day keys followed by the running totals
+    # and counts of each column. Stations whose file hasn't changed since the
+    # last build are kept as they are. fnReport is called with
+    # (station, "indexed" | "unchanged" | "missing") for each one. Returns
+    # the contents of index.json.
+    if path_index is None:
+        path_index = os.path.join(path_legacy, INDEX_DIRECTORY)
+    os.makedirs(path_index, exist_ok=True)
+    path_manifest = os.path.join(path_index, "index.json")
+    dictSettings = {
+        "version": INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "columns": INDEX_COLUMNS,
+        "sentinels": sorted(listSentinels),
+    }
+    dictPrevious = {}
+    try:
+        with open(path_manifest, "r") as jsonfile:
+            dictManifest = json.load(jsonfile)
+        if dictManifest["settings"] == dictSettings:
+            dictPrevious = dictManifest["stations"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    dictStations = {}
+    for strStation in listStations:
+        path_derived = getUpdatedPath(
+            getStationPaths(path_legacy, strStation)["path_derived_dyly"]
+        )
+        if not os.path.exists(path_derived):
+            if fnReport is not None:
+                fnReport(strStation, "missing")
+            continue
+
+        dictSource = getSourceSignature(path_derived)
+        dictStation = dictPrevious.get(strStation)
+        if (
+            dictStation is not None
+            and dictStation["source"] == dictSource
+            and os.path.exists(os.path.join(path_index, dictStation["file"]))
+        ):
+            dictStations[strStation] = dictStation
+            if fnReport is not None:
+                fnReport(strStation, "unchanged")
+            continue
+
+        listKeys, dictValues, intInvalid = readStationDays(
+            path_derived, set(listSentinels)
+        )
+        aryIndex = array.array("q", listKeys)
+        for strColumn in INDEX_COLUMNS:
+            for aryTotals in getRunningTotals(dictValues[strColumn]):
+                aryIndex.extend(aryTotals)
+        strFile = f"{os.path.basename(path_derived)}.idx"
+        with openAtomic(os.path.join(path_index, strFile), blnBinary=True) as file:
+            file.write(aryIndex.tobytes())
+        dictStations[strStation] = {
+            "file": strFile,
+            "source": dictSource,
+            "days": len(listKeys),
+            "invalid": intInvalid,
+        }
+        if fnReport is not None:
+            fnReport(strStation, "indexed")
+
+    dictManifest = {"settings": dictSettings, "stations": dictStations}
+    with openAtomic(path_manifest) as jsonfile:
+        json.dump(dictManifest, jsonfile, indent=2)
+
+    return dictManifest
+
+
+class DerivedIndex:
+    # Range totals from an index written by buildIndex(). Each station's
+    # index file is read the first time the station is queried.
+    def __init__(self, path_index):
+        self.path_index = path_index
+        with open(os.path.join(path_index, "index.json"), "r") as jsonfile:
+            dictManifest = json.load(jsonfile)
+        if dictManifest["settings"]["version"] != INDEX_VERSION:
+            raise ValueError(f"{path_index} was built by another version, rebuild it")
+        self.blnSwap = dictManifest["settings"]["byteorder"] != sys.byteorder
+        self.dictColumns = dictManifest["settings"]["columns"]
+        self.dictStations = dictManifest["stations"]
+        self.dictLoaded = {}
+
+    def getStations(self):
+        return list(self.dictStations)
+
+    def getStation(self, strStation=""):
+        # (day keys, {column: (running totals, running counts)}) of a station
+        if strStation not in self.dictLoaded:
+            dictStation = self.dictStations[strStation]
+            aryIndex = array.array("q")
+            with open(os.path.join(self.path_index, dictStation["file"]), "rb") as file:
+                aryIndex.frombytes(file.read())
+            if self.blnSwap:
+                aryIndex.byteswap()
+
+            intDays = dictStation["days"]
+            dictTotals = {}
+            intStart = intDays
+            for strColumn in self.dictColumns:
+                dictTotals[strColumn] = (
+                    aryIndex[intStart : intStart + intDays + 1],
+                    aryIndex[intStart + intDays + 1 : intStart + 2 * intDays + 2],
+                )
+                intStart += 2 * intDays + 2
+            self.dictLoaded[strStation] = (aryIndex[:intDays], dictTotals)
+
+        return self.dictLoaded[strStation]
+
+    def sumRange(self, strStation="", strColumn="", dateStart=None, dateEnd=None):
+        # {"station", "start", "end", "days", "missing", "sum"} of a column
+        # from dateStart through dateEnd. "days" counts the rows in the range
+        # and "missing" those without a value, which the sum leaves out.
+        strColumn = getColumnName(strColumn)
+        aryKeys, dictTotals = self.getStation(strStation)
+        arySums, aryCounts = dictTotals[strColumn]
+        intStart = bisect.bisect_left(aryKeys, getDateKey(dateStart))
+        intEnd = bisect.bisect_right(aryKeys, getDateKey(dateEnd))
+        intEnd = max(intStart, intEnd)
+        decSum = decimal.Decimal(arySums[intEnd] - arySums[intStart]).scaleb(
+            -self.dictColumns[strColumn]
+        )
+
+        return {
+            "station": strStation,
+            "start": dateStart.isoformat(),
+            "end": dateEnd.isoformat(),
+            "days": intEnd - intStart,
+            "missing": (intEnd - intStart) - (aryCounts[intEnd] - aryCounts[intStart]),
+            "sum": str(decSum),
+        }
+
+    def querySeasons(
+        self,
+        strColumn="",
+        intStartYear=1987,
+        intEndYear=2019,
+        intStartMonth=1,
+        intEndMonth=12,
+        listStations=None,
+    ):
+        # sumRange() of every station (or listStations) for the months
+        # intStartMonth through intEndMonth of each year. A season that
+        # wraps past December, e.g. months 11 to 2, ends in the next year
+        # and is labelled by the year it starts in.
+        if listStations is None:
+            listStations = self.getStations()
+
+        listResults = []
+        for strStation in listStations:
+            for intYear in range(intStartYear, intEndYear + 1):
+                intYearEnd = intYear + (intEndMonth < intStartMonth)
+                listResults.append(
+                    self.sumRange(
+                        strStation,
+                        strColumn,
+                        datetime.date(intYear, intStartMonth, 1),
+                        datetime.date(
+                            intYearEnd,
+                            intEndMonth,
+                            calendar.monthrange(intYearEnd, intEndMonth)[1],
+                        ),
+                    )
+                )
+
+        return listResults
+
+
+def printIndexed(strStation="", strStatus=""):
+    print(f"{strStation}: {strStatus}", flush=True)
+
+
+def main(listArgs=None):
+    parser = argparse.ArgumentParser(
+        description="Index the daily derived outputs and total them over ranges"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parserBuild = subparsers.add_parser(
+        "build", help="index the obs_dyly_derived _updated files"
+    )
+    parserBuild.add_argument("legacy", help="directory with the _updated CSVs")
+    parserBuild.add_argument("station_list", help="e.g. azmet-station-list.csv")
+    parserBuild.add_argument(
+        "--index", help=f"index directory (default: legacy/{INDEX_DIRECTORY})"
+    )
+    parserBuild.add_argument(
+        "--missing-sentinel",
+        action="append",
+        dest="missing_sentinels",
+        help="value to leave out of the totals; repeat for more than one "
+        f"(default: {', '.join(repr(strValue) for strValue in MISSING_SENTINELS)})",
+    )
+
+    parserQuery = subparsers.add_parser(
+        "query", help="total a column over the same months of each year"
+    )
+    parserQuery.add_argument("index", help="index directory written by build")
+    parserQuery.add_argument(
+        "column", help="e.g. chill_hours_7C or obs_dyly_derived_heat_units_13C"
+    )
+    parserQuery.add_argument(
+        "--years", type=int, nargs=2, required=True, metavar=("START", "END")
+    )
+    parserQuery.add_argument(
+        "--months",
+        type=int,
+        nargs=2,
+        default=(1, 12),
+        metavar=("START", "END"),
+        help="e.g. 11 2 for November through February",
+    )
+    parserQuery.add_argument(
+        "--station",
+        action="append",
+        dest="stations",
+        help="station to total; repeat for more than one (default: all)",
+    )
+    parserQuery.add_argument("--output", help="write the CSV here, not to stdout")
+    args = parser.parse_args(listArgs)
+
+    if args.command == "build":
+        buildIndex(
+            args.legacy,
+            readStationList(args.station_list),
+            args.index,
+            args.missing_sentinels or MISSING_SENTINELS,
+            fnReport=printIndexed,
+        )
+        return 0
+
+    listResults = DerivedIndex(args.index).querySeasons(
+        args.column, *args.years, *args.months, args.stations
+    )
+    listFields = ["station", "start", "end", "days", "missing", "sum"]
+    if args.output:
+        with openAtomic(args.output) as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=listFields)
+            writer.writeheader()
+            writer.writerows(listResults)
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=listFields)
+        writer.writeheader()
+        writer.writerows(listResults)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
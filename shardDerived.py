@@ -0,0 +1,309 @@
+# updateDerived() for one station, split into shards of years that run on
+# separate cores. A station's whole history otherwise runs in one process, so
+# with batchUpdateDerived.py the largest station sets how long a batch takes
+# however many stations run at once.
+#
+# Every join of updateDerived() is on obs_year and obs_doy (and obs_hour), so
+# years only depend on each other through the order of the rows. Rows are
+# sharded by their obs_year column, never by obs_datetime: AZMET's midnight
+# is hour 2400 of the day that is ending, so the 24:00 row of 31 December
+# (obs_datetime "YYYY-12-31 23:59:59", 00:00 of 1 January) stays in the shard
+# of the day it is rolled up into. A row with an invalid key goes with the row
+# before it, as it would when streaming. The _updated rows of the shards are
+# then put back in the order of the original rows, which is key order for
+# sorted inputs, so the _updated files are byte for byte those of an
+# unsharded run, and so are the missing value and join counts.
+#
+# python batchUpdateDerived.py legacy azmet-station-list.csv --processes 2 --shard-years 4 --shard-processes 4
+
+import concurrent.futures
+import contextlib
+import csv
+import os
+import tempfile
+import time
+
+from csvParseAndProcess import (
+    DEDUP_POLICIES,
+    SCHEMA_PATH,
+    JoinReport,
+    MissingValues,
+    ProfileReport,
+    dedupStation,
+    getListKeyFunction,
+    getUpdatedPath,
+    openAtomic,
+    openCsv,
+    requirePyarrow,
+    splitArchivePath,
+    updateDerived,
+    writeDerivedParquet,
+)
+
+
+def getShardYear(intDayKey=0, intShardYears=1):
+    # first year of the shard of a getObsKey() day key, e.g. 1988 for any day
+    # of 1988 to 1991 with 4 years per shard
+    intYear = intDayKey // 10**7
+
+    return intYear - intYear % intShardYears
+
+
+def getShardPath(path_shards, intShard=0, path=""):
+    # where the shard starting in year intShard keeps its copy of a file (or
+    # zip archive member), compressed the same way
+    path_archive, strMember = splitArchivePath(path)
+    strName = os.path.basename(path_archive if strMember is None else strMember)
+
+    return os.path.join(path_shards, str(intShard), strName)
+
+
+def splitFile(path, path_shards, intShardYears=1):
+    # Write each row of a csv file to the copy of the file of its shard.
+    # Returns (header, runs of [shard, rows] in the order of the rows, rows of
+    # an invalid key before any valid one), None for the header of an empty
+    # file. Shards only get a copy of the file if they have rows of it.
+    with openCsv(path) as csvfile, contextlib.ExitStack() as stack:
+        reader = csv.reader(csvfile)
+        listHeader = next(reader, None)
+        if listHeader is None:
+            return None, [], []
+
+        fnKey = getListKeyFunction(listHeader)
+        dictWriters = {}
+        listRuns = []
+        listPending = []
+        for row in reader:
+            # blank lines are skipped, as updateDerived() skips them
+            if not row:
+                continue
+            intDayKey = fnKey(row)
+            if intDayKey is None:
+                if not listRuns:
+                    listPending.append(row)
+                    continue
+                intShard = listRuns[-1][0]
+            else:
+                intShard = getShardYear(intDayKey, intShardYears)
+
+            if intShard not in dictWriters:
+                path_shard = getShardPath(path_shards, intShard, path)
+                os.makedirs(os.path.dirname(path_shard), exist_ok=True)
+                dictWriters[intShard] = csv.writer(
+                    stack.enter_context(openCsv(path_shard, "w"))
+                )
+                dictWriters[intShard].writerow(listHeader)
+            if not listRuns:
+                # rows before the first valid key go first in its shard
+                dictWriters[intShard].writerows(listPending)
+                listRuns.append([intShard, len(listPending)])
+                listPending = []
+            dictWriters[intShard].writerow(row)
+            if listRuns[-1][0] == intShard:
+                listRuns[-1][1] += 1
+            else:
+                listRuns.append([intShard, 1])
+
+    return listHeader, listRuns, listPending
+
+
+def splitStation(listPaths, path_shards, intShardYears=1):
+    # Split a station's four input files into shards of intShardYears years
+    # under path_shards. Returns (shards in year order, {path: runs of
+    # [shard, rows]} of the two derived files). Every shard gets all four
+    # files, with just the header where it has no rows of one; a station
+    # without any valid key is a single shard.
+    dictSplits = {
+        path: splitFile(path, path_shards, intShardYears) for path in listPaths
+    }
+    setShards = {
+        listRun[0] for _, listRuns, _ in dictSplits.values() for listRun in listRuns
+    }
+    listShards = sorted(setShards) or [0]
+
+    dictRuns = {}
+    for path, (listHeader, listRuns, listPending) in dictSplits.items():
+        for intShard in listShards:
+            path_shard = getShardPath(path_shards, intShard, path)
+            if intShard in {listRun[0] for listRun in listRuns}:
+                continue
+            # a file without any valid key goes whole in the first shard
+            listRows = listPending if intShard == listShards[0] else []
+            if listRows:
+                listRuns = [[intShard, len(listRows)]]
+            os.makedirs(os.path.dirname(path_shard), exist_ok=True)
+            with openCsv(path_shard, "w") as csvfile:
+                if listHeader is not None:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(listHeader)
+                    writer.writerows(listRows)
+        dictRuns[path] = listRuns
+
+    return listShards, dictRuns
+
+
+def updateShard(listPaths, dictOptions=None, listSentinels=None, blnProfile=False):
+    # updateDerived() of one shard's four files, in a worker process; returns
+    # (output paths, missing counts, join counts, profile report or None)
+    missing = MissingValues(listSentinels)
+    joins = JoinReport()
+    profile = ProfileReport(blnEnabled=blnProfile)
+    listOutputs = updateDerived(
+        *listPaths, **(dictOptions or {}), missing=missing, joins=joins, profile=profile
+    )
+
+    return (
+        [str(path) for path in listOutputs],
+        missing.getCounts(),
+        joins.getCounts(),
+        profile.getReport() if blnProfile else None,
+    )
+
+
+def mergeShards(path_out, listRuns, dictShardOutputs):
+    # Write the rows of each shard's _updated file to path_out in the order
+    # of listRuns, the runs of [shard, rows] of the original file. The header
+    # is that of the first shard with rows (an input without any rows is
+    # written out with the header its shard got).
+    with contextlib.ExitStack() as stack:
+        dictReaders = {
+            intShard: csv.reader(stack.enter_context(openCsv(path)))
+            for intShard, path in dictShardOutputs.items()
+        }
+        dictHeaders = {
+            intShard: next(reader, []) for intShard, reader in dictReaders.items()
+        }
+        intFirst = listRuns[0][0] if listRuns else min(dictReaders)
+        fileOut = stack.enter_context(openAtomic(path_out))
+        writer = csv.writer(fileOut)
+        writer.writerow(dictHeaders[intFirst])
+        for intShard, intRows in listRuns:
+            reader = dictReaders[intShard]
+            for _ in range(intRows):
+                row = next(reader, None)
+                if row is None:
+                    raise RuntimeError(
+                        f"{dictShardOutputs[intShard]} has fewer rows than its input"
+                    )
+                writer.writerow(row)
+        for intShard, reader in dictReaders.items():
+            if next(reader, None) is not None:
+                raise RuntimeError(
+                    f"{dictShardOutputs[intShard]} has more rows than its input"
+                )
+
+    return path_out
+
+
+def updateDerivedSharded(
+    path_obs_hrly,
+    path_derived_hrly,
+    path_obs_dyly,
+    path_derived_dyly,
+    shard_years=1,
+    processes=None,
+    streaming=False,
+    backend="python",
+    missing=None,
+    incremental=False,
+    path_parquet=None,
+    path_schema=SCHEMA_PATH,
+    joins=None,
+    profile=None,
+    dedup=None,
+    duplicates=None,
+):
+    # Same outputs as updateDerived(), with the station's years split into
+    # shards of shard_years years that run in a pool of processes (default:
+    # one per CPU; 1 runs them one after another in this process). The shards
+    # are written to a temporary directory next to the derived files. dedup
+    # runs on the whole station first and Parquet is written from the merged
+    # outputs; incremental isn't supported, as its manifest is of whole files.
+    if incremental:
+        raise ValueError("incremental is not supported with shards")
+    if shard_years < 1:
+        raise ValueError(f"shard_years must be at least 1, not {shard_years}")
+    if dedup is not None and dedup not in DEDUP_POLICIES:
+        raise ValueError(
+            f"dedup must be one of {', '.join(DEDUP_POLICIES)}, not {dedup!r}"
+        )
+    if path_parquet is not None:
+        requirePyarrow()
+    if missing is None:
+        missing = MissingValues()
+    if joins is None:
+        joins = JoinReport()
+    if profile is None:
+        profile = ProfileReport(blnEnabled=False)
+    dictOptions = {"streaming": streaming, "backend": backend}
+
+    listPaths = [path_obs_hrly, path_derived_hrly, path_obs_dyly, path_derived_dyly]
+    fltStart = time.perf_counter()
+    if dedup is not None:
+        with profile.stage("dedup"):
+            dedupStation(*listPaths, dedup, missing, duplicates)
+
+    # next to the outputs, as the inputs may be in a zip archive
+    path_outputs = os.path.dirname(os.path.abspath(getUpdatedPath(path_derived_hrly)))
+    os.makedirs(path_outputs, exist_ok=True)
+    with tempfile.TemporaryDirectory(
+        prefix=".shards-", dir=path_outputs
+    ) as path_shards:
+        with profile.stage("split shards"):
+            listShards, dictRuns = splitStation(listPaths, path_shards, shard_years)
+        listArgs = [
+            (
+                [getShardPath(path_shards, intShard, path) for path in listPaths],
+                dictOptions,
+                sorted(missing.setSentinels),
+                profile.blnEnabled,
+            )
+            for intShard in listShards
+        ]
+        if processes == 1 or len(listShards) == 1:
+            listResults = [updateShard(*tplArgs) for tplArgs in listArgs]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes
+            ) as executor:
+                listFutures = [
+                    executor.submit(updateShard, *tplArgs) for tplArgs in listArgs
+                ]
+                listResults = [future.result() for future in listFutures]
+
+        # in year order, so that the join examples are the first ones
+        for _, dictMissing, dictJoins, dictProfile in listResults:
+            missing.addCounts(dictMissing)
+            joins.addCounts(dictJoins)
+            if dictProfile is not None:
+                profile.addReport(dictProfile)
+
+        listOutputs = []
+        for intOutput, path_derived in enumerate(
+            (path_derived_hrly, path_derived_dyly)
+        ):
+            listRuns = dictRuns[path_derived]
+            profile.addRows("merge shards", sum(intRows for _, intRows in listRuns))
+            with profile.stage("merge shards"):
+                listOutputs.append(
+                    mergeShards(
+                        getUpdatedPath(path_derived),
+                        listRuns,
+                        {
+                            intShard: tplResult[0][intOutput]
+                            for intShard, tplResult in zip(listShards, listResults)
+                        },
+                    )
+                )
+
+    if path_parquet is not None:
+        for path_csv, strTable in zip(
+            listOutputs, ("obs_hrly_derived", "obs_dyly_derived")
+        ):
+            with profile.stage(f"parquet {strTable}"):
+                writeDerivedParquet(
+                    path_csv, path_parquet, strTable, path_schema, missing.setSentinels
+                )
+    profile.fltSeconds += time.perf_counter() - fltStart
+
+    return listOutputs
@@ -0,0 +1,112 @@
+# Tests of azmetCalendar.py against datetime, one value at a time the way
+# R/utils.R does it, and against the key columns of generated CSVs.
+#
+# python -m pytest tests
+
+import datetime
+
+import numpy as np
+from hypothesis import given
+from hypothesis import strategies as st
+
+from azmetCalendar import (
+    formatObsDatetimes,
+    formatObsKeyColumns,
+    fromAzmetParts,
+    splitObsKeys,
+    toAzmetParts,
+)
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import getObsKeyArray, readCsvRows
+from generateSyntheticData import generateStations
+
+datetimes = st.lists(
+    st.datetimes(datetime.datetime(1900, 1, 1, 1), datetime.datetime(2100, 12, 31)).map(
+        lambda dt: dt.replace(minute=dt.minute % 2 * 30, second=0, microsecond=0)
+    ),
+    max_size=50,
+)
+
+
+def use24(dt):
+    # (year, doy, hour, obs_datetime) as use_24_year(), use_24_yday(),
+    # use_24_hour() and use_24_datetime() give them; "%H00" drops the minutes
+    # from the hour, but not from the datetime
+    if dt.time() == datetime.time(0):
+        dtDay = dt - datetime.timedelta(days=1)
+        return (
+            dtDay.year,
+            dtDay.timetuple().tm_yday,
+            2400,
+            dtDay.strftime("%Y-%m-%d 23:59:59"),
+        )
+
+    return (
+        dt.year,
+        dt.timetuple().tm_yday,
+        dt.hour * 100,
+        dt.strftime("%Y-%m-%d %H:%M:00"),
+    )
+
+
+@given(datetimes)
+def test_toAzmetParts(listDatetimes):
+    aryDatetimes = np.array(listDatetimes, dtype="datetime64[s]")
+    tplParts = toAzmetParts(aryDatetimes)
+    assert list(zip(*[aryPart.tolist() for aryPart in tplParts])) == [
+        use24(dt)[:3] for dt in listDatetimes
+    ]
+
+    # back from the parts, the datetimes are those on the hour (00:30 being
+    # hour 0 of its own day, not 2400 of the day before)
+    listHours = [dt.replace(minute=0) for dt in listDatetimes]
+    assert formatObsDatetimes(*tplParts).tolist() == [
+        use24(dt)[3] if dt.time() == datetime.time(0) else f"{dt:%Y-%m-%d %H}:00:00"
+        for dt in listDatetimes
+    ]
+    assert (
+        fromAzmetParts(*tplParts) == np.array(listHours, dtype="datetime64[s]")
+    ).all()
+
+
+def test_invalid():
+    assert fromAzmetParts([1987, 1988, 1987], [366, 366, 1], [100, 100, 2500]).astype(
+        str
+    ).tolist() == ["NaT", "1988-12-31T01:00:00", "NaT"]
+    assert formatObsDatetimes([1899, 2000], [1, 60]).tolist() == ["NA", "2000-02-29"]
+    assert toAzmetParts(np.array(["NaT", "1987-01-01T00:00"], dtype="datetime64[s]"))[
+        2
+    ].tolist() == [-1, 2400]
+
+
+def test_minutes():
+    # use_24_hour() is strftime(x, "%H00") except at exactly 00:00:00
+    tplParts = toAzmetParts(
+        np.array(
+            [
+                "1987-01-01T01:30",
+                "1987-01-02T00:30",
+                "1987-01-02T00:00:30",
+                "1987-01-02T23:59:59",
+            ],
+            dtype="datetime64[s]",
+        )
+    )
+    assert [aryPart.tolist() for aryPart in tplParts] == [
+        [1987, 1987, 1987, 1987],
+        [1, 2, 2, 2],
+        [100, 0, 0, 2300],
+    ]
+
+
+def test_formatObsKeyColumns(tmp_path):
+    generateStations(str(tmp_path), 1, 1987, 1988)
+    dictPaths = getStationPaths(str(tmp_path), "Synthetic 1")
+    for strPathKey, blnHour in (("path_obs_hrly", True), ("path_obs_dyly", False)):
+        listHeader, listRows = readCsvRows(dictPaths[strPathKey])
+        aryKeys = getObsKeyArray(listHeader, listRows, blnHour)
+        tplParts = splitObsKeys(aryKeys)
+        dictColumns = formatObsKeyColumns(*(tplParts if blnHour else tplParts[:2]))
+        for strColumn, aryValues in dictColumns.items():
+            intColumn = listHeader.index(strColumn)
+            assert aryValues.tolist() == [row[intColumn] for row in listRows]
@@ -0,0 +1,136 @@
+# Tests of batchUpdateDerived.py: with a checkpoint journal stations resume at
+# their first unfinished stage, and originals only go once write is journalled;
+# without one, a station that fails doesn't stop the others.
+#
+# python -m pytest tests
+
+import os
+
+from batchUpdateDerived import getStationPaths, readJournal, runBatch, runStation
+from csvParseAndProcess import getUpdatedPath
+from generateSyntheticData import generateStations
+
+
+def test_resume(tmp_path):
+    path_legacy = str(tmp_path)
+    path_station_list, _ = generateStations(path_legacy, intStations=1)
+    dictCheckpoint = {
+        "path_journal": str(tmp_path / "journal.jsonl"),
+        "path_station_list": path_station_list,
+    }
+    dictPaths = getStationPaths(path_legacy, "Synthetic 1")
+
+    dictResult = runStation(path_legacy, "Synthetic 1", {}, dictCheckpoint)
+    assert dictResult["stages"] == {"parse": "done", "derive": "done", "write": "done"}
+
+    # a crash between derive and write, and an _updated output that changed
+    # since derive, which is recalculated from parse on
+    with open(dictCheckpoint["path_journal"], "r") as jsonfile:
+        listLines = jsonfile.readlines()
+    with open(dictCheckpoint["path_journal"], "w") as jsonfile:
+        jsonfile.writelines(listLines[:2] + ['{"station": "Synth'])
+    dictResult = runStation(
+        path_legacy, "Synthetic 1", {}, dict(dictCheckpoint, delete_originals=True)
+    )
+    assert dictResult["stages"] == {
+        "parse": "done before",
+        "derive": "done before",
+        "write": "done",
+    }
+    assert not os.path.exists(dictPaths["path_derived_hrly"])
+    assert list(readJournal(dictCheckpoint["path_journal"])["Synthetic 1"]) == [
+        "parse",
+        "derive",
+        "write",
+    ]
+
+    # once write is done, the station is never run again
+    dictResult = runStation(path_legacy, "Synthetic 1", {}, dictCheckpoint)
+    assert dictResult["status"] == "ok"
+    assert set(dictResult["stages"].values()) == {"done before"}
+
+
+def test_changed_output(tmp_path):
+    path_legacy = str(tmp_path)
+    path_station_list, _ = generateStations(path_legacy, intStations=1)
+    dictCheckpoint = {
+        "path_journal": str(tmp_path / "journal.jsonl"),
+        "path_station_list": path_station_list,
+    }
+    runStation(path_legacy, "Synthetic 1", {}, dictCheckpoint)
+    with open(dictCheckpoint["path_journal"], "r") as jsonfile:
+        listLines = jsonfile.readlines()
+    with open(dictCheckpoint["path_journal"], "w") as jsonfile:
+        jsonfile.writelines(listLines[:2])
+    path_updated = getUpdatedPath(
+        getStationPaths(path_legacy, "Synthetic 1")["path_derived_dyly"]
+    )
+    with open(path_updated, "a") as csvfile:
+        csvfile.write("garbage\n")
+
+    dictResult = runStation(path_legacy, "Synthetic 1", {}, dictCheckpoint)
+    assert dictResult["stages"] == {"parse": "done", "derive": "done", "write": "done"}
+
+
+def test_crash_before_cleanup(tmp_path):
+    path_legacy = str(tmp_path)
+    path_station_list, _ = generateStations(path_legacy, intStations=1)
+    dictCheckpoint = {
+        "path_journal": str(tmp_path / "journal.jsonl"),
+        "path_station_list": path_station_list,
+    }
+    dictPaths = getStationPaths(path_legacy, "Synthetic 1")
+
+    # write journalled, but the originals are still there as after a crash
+    # before their removal
+    runStation(path_legacy, "Synthetic 1", {}, dictCheckpoint)
+    assert os.path.exists(dictPaths["path_derived_hrly"])
+
+    dictResult = runStation(
+        path_legacy, "Synthetic 1", {}, dict(dictCheckpoint, delete_originals=True)
+    )
+    assert dictResult["status"] == "ok"
+    assert set(dictResult["stages"].values()) == {"done before"}
+    for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+        assert not os.path.exists(dictPaths[strPathKey])
+        assert os.path.exists(getUpdatedPath(dictPaths[strPathKey]))
+
+
+def test_runBatch_error(tmp_path):
+    # without a journal: a station that raises is reported as an error and
+    # leaves its files alone, and the stations around it still finish
+    path_legacy = str(tmp_path)
+    path_station_list, _ = generateStations(path_legacy, intStations=3)
+    dictBroken = getStationPaths(path_legacy, "Synthetic 2")
+    os.remove(dictBroken["path_obs_hrly"])
+    dictOriginals = {}
+    for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+        with open(dictBroken[strPathKey], "rb") as csvfile:
+            dictOriginals[strPathKey] = csvfile.read()
+
+    listReported = []
+    listResults = runBatch(
+        path_legacy, path_station_list, 2, fnReport=listReported.append
+    )
+    assert [dictResult["status"] for dictResult in listResults] == [
+        "ok",
+        "error",
+        "ok",
+    ]
+    assert sorted(dictResult["station"] for dictResult in listReported) == [
+        "Synthetic 1",
+        "Synthetic 2",
+        "Synthetic 3",
+    ]
+    assert listResults[1]["error"].startswith("FileNotFoundError: ")
+    assert "Traceback" in listResults[1]["traceback"]
+
+    for strPathKey, bytOriginal in dictOriginals.items():
+        with open(dictBroken[strPathKey], "rb") as csvfile:
+            assert csvfile.read() == bytOriginal
+        assert not os.path.exists(getUpdatedPath(dictBroken[strPathKey]))
+    for dictResult in (listResults[0], listResults[2]):
+        dictPaths = getStationPaths(path_legacy, dictResult["station"])
+        for strPathKey in ("path_derived_hrly", "path_derived_dyly"):
+            assert os.path.exists(dictPaths[strPathKey])
+            assert os.path.exists(getUpdatedPath(dictPaths[strPathKey]))
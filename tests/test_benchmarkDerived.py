@@ -0,0 +1,85 @@
+# Smoke tests of generateSyntheticData.py and benchmarkDerived.py: the same
+# seed writes the same files, and a benchmark run compared with a faster
+# earlier one is a regression.
+#
+# python -m pytest tests
+
+import json
+import os
+
+from benchmarkDerived import compareResults, main
+from generateSyntheticData import generateStations
+
+
+def readFiles(path_legacy):
+    # {file name: bytes} of a directory
+    dictFiles = {}
+    for strFile in sorted(os.listdir(path_legacy)):
+        with open(os.path.join(path_legacy, strFile), "rb") as file:
+            dictFiles[strFile] = file.read()
+    return dictFiles
+
+
+def test_generateStations(tmp_path):
+    dictRuns = {}
+    for strRun, intSeed in (("first", 7), ("again", 7), ("other", 8)):
+        path_station_list, dictRows = generateStations(
+            str(tmp_path / strRun), 2, 1987, 1988, 0.05, intSeed
+        )
+        assert os.path.basename(path_station_list) == "synthetic-station-list.csv"
+        dictRuns[strRun] = (dictRows, readFiles(tmp_path / strRun))
+
+    assert dictRuns["again"] == dictRuns["first"]
+    dictRows, dictFiles = dictRuns["first"]
+    assert dictRows["Synthetic 2"]["path_obs_hrly"] == (365 + 366) * 24
+    assert len(dictFiles) == 2 * 4 + 1
+    # another seed, other values in the same rows
+    assert dictRuns["other"][0] == dictRows
+    assert dictRuns["other"][1] != dictFiles
+
+
+def test_benchmark(tmp_path, capsys):
+    path_output = tmp_path / "bench.json"
+    listArgs = [
+        "--years",
+        "1987",
+        "1987",
+        "--case",
+        "python",
+        "--repeat",
+        "1",
+        "--data",
+        str(tmp_path / "legacy"),
+    ]
+    assert main(listArgs + ["--output", str(path_output)]) == 0
+    with open(path_output) as jsonfile:
+        dictResults = json.load(jsonfile)
+    assert list(dictResults["cases"]) == ["python"]
+    assert dictResults["rows"]["hourly"] == 365 * 24
+    assert dictResults["cases"]["python"]["rows_per_second"] > 0
+    listLines, blnWorse = compareResults(dictResults, dictResults)
+    assert not blnWorse
+    assert listLines and all(line.endswith("(+0.0%)") for line in listLines)
+
+    # earlier runs ten times as fast and ten times as slow as this one, far
+    # past any noise in the timings
+    for strRun, fltFactor in (("faster", 10.0), ("slower", 0.1)):
+        dictEarlier = json.loads(json.dumps(dictResults))
+        dictEarlier["cases"]["python"]["rows_per_second"] *= fltFactor
+        for dictFunction in dictEarlier["functions"].values():
+            dictFunction["us_per_call"] /= fltFactor
+        with open(tmp_path / f"{strRun}.json", "w") as jsonfile:
+            json.dump(dictEarlier, jsonfile)
+
+    with open(tmp_path / "faster.json") as jsonfile:
+        listLines, blnWorse = compareResults(json.load(jsonfile), dictResults)
+    assert blnWorse
+    assert "python rows/s" in next(
+        line for line in listLines if line.endswith("REGRESSION")
+    )
+
+    capsys.readouterr()
+    assert main(listArgs + ["--compare", str(tmp_path / "slower.json")]) == 0
+    assert "REGRESSION" not in capsys.readouterr().out
+    assert main(listArgs + ["--compare", str(tmp_path / "faster.json")]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
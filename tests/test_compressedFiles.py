@@ -0,0 +1,82 @@
+# Tests that updateDerived() reads gzip compressed files and zip archive members
+# as it reads plain csv files, and that repackArchive() puts the _updated files
+# of an archive's members back in it.
+#
+# python -m pytest tests
+
+import gzip
+import os
+import shutil
+import zipfile
+
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import getUpdatedPath, openCsv, repackArchive, updateDerived
+from generateSyntheticData import generateStation
+
+
+def test_getUpdatedPath(tmp_path):
+    path_archive = tmp_path / "legacy.zip"
+    with zipfile.ZipFile(path_archive, "w") as archive:
+        archive.writestr("legacy/obs_hrly_derived-tucson.csv", "")
+
+    assert getUpdatedPath("obs_hrly_derived-tucson.csv.gz") == (
+        "obs_hrly_derived-tucson_updated.csv.gz"
+    )
+    assert getUpdatedPath(
+        os.path.join(str(path_archive), "legacy", "obs_hrly_derived-tucson.csv")
+    ) == os.path.join(str(tmp_path), "legacy", "obs_hrly_derived-tucson_updated.csv.gz")
+
+
+def test_updateDerivedCompressed(tmp_path):
+    path_legacy = tmp_path / "legacy"
+    path_legacy.mkdir()
+    generateStation(str(path_legacy), "Synthetic 1", intEndYear=1988)
+    listNames = sorted(p.name for p in path_legacy.iterdir())
+
+    # the same station gzip compressed, and in a zip archive
+    path_gzip = tmp_path / "gzip" / "legacy"
+    path_gzip.mkdir(parents=True)
+    for strName in listNames:
+        with open(path_legacy / strName, "rb") as fileIn, gzip.open(
+            path_gzip / f"{strName}.gz", "wb"
+        ) as fileOut:
+            shutil.copyfileobj(fileIn, fileOut)
+    path_zip = tmp_path / "zip"
+    path_zip.mkdir()
+    with zipfile.ZipFile(path_zip / "legacy.zip", "w", zipfile.ZIP_DEFLATED) as archive:
+        for strName in listNames:
+            archive.write(path_legacy / strName, f"legacy/{strName}")
+
+    listPlain = [
+        open(path, "rb").read()
+        for path in updateDerived(**getStationPaths(str(path_legacy), "Synthetic 1"))
+    ]
+    for path_run, dictOptions in (
+        (path_gzip, {}),
+        (path_gzip, {"streaming": True}),
+        (path_zip / "legacy.zip" / "legacy", {}),
+    ):
+        dictPaths = getStationPaths(str(path_run), "Synthetic 1")
+        assert dictPaths["path_obs_hrly"].endswith(".gz") == (path_run == path_gzip)
+        listOutputs = updateDerived(**dictPaths, **dictOptions)
+        assert all(path.endswith("_updated.csv.gz") for path in listOutputs)
+        assert [gzip.open(path).read() for path in listOutputs] == listPlain
+
+    # the _updated members in place of the derived ones
+    dictMembers = {}
+    for path_derived, path in zip(
+        (dictPaths["path_derived_hrly"], dictPaths["path_derived_dyly"]), listOutputs
+    ):
+        strMember = "legacy/" + os.path.basename(path_derived)
+        dictMembers[strMember] = None
+        dictMembers[strMember.replace(".csv", "_updated.csv")] = path
+    repackArchive(path_zip / "legacy.zip", path_zip / "repacked.zip", dictMembers)
+    with zipfile.ZipFile(path_zip / "repacked.zip") as archive:
+        assert sorted(archive.namelist()) == sorted(
+            [f"legacy/{strName}" for strName in listNames if "_derived-" not in strName]
+            + [strMember for strMember, path in dictMembers.items() if path]
+        )
+    for path in listOutputs:
+        strMember = "legacy/" + os.path.basename(path)[: -len(".gz")]
+        with openCsv(os.path.join(str(path_zip), "repacked.zip", strMember)) as csvfile:
+            assert csvfile.read().encode() == gzip.open(path).read()
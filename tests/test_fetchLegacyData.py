@@ -0,0 +1,144 @@
+# Offline tests for fetchLegacyData.py, against its own stand-in server
+# serving a temporary directory of fixture files.
+#
+# python -m pytest tests
+
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+import fetchLegacyData
+from fetchLegacyData import fetchFiles, listRawFiles, main, serveFixtures
+
+STATIONS = [("Tucson", 1, 1987, 2025), ("Yuma Valley", 2, 1987, 2025)]
+
+
+@pytest.fixture
+def server(tmp_path):
+    # (fixture directory, base URL) of a server running in a thread
+    path_fixtures = tmp_path / "fixtures"
+    path_fixtures.mkdir()
+    for strName in ("0187rh.txt", "0188rh.txt", "0287rh.txt", "0187rd.txt"):
+        (path_fixtures / strName).write_bytes(f"1987,1,1,{strName}\r\n".encode())
+
+    server = serveFixtures(str(path_fixtures), intPort=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    strHost, intPort = server.server_address[:2]
+    yield path_fixtures, f"http://{strHost}:{intPort}/"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(path_cache, strBaseUrl, **kwargs):
+    listResults = asyncio.run(
+        fetchFiles(
+            listRawFiles(STATIONS, 1987, 1988),
+            str(path_cache),
+            strBaseUrl,
+            fltRate=0,
+            intRetries=0,
+            **kwargs,
+        )
+    )
+    return {dictResult["name"]: dictResult for dictResult in listResults}
+
+
+def test_listRawFiles():
+    listFiles = listRawFiles([("Tucson", 1, 1987, 2025)], 1986, 1988, ["hourly"])
+    assert [dictFile["name"] for dictFile in listFiles] == ["0187rh.txt", "0188rh.txt"]
+
+
+def test_fetch_and_refetch(tmp_path, server):
+    path_fixtures, strBaseUrl = server
+    path_cache = tmp_path / "raw"
+
+    dictResults = fetch(path_cache, strBaseUrl, intConcurrency=3)
+    assert dictResults["0187rh.txt"]["status"] == "downloaded"
+    assert dictResults["0288rh.txt"]["status"] == "missing"
+    assert (path_cache / "0187rd.txt").read_bytes() == (
+        path_fixtures / "0187rd.txt"
+    ).read_bytes()
+
+    # unchanged files are only checked, a changed one is downloaded again
+    (path_fixtures / "0188rh.txt").write_bytes(b"1988,1,1,changed\r\n")
+    dictResults = fetch(path_cache, strBaseUrl)
+    assert dictResults["0187rh.txt"]["status"] == "not modified"
+    assert dictResults["0188rh.txt"]["status"] == "downloaded"
+    assert (path_cache / "0188rh.txt").read_bytes() == b"1988,1,1,changed\r\n"
+
+    # a file gone from the server goes from the cache too, with its ETag
+    (path_fixtures / "0287rh.txt").unlink()
+    dictResults = fetch(path_cache, strBaseUrl)
+    assert dictResults["0287rh.txt"]["status"] == "missing"
+    assert not (path_cache / "0287rh.txt").exists()
+    assert not (path_cache / "0287rh.txt.json").exists()
+    assert dictResults["0187rh.txt"]["status"] == "not modified"
+
+
+def test_fetch_unreachable(tmp_path):
+    dictResults = fetch(tmp_path / "raw", "http://127.0.0.1:1/")
+    assert {dictResult["status"] for dictResult in dictResults.values()} == {"error"}
+
+
+def test_fetch_truncated(tmp_path, monkeypatch):
+    # a response cut short is an error for that file only, not the whole fetch
+    def requestUrl(strUrl="", dictHeaders=None, fltTimeout=60.0):
+        if strUrl.endswith("0187rh.txt"):
+            raise http.client.IncompleteRead(b"1987", 10)
+        return 404, {}, b""
+
+    monkeypatch.setattr(fetchLegacyData, "requestUrl", requestUrl)
+    dictResults = fetch(tmp_path / "raw", "http://127.0.0.1:1/")
+    assert dictResults["0187rh.txt"]["status"] == "error"
+    assert dictResults["0187rh.txt"]["error"].startswith("IncompleteRead")
+    assert dictResults["0188rh.txt"]["status"] == "missing"
+
+
+def test_main_fetch(tmp_path, server):
+    path_fixtures, strBaseUrl = server
+    path_station_list = tmp_path / "azmet-station-list.csv"
+    path_station_list.write_text(
+        "stn,stn_no,start_yr,end_yr\nTucson,1,1987,2025\n", newline=""
+    )
+    path_cache = tmp_path / "raw"
+    path_report = tmp_path / "fetch.json"
+
+    listArgs = [
+        "fetch",
+        str(path_cache),
+        str(path_station_list),
+        "--years",
+        "1987",
+        "1988",
+        "--base-url",
+        strBaseUrl,
+        "--rate",
+        "0",
+        "--report",
+        str(path_report),
+    ]
+    assert main(listArgs) == 0
+    assert (path_cache / "0188rh.txt").read_bytes() == (
+        path_fixtures / "0188rh.txt"
+    ).read_bytes()
+    with open(path_cache / "0187rh.txt.json", "r") as jsonfile:
+        assert json.load(jsonfile)["etag"]
+    with open(path_report, "r") as jsonfile:
+        dictReport = json.load(jsonfile)
+    assert sorted(
+        (dictResult["name"], dictResult["status"]) for dictResult in dictReport["files"]
+    ) == [
+        ("0187rd.txt", "downloaded"),
+        ("0187rh.txt", "downloaded"),
+        ("0188rd.txt", "missing"),
+        ("0188rh.txt", "downloaded"),
+    ]
+    assert main(listArgs) == 0
+    with open(path_report, "r") as jsonfile:
+        assert {
+            dictResult["status"] for dictResult in json.load(jsonfile)["files"]
+        } == {"not modified", "missing"}
@@ -0,0 +1,238 @@
+# Tests that the numpy versions of the heat functions in csvParseAndProcess.py
+# give bit for bit what the scalar ones do, for every value of a column:
+# missing values, ties at 0.05 and the Tmax == Tmin and division paths. And
+# that the getHeatUnits() cache gives what calculateHeatUnits() does, on the
+# 0.1 degree grid and off it, at any cache size.
+#
+# python -m pytest tests
+
+import math
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+import csvParseAndProcess
+from csvParseAndProcess import (
+    HEAT_UNIT_THRESHOLDS,
+    MISSING_SENTINELS,
+    calculateHeatStressCotton,
+    calculateHeatStressCottonArray,
+    calculateHeatUnits,
+    calculateHeatUnitsArray,
+    formatScaled,
+    getHeatUnits,
+    np,
+    roundArray,
+    roundValue,
+    setHeatUnitCacheSize,
+)
+
+pytestmark = pytest.mark.skipif(np is None, reason="needs numpy")
+
+# values as the legacy files have them, to 0.1 or 0.01, and the sentinels
+values = st.one_of(
+    st.sampled_from(MISSING_SENTINELS),
+    st.integers(min_value=-200, max_value=600).map(
+        lambda intTenths: f"{intTenths / 10:.1f}"
+    ),
+    st.integers(min_value=-2000, max_value=6000).map(
+        lambda intHundredths: f"{intHundredths / 100:.2f}"
+    ),
+)
+
+
+def assertHeatStress(listRows):
+    # listRows of (temp air, relative humidity, vpd, sol rad) strings
+    listColumns = [np.array(tplColumn) for tplColumn in zip(*listRows)]
+    dictArrays = calculateHeatStressCottonArray(*listColumns)
+    for strKey, strNegative in (
+        ("heatStressCottonC", "negativeC"),
+        ("heatStressCottonF", "negativeF"),
+    ):
+        listStrArray = formatScaled(dictArrays[strKey], dictArrays[strNegative], 7)
+        for intRow, tplRow in enumerate(listRows):
+            decScalar = calculateHeatStressCotton(*tplRow)[strKey]
+            if dictArrays["missing"][intRow]:
+                assert decScalar == "-9999.0"
+            else:
+                assert listStrArray[intRow] == format(decScalar, "f")
+
+
+def test_heatStressCotton():
+    # 0.53 + T - 1.43 * VPD and -5.93 + T + 1.95 * Ea on and next to the
+    # ties of rounding to 0.1, and a missing value in each column
+    listRows = [
+        ("-0.48", "50", "0", "10"),
+        ("-0.58", "50", "0", "10"),
+        ("-0.47", "50", "0", "10"),
+        ("1.00", "20", "0.45", "10"),
+        ("5.93", "0", "1.0", "0"),
+        ("0.0", "100", "0.0", "0"),
+        ("-0.0", "0", "0", "1"),
+    ]
+    for intColumn in range(4):
+        for strSentinel in MISSING_SENTINELS:
+            listRow = ["25.0", "40", "1.5", "100"]
+            listRow[intColumn] = strSentinel
+            listRows.append(tuple(listRow))
+    assertHeatStress(listRows)
+
+
+@settings(max_examples=200, deadline=None)
+@given(st.lists(st.tuples(values, values, values, values), min_size=1))
+def test_heatStressCotton_property(listRows):
+    assertHeatStress(listRows)
+
+
+def assertHeatUnits(listRows):
+    # listRows of (Tmax, Tmin) strings, for every pair of thresholds
+    aryMax, aryMin = [np.array(tplColumn) for tplColumn in zip(*listRows)]
+    for _, _, strTempAirUpper, strTempAirLower in HEAT_UNIT_THRESHOLDS:
+        aryFltArray = calculateHeatUnitsArray(
+            aryMax, aryMin, strTempAirUpper, strTempAirLower
+        )["fltHeatUnits"]
+        listStrArray = formatScaled(*roundArray(aryFltArray, "000.0"), 1)
+        for intRow, (strMax, strMin) in enumerate(listRows):
+            fltScalar = calculateHeatUnits(
+                strMax, strMin, strTempAirUpper, strTempAirLower
+            )["fltHeatUnits"]
+            assert math.copysign(1, aryFltArray[intRow]) == math.copysign(1, fltScalar)
+            assert aryFltArray[intRow].item() == fltScalar
+            assert listStrArray[intRow] == roundValue(fltScalar, "000.0", "str")
+
+
+def test_heatUnits():
+    listRows = [
+        # no cutoff (15080), including Tmax == Tmin, and a mean 0.05 over TL
+        ("25.0", "15.0"),
+        ("20.0", "20.0"),
+        ("10.2", "10.1"),
+        ("12.9", "12.8"),
+        # lower cutoff (15100), with (TL - N) / (X - N) * 100 on a tie
+        ("20.0", "0.0"),
+        ("80.0", "0.0"),
+        ("10.5", "-10.0"),
+        # upper cutoff (15220), both cutoffs (15300) and R < 0 (15230)
+        ("40.0", "20.0"),
+        ("45.0", "5.0"),
+        ("34.5", "34.4"),
+        ("30.1", "29.9"),
+    ]
+    for strSentinel in MISSING_SENTINELS:
+        listRows += [(strSentinel, "10.0"), ("30.0", strSentinel)]
+    assertHeatUnits(listRows)
+
+
+def dividesByZero(strMax, strMin):
+    try:
+        for _, _, strTempAirUpper, strTempAirLower in HEAT_UNIT_THRESHOLDS:
+            calculateHeatUnits(strMax, strMin, strTempAirUpper, strTempAirLower)
+    except ZeroDivisionError:
+        return True
+
+    return False
+
+
+@settings(max_examples=200, deadline=None)
+@given(st.lists(st.tuples(values, values), min_size=1))
+def test_heatUnits_property(listRows):
+    # without the Tmax == Tmin rows that divide by zero (see below)
+    listRows = [tplRow for tplRow in listRows if not dividesByZero(*tplRow)]
+    if listRows:
+        assertHeatUnits(listRows)
+
+
+def test_heatUnits_zeroDivision():
+    # Tmax == Tmin at or below TL divides by zero, in both versions
+    with pytest.raises(ZeroDivisionError):
+        calculateHeatUnits("5.0", "5.0", "30.0", "10.0")
+    with pytest.raises(ZeroDivisionError):
+        calculateHeatUnitsArray(
+            np.array(["20.0", "5.0"]), np.array(["10.0", "5.0"]), "30.0", "10.0"
+        )
+
+
+def getHeatUnitsUncached(fltTempAirMax, fltTempAirMin):
+    # what getHeatUnits() gives, from calculateHeatUnits() on the strings the
+    # temperatures were parsed from; a ZeroDivisionError (or the
+    # InvalidOperation of rounding an enormous value) is given back
+    try:
+        return tuple(
+            roundValue(
+                calculateHeatUnits(
+                    repr(fltTempAirMax),
+                    repr(fltTempAirMin),
+                    strTempAirUpper,
+                    strTempAirLower,
+                )["fltHeatUnits"],
+                "000.0",
+                "str",
+            )
+            for _, _, strTempAirUpper, strTempAirLower in HEAT_UNIT_THRESHOLDS
+        )
+    except ArithmeticError as e:
+        return type(e)
+
+
+def getHeatUnitsCached(fltTempAirMax, fltTempAirMin):
+    try:
+        return getHeatUnits(fltTempAirMax, fltTempAirMin)
+    except ArithmeticError as e:
+        return type(e)
+
+
+def assertHeatUnitCache(listPairs):
+    # each pair twice, so the second lookup is a cache hit
+    for tplPair in listPairs + listPairs:
+        assert getHeatUnitsCached(*tplPair) == getHeatUnitsUncached(*tplPair)
+
+
+@pytest.mark.parametrize("intCacheSize", [None, 0, 1])
+def test_heatUnitCache(intCacheSize):
+    # None for the default size
+    if intCacheSize is not None:
+        setHeatUnitCacheSize(intCacheSize)
+    try:
+        # the 0.1 degree grid, every Tmax from -10.0 to 50.0 against a spread
+        # of Tmin, with Tmax == Tmin among them
+        listPairs = [
+            (intTempAirMax / 10, intTempAirMin / 10)
+            for intTempAirMax in range(-100, 501)
+            for intTempAirMin in range(-100, intTempAirMax + 1, 37)
+        ]
+        # off the grid, -0.0 and missing values
+        listPairs += [
+            (25.37, 12.8),
+            (30.0, 12.77),
+            (34.44441, 12.7778),
+            (-0.0, -5.0),
+            (20.0, -0.0),
+            (-0.0, -0.0),
+            (math.nan, 10.0),
+            (30.0, math.nan),
+            (math.inf, 10.0),
+        ]
+        assertHeatUnitCache(listPairs)
+
+        if intCacheSize is None:
+            assert csvParseAndProcess.getHeatUnitsOnGrid.cache_info().hits > 0
+    finally:
+        setHeatUnitCacheSize()
+
+
+@settings(max_examples=200, deadline=None)
+@given(
+    st.lists(
+        st.tuples(
+            st.floats(min_value=-30.0, max_value=60.0),
+            st.floats(min_value=-30.0, max_value=60.0),
+        ),
+        min_size=1,
+    )
+)
+def test_heatUnitCache_property(listPairs):
+    # temperatures on and off the grid, as the hundredths of legacy files
+    assertHeatUnitCache(
+        [(round(fltMax, 2), round(fltMin, 2)) for fltMax, fltMin in listPairs]
+        + listPairs
+    )
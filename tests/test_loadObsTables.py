@@ -0,0 +1,121 @@
+# Tests of loadObsTables.py against a SQLite file: every row of the four CSVs
+# is loaded, with NA as NULL in the typed columns only, and the multi-row
+# INSERTs stay under the parameter limit.
+#
+# python -m pytest tests
+
+import csv
+import sqlite3
+
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import getUpdatedPath, readCreateTable, updateDerived
+from generateSyntheticData import generateStations
+from loadObsTables import SCHEMA_FILE, MysqlDialect, SqliteDialect, loadCsv, main
+
+
+def test_loadSqlite(tmp_path):
+    path_legacy = tmp_path / "legacy"
+    path_station_list, _ = generateStations(str(path_legacy), 1, 1987, 1988)
+    dictPaths = getStationPaths(str(path_legacy), "Synthetic 1")
+    # an NA in a typed (tinyint) column and in a varchar one
+    with open(dictPaths["path_obs_hrly"], "r", newline="") as csvfile:
+        listRows = list(csv.reader(csvfile))
+    listRows[1][listRows[0].index("obs_needs_review")] = "NA"
+    listRows[2][listRows[0].index("obs_hrly_temp_air")] = "NA"
+    with open(dictPaths["path_obs_hrly"], "w", newline="") as csvfile:
+        csv.writer(csvfile).writerows(listRows)
+    updateDerived(**dictPaths)
+
+    path_sqlite = tmp_path / "azmet.sqlite"
+    listArgs = [str(path_legacy), path_station_list, "--sqlite", str(path_sqlite)]
+    assert main(listArgs + ["--batch-size", "1000"]) == 0
+
+    connection = sqlite3.connect(str(path_sqlite))
+    try:
+        for strTable, path_csv in (
+            ("obs_hrly", dictPaths["path_obs_hrly"]),
+            ("obs_hrly_derived", getUpdatedPath(dictPaths["path_derived_hrly"])),
+            ("obs_dyly", dictPaths["path_obs_dyly"]),
+            ("obs_dyly_derived", getUpdatedPath(dictPaths["path_derived_dyly"])),
+        ):
+            with open(path_csv, "r", newline="") as csvfile:
+                intRows = sum(1 for _ in csvfile) - 1
+            assert connection.execute(
+                f"SELECT COUNT(*) FROM `{strTable}`"
+            ).fetchone() == (intRows,)
+
+        assert connection.execute(
+            "SELECT COUNT(*) FROM obs_hrly WHERE obs_needs_review IS NULL"
+        ).fetchone() == (1,)
+        assert connection.execute(
+            "SELECT obs_hrly_temp_air FROM obs_hrly WHERE obs_datetime = ?",
+            (listRows[2][listRows[0].index("obs_datetime")],),
+        ).fetchall() == [("NA",)]
+    finally:
+        connection.close()
+
+    # loading the same rows again only goes through with --on-duplicate
+    assert main(listArgs + ["--on-duplicate", "ignore"]) == 0
+
+
+class RecordingCursor:
+    # a sqlite3 cursor that keeps the number of parameters of each statement
+    def __init__(self, cursor, listParams):
+        self.cursor = cursor
+        self.listParams = listParams
+
+    def execute(self, strSql, listValues=()):
+        self.listParams.append(len(listValues))
+        return self.cursor.execute(strSql, listValues)
+
+
+class RecordingConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.listParams = []
+
+    def cursor(self):
+        return RecordingCursor(self.connection.cursor(), self.listParams)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+
+def test_loadMultiRow(tmp_path):
+    # the MariaDB/MySQL multi-row INSERTs, run on SQLite, with a parameter
+    # limit any SQLite takes, and a blank line and a short row in the CSV
+    path_legacy = tmp_path / "legacy"
+    generateStations(str(path_legacy), 1, 1987, 1987)
+    path_obs_hrly = getStationPaths(str(path_legacy), "Synthetic 1")["path_obs_hrly"]
+    with open(path_obs_hrly, "r", newline="") as csvfile:
+        listRows = list(csv.reader(csvfile))
+    listRows[3] = listRows[3][:-1]
+    listRows.insert(5, [])
+    with open(path_obs_hrly, "w", newline="") as csvfile:
+        csv.writer(csvfile).writerows(listRows)
+
+    connection = sqlite3.connect(str(tmp_path / "azmet.sqlite"))
+    SqliteDialect().createTable(
+        connection.cursor(), "obs_hrly", readCreateTable(SCHEMA_FILE, "obs_hrly")
+    )
+    dialect = MysqlDialect("qmark")
+    dialect.intMaxParams = 999
+    recording = RecordingConnection(connection)
+    try:
+        intRows = loadCsv(recording, dialect, "obs_hrly", path_obs_hrly)
+        assert intRows == len(listRows) - 2
+        assert connection.execute("SELECT COUNT(*) FROM obs_hrly").fetchone() == (
+            intRows,
+        )
+        # 999 // 29 columns = 34 rows a statement
+        assert max(recording.listParams) == 34 * (len(listRows[0]))
+        assert len(recording.listParams) == -(-intRows // 34)
+        assert connection.execute(
+            "SELECT obs_hrly_bat_volt FROM obs_hrly WHERE obs_datetime = ?",
+            (listRows[3][listRows[0].index("obs_datetime")],),
+        ).fetchall() == [("",)]
+    finally:
+        connection.close()
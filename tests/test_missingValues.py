@@ -0,0 +1,158 @@
+# Tests of MissingValues in csvParseAndProcess.py: every sentinel parses to NaN
+# in each of the parse functions, and the per-field counts are those of the
+# values actually parsed.
+#
+# python -m pytest tests
+
+import math
+
+import pytest
+
+from csvParseAndProcess import MISSING_SENTINELS, MissingValues, np
+
+needsNumpy = pytest.mark.skipif(np is None, reason="needs numpy")
+
+
+@pytest.mark.parametrize("strSentinel", MISSING_SENTINELS)
+def test_parse_sentinels(strSentinel):
+    missing = MissingValues()
+    assert missing.isMissing(strSentinel)
+    assert math.isnan(missing.parse(strSentinel, "obs_hrly_temp_air"))
+    assert missing.parse("-9999.5", "obs_hrly_temp_air") == -9999.5
+    assert missing.getCounts() == {"obs_hrly_temp_air": {"parsed": 2, "missing": 1}}
+
+
+def test_parse():
+    missing = MissingValues()
+    assert missing.parse("25.3", "obs_hrly_temp_air") == 25.3
+    assert math.copysign(1, missing.parse("-0.0", "obs_hrly_temp_air")) == -1
+    # a "nan" in the file is NaN but not one of the sentinels
+    assert not missing.isMissing("nan")
+    assert math.isnan(missing.parse("nan", "obs_hrly_temp_air"))
+    with pytest.raises(ValueError):
+        missing.parse("n/a", "obs_hrly_temp_air")
+    assert missing.getCounts() == {"obs_hrly_temp_air": {"parsed": 4, "missing": 0}}
+
+
+def test_custom_sentinels():
+    missing = MissingValues(["-99", "M"])
+    assert math.isnan(missing.parse("-99", "obs_hrly_vpd"))
+    assert math.isnan(missing.parse("M", "obs_hrly_vpd"))
+    # the default sentinels are just numbers now, or not numbers at all
+    assert missing.parse("-9999", "obs_hrly_vpd") == -9999.0
+    with pytest.raises(ValueError):
+        missing.parse("NA", "obs_hrly_vpd")
+    assert missing.getCounts() == {"obs_hrly_vpd": {"parsed": 4, "missing": 2}}
+
+
+def test_parseRow():
+    missing = MissingValues()
+    listFields = ["obs_hrly_temp_air", "obs_hrly_vpd"]
+    assert missing.parseRow(
+        {"obs_hrly_temp_air": "1.5", "obs_hrly_vpd": "2"}, listFields
+    ) == [1.5, 2.0]
+    listValues = missing.parseRow(["x", "NA", "-7999"], listFields, [1, 2])
+    assert all(math.isnan(fltValue) for fltValue in listValues)
+    # and single values of the same fields add to the same counts
+    missing.parse("", "obs_hrly_vpd")
+    assert missing.getCounts() == {
+        "obs_hrly_temp_air": {"parsed": 2, "missing": 1},
+        "obs_hrly_vpd": {"parsed": 3, "missing": 2},
+    }
+
+
+def assertParsed(tplParsed, listExpected):
+    # (float array, missing mask) against floats, with NaN for missing
+    aryFltValues, aryMissing = tplParsed
+    assert aryFltValues.dtype == np.float64
+    assert aryMissing.tolist() == [math.isnan(fltValue) for fltValue in listExpected]
+    assert [
+        None if math.isnan(fltValue) else fltValue for fltValue in aryFltValues.tolist()
+    ] == [None if math.isnan(fltValue) else fltValue for fltValue in listExpected]
+
+
+@needsNumpy
+def test_parseArray():
+    missing = MissingValues()
+    listStrValues = list(MISSING_SENTINELS) + ["25.3", "-0.0", "nan"]
+    listExpected = [math.nan] * len(MISSING_SENTINELS) + [25.3, -0.0, math.nan]
+    assertParsed(missing.parseArray(listStrValues, "obs_hrly_temp_air"), listExpected)
+    assertParsed(
+        missing.parseBytes(
+            np.array([strValue.encode() for strValue in listStrValues]),
+            "obs_hrly_vpd",
+        ),
+        listExpected,
+    )
+    # the "nan" is missing in the mask, but not counted as a sentinel
+    assert missing.getCounts() == {
+        "obs_hrly_temp_air": {"parsed": 9, "missing": 6},
+        "obs_hrly_vpd": {"parsed": 9, "missing": 6},
+    }
+
+    with pytest.raises(ValueError):
+        missing.parseBytes(np.array([b"1.0", b"n/a"]), "obs_hrly_vpd")
+
+
+@needsNumpy
+def test_parseArray_counted():
+    # only the values where aryCounted is true are counted, but all are parsed
+    missing = MissingValues()
+    aryCounted = np.array([True, False, True, False])
+    assertParsed(
+        missing.parseArray(["NA", "NA", "1", "2"], "obs_hrly_temp_air", aryCounted),
+        [math.nan, math.nan, 1.0, 2.0],
+    )
+    assertParsed(
+        missing.parseBytes(
+            np.array([b"NA", b"NA", b"1", b"2"]), "obs_hrly_vpd", aryCounted
+        ),
+        [math.nan, math.nan, 1.0, 2.0],
+    )
+    assertParsed(
+        missing.parseNumbers(
+            [math.nan, math.nan, 1.0, 2.0], "obs_hrly_sol_rad_total", aryCounted
+        ),
+        [math.nan, math.nan, 1.0, 2.0],
+    )
+    assert missing.getCounts() == {
+        strField: {"parsed": 2, "missing": 1}
+        for strField in ("obs_hrly_temp_air", "obs_hrly_vpd", "obs_hrly_sol_rad_total")
+    }
+
+
+@needsNumpy
+def test_parseNumbers():
+    # NaN (R's NA) and any value equal to a numeric sentinel are missing
+    missing = MissingValues()
+    assertParsed(
+        missing.parseNumbers(
+            [-7999.0, -6999.0, -9999.0, math.nan, 25.3, -9999.5, 0.0],
+            "obs_hrly_temp_air",
+        ),
+        [math.nan, math.nan, math.nan, math.nan, 25.3, -9999.5, 0.0],
+    )
+    assert missing.getCounts() == {"obs_hrly_temp_air": {"parsed": 7, "missing": 4}}
+
+    # custom sentinels, one of them not a number
+    missing = MissingValues(["-99", "M"])
+    assertParsed(
+        missing.parseNumbers(np.array([-99, -9999, 3]), "obs_hrly_vpd"),
+        [math.nan, -9999.0, 3.0],
+    )
+    assert missing.getCounts() == {"obs_hrly_vpd": {"parsed": 3, "missing": 1}}
+
+
+def test_addCounts():
+    missing = MissingValues()
+    missing.parse("NA", "obs_hrly_temp_air")
+    missing.parseRow(["1", "-9999"], ["obs_hrly_temp_air", "obs_hrly_vpd"], [0, 1])
+
+    missingTotal = MissingValues()
+    missingTotal.parse("2", "obs_hrly_temp_air")
+    missingTotal.addCounts(missing.getCounts())
+    missingTotal.addCounts(missing.getCounts())
+    assert missingTotal.getCounts() == {
+        "obs_hrly_temp_air": {"parsed": 5, "missing": 2},
+        "obs_hrly_vpd": {"parsed": 2, "missing": 2},
+    }
@@ -0,0 +1,119 @@
+# Tests that the range totals of queryDerived.py match totalling the rows of
+# the daily derived file directly.
+#
+# python -m pytest tests
+
+import csv
+import datetime
+import decimal
+import random
+
+from queryDerived import INDEX_COLUMNS, DerivedIndex, buildIndex
+
+
+def writeDerived(path, listRows):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["station_id", "obs_year", "obs_doy"] + list(INDEX_COLUMNS))
+        writer.writerows(listRows)
+
+
+def getRows(intSeed=0):
+    # two years of days, shuffled, with missing values and a duplicated day
+    rand = random.Random(intSeed)
+    listRows = []
+    date = datetime.date(1987, 1, 1)
+    while date.year < 1989:
+        listRows.append(
+            ["az01", str(date.year), f"{date.timetuple().tm_yday:03d}"]
+            + [
+                (
+                    rand.choice(["-9999", "NA", ""])
+                    if rand.random() < 0.05
+                    else str(
+                        rand.randint(0, 24)
+                        if intPlaces == 0
+                        else rand.randint(0, 300) / 10
+                    )
+                )
+                for intPlaces in INDEX_COLUMNS.values()
+            ]
+        )
+        date += datetime.timedelta(days=1)
+    listRows.append(list(listRows[40]))
+    rand.shuffle(listRows)
+
+    return listRows
+
+
+def sumRows(listRows, strColumn, dateStart, dateEnd):
+    # (days, missing, sum) the slow way
+    intColumn = 3 + list(INDEX_COLUMNS).index(strColumn)
+    intDays = intMissing = 0
+    decSum = decimal.Decimal(0).scaleb(-INDEX_COLUMNS[strColumn])
+    for row in listRows:
+        date = datetime.date(int(row[1]), 1, 1) + datetime.timedelta(int(row[2]) - 1)
+        if dateStart <= date <= dateEnd:
+            intDays += 1
+            if row[intColumn] in ("-9999", "NA", ""):
+                intMissing += 1
+            else:
+                decSum += decimal.Decimal(row[intColumn])
+
+    return intDays, intMissing, str(decSum)
+
+
+def test_sumRange(tmp_path):
+    listRows = getRows()
+    writeDerived(tmp_path / "obs_dyly_derived-tucson_updated.csv", listRows)
+    buildIndex(str(tmp_path), ["Tucson"])
+    index = DerivedIndex(str(tmp_path / "derived_index"))
+
+    rand = random.Random(1)
+    for _ in range(200):
+        strColumn = rand.choice(list(INDEX_COLUMNS))
+        dateStart = datetime.date(1986, 12, 1) + datetime.timedelta(
+            rand.randint(0, 800)
+        )
+        dateEnd = dateStart + datetime.timedelta(rand.randint(-5, 400))
+        dictResult = index.sumRange("Tucson", strColumn, dateStart, dateEnd)
+        assert (
+            dictResult["days"],
+            dictResult["missing"],
+            dictResult["sum"],
+        ) == sumRows(listRows, strColumn, dateStart, dateEnd)
+
+
+def test_querySeasons_rebuild(tmp_path):
+    path_derived = tmp_path / "obs_dyly_derived-tucson_updated.csv"
+    listRows = getRows()
+    writeDerived(path_derived, listRows)
+    buildIndex(str(tmp_path), ["Tucson", "Yuma Valley"])
+
+    # a changed file is indexed again, a station without one is left out
+    listRows = getRows(intSeed=2)
+    writeDerived(path_derived, listRows)
+    listStatuses = []
+    buildIndex(
+        str(tmp_path),
+        ["Tucson", "Yuma Valley"],
+        fnReport=lambda strStation, strStatus: listStatuses.append(strStatus),
+    )
+    assert listStatuses == ["indexed", "missing"]
+
+    index = DerivedIndex(str(tmp_path / "derived_index"))
+    assert index.getStations() == ["Tucson"]
+    listResults = index.querySeasons("chill_hours_7C", 1987, 1988, 11, 2)
+    assert [(dictResult["start"], dictResult["end"]) for dictResult in listResults] == [
+        ("1987-11-01", "1988-02-29"),
+        ("1988-11-01", "1989-02-28"),
+    ]
+    assert (
+        listResults[0]["sum"]
+        == sumRows(
+            listRows,
+            "obs_dyly_derived_chill_hours_7C",
+            datetime.date(1987, 11, 1),
+            datetime.date(1988, 2, 29),
+        )[2]
+    )
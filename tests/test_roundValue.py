@@ -0,0 +1,161 @@
+# Property tests for the rounding kernel in csvParseAndProcess.py: roundValue()
+# and roundValues() must give exactly what the original per-value
+# Decimal.quantize(ROUND_HALF_UP) did, for every exponent the legacy code uses,
+# and so must the scaled integers of roundFloatToScaled() and DailyAggregate.
+#
+# python -m pytest tests
+
+import decimal
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from csvParseAndProcess import (
+    DailyAggregate,
+    np,
+    roundFloatToScaled,
+    roundValue,
+    roundValues,
+)
+
+EXPONENTS = ["000.0", "1.00", "000.0000000", "1"]
+RETURN_TYPES = ["dec", "flt", "int", "str"]
+
+
+def roundValueDecimal(valueToRound=0, strExp="1", strReturnType="dec"):
+    # roundValue() as it was before the rounding kernel
+    decReturnValue = decimal.Decimal(valueToRound).quantize(
+        decimal.Decimal(strExp), rounding=decimal.ROUND_HALF_UP
+    )
+
+    if strReturnType == "flt":
+        returnValue = float(decReturnValue)
+    elif strReturnType == "int":
+        returnValue = int(decReturnValue)
+    elif strReturnType == "str":
+        returnValue = format(decReturnValue, "f")
+    else:
+        returnValue = decReturnValue
+
+    return returnValue
+
+
+def assertSameResult(returnValue, expectedValue):
+    # same type, and the same sign and digits (so -0.0 != 0.0 and
+    # Decimal("1.0") != Decimal("1.00"))
+    assert type(returnValue) is type(expectedValue)
+    assert repr(returnValue) == repr(expectedValue)
+
+
+# values the legacy data actually sees, plus floats of every magnitude
+floats = st.one_of(
+    st.floats(min_value=-200.0, max_value=200.0),
+    st.floats(allow_nan=False, allow_infinity=False, min_value=-1e16, max_value=1e16),
+)
+
+# values on or right next to a rounding tie, e.g. 0.05, 2.675 or 12.5
+ties = st.builds(
+    lambda intScaled, intPlaces, intUlps: float(
+        decimal.Decimal(intScaled * 10 + 5).scaleb(-intPlaces - 1)
+    )
+    + intUlps * 1e-17 * abs(intScaled),
+    st.integers(min_value=-(10**9), max_value=10**9),
+    st.integers(min_value=0, max_value=7),
+    st.integers(min_value=-2, max_value=2),
+)
+
+
+@pytest.mark.parametrize("strReturnType", RETURN_TYPES)
+@pytest.mark.parametrize("strExp", EXPONENTS)
+@settings(max_examples=500)
+@given(fltValue=st.one_of(floats, ties))
+def test_float(strExp, strReturnType, fltValue):
+    assertSameResult(
+        roundValue(fltValue, strExp, strReturnType),
+        roundValueDecimal(fltValue, strExp, strReturnType),
+    )
+
+
+@pytest.mark.parametrize("strReturnType", RETURN_TYPES)
+@pytest.mark.parametrize("strExp", EXPONENTS)
+@given(
+    decValue=st.decimals(min_value=-10000, max_value=10000, places=9, allow_nan=False)
+)
+def test_decimal(strExp, strReturnType, decValue):
+    assertSameResult(
+        roundValue(decValue, strExp, strReturnType),
+        roundValueDecimal(decValue, strExp, strReturnType),
+    )
+
+
+@pytest.mark.parametrize("strReturnType", ["dec", "flt", "str"])
+@pytest.mark.parametrize("strExp", EXPONENTS)
+@pytest.mark.parametrize(
+    "value", ["-9999.0", "12.75", -9999.0, 0.0, -0.0, -0.04, 7, float("nan")]
+)
+def test_legacy_values(strExp, strReturnType, value):
+    assertSameResult(
+        roundValue(value, strExp, strReturnType),
+        roundValueDecimal(value, strExp, strReturnType),
+    )
+
+
+@pytest.mark.skipif(np is None, reason="needs numpy")
+@pytest.mark.parametrize("strReturnType", RETURN_TYPES)
+@pytest.mark.parametrize("strExp", EXPONENTS)
+@given(
+    listValues=st.lists(
+        st.one_of(floats, ties, st.sampled_from([float("nan"), -0.0, 1e300])),
+        max_size=50,
+    )
+)
+def test_column(strExp, strReturnType, listValues):
+    listExpected = []
+    for fltValue in listValues:
+        try:
+            listExpected.append(roundValueDecimal(fltValue, strExp, strReturnType))
+        except (ValueError, decimal.InvalidOperation):
+            return  # int(NaN) and quantizing 1e300 fail in both
+
+    listRounded = roundValues(
+        np.array(listValues, dtype=np.float64), strExp, strReturnType
+    )
+    assert len(listRounded) == len(listExpected)
+    for returnValue, expectedValue in zip(listRounded, listExpected):
+        assertSameResult(returnValue, expectedValue)
+
+
+@given(fltValue=st.one_of(floats, ties, st.just(-0.0)))
+def test_scaled(fltValue):
+    intScaled, blnNegative = roundFloatToScaled(fltValue, 7)
+    decExpected = roundValueDecimal(fltValue, "000.0000000")
+    assert intScaled == int(decExpected.scaleb(7))
+    assert blnNegative == decExpected.is_signed()
+
+
+@given(
+    listValues=st.lists(
+        st.one_of(st.none(), st.integers(-(10**11), 10**11)), max_size=30
+    )
+)
+def test_daily_aggregate(listValues):
+    # the mean of 7 place values to "000.0", as an exact Decimal division
+    aggregate = DailyAggregate(7)
+    for intValue in listValues:
+        aggregate.add(intValue)
+
+    listPresent = [intValue for intValue in listValues if intValue is not None]
+    assert aggregate.intMissing == len(listValues) - len(listPresent)
+    if not listPresent:
+        assert aggregate.getMean("000.0") is None
+        return
+
+    with decimal.localcontext(prec=100):
+        decMean = (decimal.Decimal(sum(listPresent)) / len(listPresent)).scaleb(-7)
+    assert aggregate.getMean("000.0") == str(roundValueDecimal(decMean, "000.0"))
+    for strValue, intExpected in (
+        (aggregate.getMin(), min(listPresent)),
+        (aggregate.getMax(), max(listPresent)),
+        (aggregate.getSum(), sum(listPresent)),
+    ):
+        assert strValue == format(decimal.Decimal(intExpected).scaleb(-7), "f")
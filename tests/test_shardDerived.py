@@ -0,0 +1,60 @@
+# Tests that updateDerivedSharded() writes the same _updated files and counts as
+# updateDerived(), with the 24:00 row of 31 December out of place.
+#
+# python -m pytest tests
+
+import csv
+import json
+import shutil
+
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import JoinReport, MissingValues, updateDerived
+from generateSyntheticData import generateStation
+from shardDerived import updateDerivedSharded
+
+
+def test_updateDerivedSharded(tmp_path):
+    path_legacy = tmp_path / "legacy"
+    path_legacy.mkdir()
+    generateStation(str(path_legacy), "Synthetic 1", intEndYear=1988)
+    dictPaths = getStationPaths(str(path_legacy), "Synthetic 1")
+    # the last hour of 1987 moved to the end of its file, and a row without
+    # a valid key first
+    with open(dictPaths["path_derived_hrly"], "r", newline="") as csvfile:
+        listRows = list(csv.reader(csvfile))
+    intMidnight = next(
+        intRow
+        for intRow, row in enumerate(listRows)
+        if row[1:4] == ["1987", "365", "2400"]
+    )
+    listRows.append(listRows.pop(intMidnight))
+    listRows[1][2] = "NA"
+    with open(dictPaths["path_derived_hrly"], "w", newline="") as csvfile:
+        csv.writer(csvfile).writerows(listRows)
+
+    dictResults = {}
+    for strRun, fnUpdate, dictOptions in (
+        ("whole", updateDerived, {}),
+        ("sharded", updateDerivedSharded, {"processes": 2}),
+    ):
+        path_run = tmp_path / strRun
+        shutil.copytree(path_legacy, path_run)
+        missing = MissingValues()
+        joins = JoinReport()
+        listOutputs = fnUpdate(
+            **getStationPaths(str(path_run), "Synthetic 1"),
+            **dictOptions,
+            missing=missing,
+            joins=joins,
+        )
+        dictResults[strRun] = (
+            [open(path, "rb").read() for path in listOutputs],
+            json.dumps(missing.getCounts(), sort_keys=True),
+            json.dumps(joins.getCounts(), sort_keys=True),
+        )
+
+    assert dictResults["sharded"] == dictResults["whole"]
+    assert b"\r\naz01,1987,365,2400," in dictResults["sharded"][0][0]
+    assert sorted(p.name for p in (tmp_path / "sharded").iterdir()) == sorted(
+        p.name for p in (tmp_path / "whole").iterdir()
+    )
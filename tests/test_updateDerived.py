@@ -0,0 +1,515 @@
+# Tests that the backends of updateDerived() agree with each other, on a
+# synthetic station with the kinds of rows the legacy files have: invalid keys,
+# missing values and days with no hourly obs; and that the daily columns are
+# what the day's hours and daily obs give.
+#
+# python -m pytest tests
+
+import csv
+import decimal
+import io
+import json
+import shutil
+
+import pytest
+
+import csvParseAndProcess
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import (
+    HEAT_UNIT_THRESHOLDS,
+    MISSING_DERIVED,
+    MISSING_SENTINELS,
+    PROFILED_FUNCTIONS,
+    DailyAggregate,
+    DailyDerived,
+    DuplicateReport,
+    HourlyDerived,
+    JoinReport,
+    MissingValues,
+    ProfileReport,
+    calculateHeatStressCotton,
+    calculateHeatUnits,
+    getDuplicatesPath,
+    getUpdatedPath,
+    iterHourlyFused,
+    roundValue,
+    updateDerived,
+)
+from generateSyntheticData import generateStation
+
+
+def readRows(path):
+    with open(path, "r", newline="") as csvfile:
+        return list(csv.reader(csvfile))
+
+
+def writeRows(path, listRows):
+    with open(path, "w", newline="") as csvfile:
+        csv.writer(csvfile).writerows(listRows)
+
+
+def setCell(listRows, intRow, strColumn, strValue):
+    listRows[intRow][listRows[0].index(strColumn)] = strValue
+
+
+@pytest.fixture
+def station(tmp_path):
+    # getStationPaths() of a year of a synthetic station, with an NA obs_hour,
+    # NA daily temperatures, a daily row with an NA obs_doy and no hourly obs
+    # for 10 January
+    generateStation(str(tmp_path), "Synthetic 1")
+    dictPaths = getStationPaths(str(tmp_path), "Synthetic 1")
+
+    listRows = readRows(dictPaths["path_obs_hrly"])
+    setCell(listRows, 5, "obs_hour", "NA")
+    intDoy = listRows[0].index("obs_doy")
+    writeRows(
+        dictPaths["path_obs_hrly"], [row for row in listRows if row[intDoy] != "010"]
+    )
+    listRows = readRows(dictPaths["path_obs_dyly"])
+    setCell(listRows, 3, "obs_dyly_temp_air_max", "NA")
+    setCell(listRows, 4, "obs_dyly_temp_air_min", "-9999")
+    setCell(listRows, 10, "obs_dyly_temp_air_max", "NA")
+    setCell(listRows, 20, "obs_doy", "NA")
+    writeRows(dictPaths["path_obs_dyly"], listRows)
+
+    return dictPaths
+
+
+def runBackend(dictPaths, **kwargs):
+    # (bytes of each output, missing value counts)
+    missing = MissingValues()
+    listOutputs = updateDerived(**dictPaths, **kwargs, missing=missing)
+
+    return (
+        [open(path, "rb").read() for path in listOutputs],
+        json.dumps(missing.getCounts(), sort_keys=True),
+    )
+
+
+def test_streaming(tmp_path):
+    # over a change of year, with the daily derived file running a day past
+    # the obs
+    generateStation(str(tmp_path), "Synthetic 1", intEndYear=1988)
+    dictPaths = getStationPaths(str(tmp_path), "Synthetic 1")
+    listRows = readRows(dictPaths["path_derived_dyly"])
+    listRows.append(list(listRows[-1]))
+    setCell(listRows, -1, "obs_year", "1989")
+    setCell(listRows, -1, "obs_doy", "001")
+    writeRows(dictPaths["path_derived_dyly"], listRows)
+
+    dictResults = {}
+    for blnStreaming in (False, True):
+        joins = JoinReport()
+        dictResults[blnStreaming] = (
+            runBackend(dictPaths, streaming=blnStreaming, joins=joins),
+            joins.getCounts(),
+        )
+    assert dictResults[True] == dictResults[False]
+    assert b"\r\naz01,1987,365,2400," in dictResults[True][0][0][0]
+    assert dictResults[True][1] == {
+        "obs_dyly_derived without obs_hrly": {"unmatched": 1, "examples": ["1989.001"]}
+    }
+
+
+def test_iterHourlyFused(station):
+    # the hourly derived rows as updateDerived() writes them, and each day's
+    # chill hours, one day at a time
+    listHeader, *listRows = readRows(station["path_obs_hrly"])
+    dictChillHours = {}
+    for dictRow in (dict(zip(listHeader, row)) for row in listRows):
+        if dictRow["obs_hour"] == "NA":
+            continue
+        intDayKey = int(dictRow["obs_year"]) * 10**7 + int(dictRow["obs_doy"]) * 10**4
+        strTempAir = dictRow["obs_hrly_temp_air"]
+        dictChillHours[intDayKey] = dictChillHours.get(intDayKey, 0) + (
+            strTempAir not in MISSING_SENTINELS and float(strTempAir) < 0
+        )
+
+    fileOut = io.StringIO(newline="")
+    with open(station["path_obs_hrly"], "r", newline="") as fileObs, open(
+        station["path_derived_hrly"], "r", newline=""
+    ) as fileDerived:
+        listDays = [
+            (intDayKey, dailyDerived.intChillHours0C)
+            for intDayKey, dailyDerived in iterHourlyFused(
+                fileObs, fileDerived, fileOut
+            )
+        ]
+    assert listDays == list(dictChillHours.items())
+    listOutputs = updateDerived(**station)
+    with open(listOutputs[0], "r", newline="") as csvfile:
+        assert fileOut.getvalue() == csvfile.read()
+
+
+def test_incremental(tmp_path, station):
+    # a full rebuild in a copy of the station, to compare each run with
+    path_full = tmp_path / "full"
+    shutil.copytree(tmp_path, path_full, ignore=shutil.ignore_patterns("full"))
+    dictFullPaths = getStationPaths(str(path_full), "Synthetic 1")
+
+    # a rerun recalculates nothing, so only the outputs are compared
+    listFirst = runBackend(station, incremental=True)[0]
+    assert listFirst == runBackend(dictFullPaths)[0]
+    assert runBackend(station, incremental=True)[0] == listFirst
+
+    # one hour of 11 April below freezing
+    for dictPaths in (station, dictFullPaths):
+        listRows = readRows(dictPaths["path_obs_hrly"])
+        intRow = next(
+            intRow
+            for intRow, row in enumerate(listRows)
+            if row[3:6] == ["1987", "101", "0500"]
+        )
+        setCell(listRows, intRow, "obs_hrly_temp_air", "-3.0")
+        writeRows(dictPaths["path_obs_hrly"], listRows)
+    listChanged = runBackend(station, incremental=True)[0]
+    assert listChanged == runBackend(dictFullPaths)[0]
+    assert listChanged != listFirst
+
+    # days that didn't change are copied from the last output, not recalculated
+    path_updated = getUpdatedPath(station["path_derived_dyly"])
+    listRows = readRows(path_updated)
+    setCell(listRows, 1, "obs_dyly_derived_chill_hours_0C", "copied")
+    writeRows(path_updated, listRows)
+    runBackend(station, incremental=True)
+    assert readRows(path_updated) == listRows
+
+
+def test_blankLines(tmp_path, station):
+    pytest.importorskip("numpy")
+    # a blank line and a row without its last column in each input, read as
+    # csv.DictReader reads them: the line skipped and the column ""
+    path_padded = tmp_path / "padded"
+    shutil.copytree(tmp_path, path_padded, ignore=shutil.ignore_patterns("padded"))
+    dictPadded = getStationPaths(str(path_padded), "Synthetic 1")
+    for strPath in station:
+        listRows = readRows(station[strPath])
+        setCell(listRows, 7, listRows[0][-1], "")
+        writeRows(dictPadded[strPath], listRows)
+        listRows[7] = listRows[7][:-1]
+        listRows.insert(3, [])
+        writeRows(station[strPath], listRows)
+
+    tplExpected = runBackend(dictPadded)
+    for dictOptions in (
+        {},
+        {"streaming": True},
+        {"backend": "numpy"},
+        {"incremental": True},
+    ):
+        assert runBackend(station, **dictOptions)[0] == tplExpected[0]
+
+
+def test_joinReport(station):
+    pytest.importorskip("numpy")
+    # an hour of obs without its derived row
+    listRows = readRows(station["path_derived_hrly"])
+    writeRows(
+        station["path_derived_hrly"],
+        [row for row in listRows if row[1:4] != ["1987", "100", "1200"]],
+    )
+
+    # on top of the fixture's NA obs_hour (which leaves 1987.001.0500 without
+    # obs), NA obs_doy (1987.020) and 10 January without hourly obs
+    dictExpected = {
+        "obs_hrly rows with an invalid key": {"unmatched": 1, "examples": []},
+        "obs_hrly without obs_hrly_derived": {
+            "unmatched": 1,
+            "examples": ["1987.100.1200"],
+        },
+        "obs_hrly_derived without obs_hrly": {
+            "unmatched": 25,
+            "examples": ["1987.001.0500", "1987.010.0100", "1987.010.0200"],
+        },
+        "obs_dyly rows with an invalid key": {"unmatched": 1, "examples": []},
+        "obs_hrly without obs_dyly": {"unmatched": 1, "examples": ["1987.020"]},
+        "obs_dyly without obs_hrly": {"unmatched": 1, "examples": ["1987.010"]},
+        "obs_dyly_derived without obs_hrly": {
+            "unmatched": 1,
+            "examples": ["1987.010"],
+        },
+    }
+    for dictOptions in ({}, {"streaming": True}, {"backend": "numpy"}):
+        joins = JoinReport(intExamples=3)
+        updateDerived(**station, **dictOptions, joins=joins)
+        assert joins.getCounts() == dictExpected
+
+
+@pytest.mark.parametrize("strPolicy", ["first", "last", "drop", "complete"])
+def test_dedup(tmp_path, strPolicy):
+    # Two copies of the 24:00 hour of 31 December, the first with a missing
+    # relative humidity and the second warmer, in both hourly files. The
+    # _updated files are those of the station with just the copy the policy
+    # keeps, the same one in both files, or without that hour for "drop".
+    dictCopies = {}
+    for strRun in ("duplicated", "kept"):
+        (tmp_path / strRun).mkdir()
+        generateStation(str(tmp_path / strRun), "Synthetic 1")
+        dictCopies[strRun] = getStationPaths(str(tmp_path / strRun), "Synthetic 1")
+    for strPath, intKey in (("path_obs_hrly", 3), ("path_derived_hrly", 1)):
+        listRows = readRows(dictCopies["duplicated"][strPath])
+        intRow = next(
+            intRow
+            for intRow, row in enumerate(listRows)
+            if row[intKey : intKey + 3] == ["1987", "365", "2400"]
+        )
+        listRows.insert(intRow + 1, list(listRows[intRow]))
+        if strPath == "path_obs_hrly":
+            setCell(listRows, intRow, "obs_hrly_relative_humidity", "NA")
+            setCell(listRows, intRow + 1, "obs_hrly_temp_air", "25.0")
+        else:
+            setCell(listRows, intRow + 1, "obs_creation_reason", "second copy")
+        writeRows(dictCopies["duplicated"][strPath], listRows)
+
+        intKept = {"first": 0, "last": 1, "drop": None, "complete": 1}[strPolicy]
+        listCopies = listRows[intRow : intRow + 2]
+        listRows[intRow : intRow + 2] = [] if intKept is None else [listCopies[intKept]]
+        writeRows(dictCopies["kept"][strPath], listRows)
+
+    duplicates = DuplicateReport()
+    listOutputs = updateDerived(
+        **dictCopies["duplicated"], dedup=strPolicy, duplicates=duplicates
+    )
+    assert [open(path, "rb").read() for path in listOutputs] == [
+        open(path, "rb").read() for path in updateDerived(**dictCopies["kept"])
+    ]
+
+    dictCounts = {
+        "keys": 1,
+        "dropped": 1 if intKept is not None else 2,
+        "examples": ["1987.365.2400"],
+    }
+    assert duplicates.getCounts() == {
+        "obs_hrly": dictCounts,
+        "obs_hrly_derived": dictCounts,
+    }
+    listRows = readRows(getDuplicatesPath(dictCopies["duplicated"]["path_obs_hrly"]))
+    assert [row[:2] for row in listRows[1:]] == [
+        [
+            "kept" if intCopy == intKept else "dropped",
+            "obs_hrly_temp_air, obs_hrly_relative_humidity",
+        ]
+        for intCopy in range(2)
+    ]
+
+
+def test_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pads = pytest.importorskip("pyarrow.dataset")
+    path_legacy = tmp_path / "legacy"
+    path_legacy.mkdir()
+    generateStation(str(path_legacy), "Synthetic 1", intEndYear=1988)
+    dictPaths = getStationPaths(str(path_legacy), "Synthetic 1")
+    # an NA in an int column of each derived file
+    for strPath in ("path_derived_hrly", "path_derived_dyly"):
+        listRows = readRows(dictPaths[strPath])
+        setCell(listRows, 1, "obs_version", "NA")
+        writeRows(dictPaths[strPath], listRows)
+
+    path_parquet = tmp_path / "parquet"
+    # a second run replaces the files of the first
+    for _ in range(2):
+        listOutputs = updateDerived(**dictPaths, path_parquet=str(path_parquet))
+
+    for path_csv, strTable, strHeatStress in zip(
+        listOutputs,
+        ("obs_hrly_derived", "obs_dyly_derived"),
+        (
+            "obs_hrly_derived_heatstress_cottonC",
+            "obs_dyly_derived_heatstress_cotton_meanC",
+        ),
+    ):
+        path_table = path_parquet / strTable
+        assert sorted(
+            path.relative_to(path_table).as_posix()
+            for path in path_table.rglob("*.parquet")
+        ) == [
+            "station_id=az01/obs_year=1987/part-0.parquet",
+            "station_id=az01/obs_year=1988/part-0.parquet",
+        ]
+        table = pads.dataset(
+            str(path_table), format="parquet", partitioning="hive"
+        ).to_table()
+        listHeader, *listRows = readRows(path_csv)
+        assert table.num_rows == len(listRows)
+
+        # types from the schema (Parquet keeps datetimes to the millisecond)
+        assert pa.types.is_timestamp(table.schema.field("obs_datetime").type)
+        assert table.schema.field("obs_version").type == pa.uint32()
+        assert table.schema.field("obs_doy").type == pa.string()
+        assert table.column("obs_version").null_count == 1
+
+        # and string columns exactly as in the CSV, "-9999.0" and all
+        table = table.sort_by("obs_datetime")
+        for strColumn in ("obs_doy", strHeatStress):
+            assert table.column(strColumn).to_pylist() == [
+                row[listHeader.index(strColumn)] for row in listRows
+            ]
+
+
+def test_missingCounts(station):
+    pytest.importorskip("numpy")
+    tplExpected = runBackend(station)
+    dictCounts = json.loads(tplExpected[1])
+    # the NA obs_hour row and the 24 hours of 10 January aren't parsed, and
+    # neither are the daily rows of 10 January and of the NA obs_doy
+    assert dictCounts["obs_hrly_temp_air"]["parsed"] == 365 * 24 - 25
+    assert dictCounts["obs_dyly_temp_air_max"]["parsed"] == 363
+    assert sorted(dictCounts) == [
+        "obs_dyly_temp_air_max",
+        "obs_dyly_temp_air_min",
+        "obs_hrly_relative_humidity",
+        "obs_hrly_sol_rad_total",
+        "obs_hrly_temp_air",
+        "obs_hrly_vpd",
+    ]
+
+    for dictOptions in ({"streaming": True}, {"backend": "numpy"}):
+        assert runBackend(station, **dictOptions) == tplExpected
+
+
+@pytest.mark.parametrize(
+    "dictOptions",
+    [{}, {"streaming": True}, {"backend": "numpy"}, {"incremental": True}],
+)
+def test_profile(tmp_path, dictOptions):
+    if dictOptions.get("backend") == "numpy":
+        pytest.importorskip("numpy")
+    generateStation(str(tmp_path), "Synthetic 1")
+    dictPaths = getStationPaths(str(tmp_path), "Synthetic 1")
+    dictFunctions = {
+        strFunction: getattr(csvParseAndProcess, strFunction)
+        for strFunction in PROFILED_FUNCTIONS
+    }
+
+    profile = ProfileReport()
+    updateDerived(**dictPaths, **dictOptions, profile=profile)
+    dictReport = profile.getReport()
+    assert dictReport["seconds"] > 0
+    assert all(dictStage["calls"] >= 1 for dictStage in dictReport["stages"].values())
+    # every hour and day is read once, by whichever stage reads its file
+    for strFile, intRows in (
+        ("obs_hrly", 365 * 24),
+        ("obs_hrly_derived", 365 * 24),
+        ("obs_dyly", 365),
+        ("obs_dyly_derived", 365),
+    ):
+        assert intRows in [
+            dictReport["stages"][strStage]["rows"]
+            for strStage in (strFile, f"read {strFile}", f"read {strFile[4:]}")
+            if strStage in dictReport["stages"]
+        ]
+    assert any(
+        strFunction.startswith("calculateHeatStressCotton") and dictCounts["calls"]
+        for strFunction, dictCounts in dictReport["functions"].items()
+    )
+
+    # the counting wrappers are swapped back out, also after an error
+    for strFunction, fn in dictFunctions.items():
+        assert getattr(csvParseAndProcess, strFunction) is fn
+    with pytest.raises(FileNotFoundError):
+        updateDerived(
+            **dict(dictPaths, path_obs_dyly=str(tmp_path / "missing.csv")),
+            **dictOptions,
+            profile=profile,
+        )
+    for strFunction, fn in dictFunctions.items():
+        assert getattr(csvParseAndProcess, strFunction) is fn
+
+
+def test_missingHours(station):
+    # Each day's columns worked out directly from its hours: a day without
+    # its afternoon, a day whose hours are all missing and scattered missing
+    # hours, on top of the fixture's. Heat stress means leave missing hours
+    # out, as do chill hours.
+    listRows = readRows(station["path_obs_hrly"])
+    listHeader = listRows[0]
+    intDoy = listHeader.index("obs_doy")
+    intHour = listHeader.index("obs_hour")
+    listRows = [
+        row
+        for row in listRows
+        if not (row[intDoy] == "032" and "1200" <= row[intHour] <= "1800")
+    ]
+    for intRow, row in enumerate(listRows[1:], 1):
+        if row[intDoy] == "033" or intRow % 11 == 0:
+            setCell(listRows, intRow, "obs_hrly_temp_air", "-9999.0")
+        elif intRow % 13 == 0:
+            setCell(listRows, intRow, "obs_hrly_vpd", "NA")
+    writeRows(station["path_obs_hrly"], listRows)
+
+    dictDays = {}
+    for row in listRows[1:]:
+        dictRow = dict(zip(listHeader, row))
+        if dictRow["obs_hour"] == "NA":
+            continue
+        dictDay = dictDays.setdefault(
+            dictRow["obs_year"] + "." + dictRow["obs_doy"],
+            {"C": [], "F": [], "0C": 0, "7C": 0, "20C": 0},
+        )
+        dictHeatStress = calculateHeatStressCotton(
+            dictRow["obs_hrly_temp_air"],
+            dictRow["obs_hrly_relative_humidity"],
+            dictRow["obs_hrly_vpd"],
+            dictRow["obs_hrly_sol_rad_total"],
+        )
+        if dictHeatStress["heatStressCottonC"] != "-9999.0":
+            dictDay["C"].append(dictHeatStress["heatStressCottonC"])
+            dictDay["F"].append(dictHeatStress["heatStressCottonF"])
+        if dictRow["obs_hrly_temp_air"] not in MISSING_SENTINELS:
+            fltTempAir = float(dictRow["obs_hrly_temp_air"])
+            dictDay["0C"] += fltTempAir < 0
+            dictDay["7C"] += fltTempAir < 7.22222
+            dictDay["20C"] += fltTempAir > 20
+    listDaily = readRows(station["path_obs_dyly"])
+    dictDaily = {
+        row[2] + "." + row[3]: dict(zip(listDaily[0], row)) for row in listDaily[1:]
+    }
+
+    def getMean(listDecimals):
+        if not listDecimals:
+            return MISSING_DERIVED
+        return format(
+            roundValue(
+                sum(listDecimals, decimal.Decimal(0)) / len(listDecimals), "000.0"
+            ),
+            "f",
+        )
+
+    listHeader, *listRows = readRows(updateDerived(**station)[1])
+    listChecked = []
+    for row in listRows:
+        dictRow = dict(zip(listHeader, row))
+        strDay = dictRow["obs_year"] + "." + dictRow["obs_doy"]
+        if strDay not in dictDays:
+            continue
+        dictDay = dictDays[strDay]
+        assert dictRow["obs_dyly_derived_heatstress_cotton_meanC"] == getMean(
+            dictDay["C"]
+        )
+        assert dictRow["obs_dyly_derived_heatstress_cotton_meanF"] == getMean(
+            dictDay["F"]
+        )
+        for strC, strF in (("0C", "32F"), ("7C", "45F"), ("20C", "68F")):
+            assert dictRow["obs_dyly_derived_chill_hours_" + strC] == str(dictDay[strC])
+            assert dictRow["obs_dyly_derived_chill_hours_" + strF] == str(dictDay[strC])
+        if strDay in dictDaily:
+            for strColumn, _, strTempAirUpper, strTempAirLower in HEAT_UNIT_THRESHOLDS:
+                fltHeatUnits = calculateHeatUnits(
+                    dictDaily[strDay]["obs_dyly_temp_air_max"],
+                    dictDaily[strDay]["obs_dyly_temp_air_min"],
+                    strTempAirUpper,
+                    strTempAirLower,
+                )["fltHeatUnits"]
+                assert dictRow[
+                    "obs_dyly_derived_heat_units_" + strColumn
+                ] == roundValue(fltHeatUnits, "000.0", "str")
+        listChecked.append(strDay)
+    assert len(listChecked) == len(dictDays)
+    assert dictDays["1987.033"]["C"] == []
+    assert len(dictDays["1987.032"]["C"]) < 17
+
+    # the per-hour and per-day state has no __dict__
+    for obj in (DailyAggregate(7), DailyDerived(), HourlyDerived(0, False, 0, False)):
+        assert not hasattr(obj, "__dict__")
@@ -0,0 +1,64 @@
+# Tests that updateDerivedTables() gives the same derived tables as
+# updateDerived() writes, whether the tables come as Arrow or as dicts of
+# arrays, with the obs columns typed or left as strings.
+#
+# python -m pytest tests
+
+import numpy as np
+import pytest
+
+from batchUpdateDerived import getStationPaths
+from csvParseAndProcess import (
+    JoinReport,
+    MissingValues,
+    readCsvRows,
+    updateDerived,
+    updateDerivedTables,
+)
+from generateSyntheticData import generateStations
+
+pa = pytest.importorskip("pyarrow")
+pacsv = pytest.importorskip("pyarrow.csv")
+
+
+def readStringTable(path):
+    listHeader, listRows = readCsvRows(path)
+    return {
+        strColumn: np.array([row[intColumn] for row in listRows], dtype=object)
+        for intColumn, strColumn in enumerate(listHeader)
+    }
+
+
+def getRows(table):
+    # the rows of a table of strings, as csv.reader reads them
+    if isinstance(table, dict):
+        return [list(row) for row in zip(*table.values())]
+    return [list(row) for row in zip(*table.to_pydict().values())]
+
+
+def test_updateDerivedTables(tmp_path):
+    path_legacy = str(tmp_path)
+    generateStations(path_legacy, 1, 2003, 2004, fltMissing=0.05)
+    dictPaths = getStationPaths(path_legacy, "Synthetic 1")
+    joins = JoinReport()
+    missing = MissingValues()
+    listOutputs = updateDerived(**dictPaths, joins=joins, missing=missing)
+    listExpected = [readCsvRows(path)[1] for path in listOutputs]
+
+    for fnObs, fnDerived in (
+        (pacsv.read_csv, lambda path: pa.table(readStringTable(path))),
+        (readStringTable, readStringTable),
+    ):
+        joinsTables = JoinReport()
+        missingTables = MissingValues()
+        listTables = updateDerivedTables(
+            fnObs(dictPaths["path_obs_hrly"]),
+            fnDerived(dictPaths["path_derived_hrly"]),
+            fnObs(dictPaths["path_obs_dyly"]),
+            fnDerived(dictPaths["path_derived_dyly"]),
+            joins=joinsTables,
+            missing=missingTables,
+        )
+        assert [getRows(table) for table in listTables] == listExpected
+        assert joinsTables.getCounts() == joins.getCounts()
+        assert missingTables.getCounts() == missing.getCounts()
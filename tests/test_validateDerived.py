@@ -0,0 +1,102 @@
+# Tests of validateDerived.py against raw daily files written from the
+# _updated outputs of a synthetic station, with a few days changed.
+#
+# python -m pytest tests
+
+import csv
+
+import numpy as np
+
+from batchUpdateDerived import getStationPaths, updateStation
+from csvParseAndProcess import getUpdatedPath
+from generateSyntheticData import generateStations
+from validateDerived import (
+    DIFF_QUANTILES,
+    getRawHeatUnitsIndex,
+    summarizeDiffs,
+    validateStation,
+)
+
+
+def writeRawDaily(path_raw, path_updated_dyly, dictChanges):
+    # a raw daily file per year, with the heat units of the _updated file
+    # plus dictChanges[(year, doy)], in the column of that year's format
+    dictYears = {}
+    with open(path_updated_dyly, "r", newline="") as csvfile:
+        for row in csv.DictReader(csvfile):
+            intYear, intDoy = int(row["obs_year"]), int(row["obs_doy"])
+            fltHeatUnits = float(row["obs_dyly_derived_heat_units_13C"])
+            fltHeatUnits += dictChanges.get((intYear, intDoy), 0)
+            listRow = [str(intYear % 100), str(intDoy), "1"] + ["0"] * 25
+            listRow[getRawHeatUnitsIndex(intYear)] = f"{fltHeatUnits:.1f}"
+            dictYears.setdefault(intYear, []).append(listRow)
+    for intYear, listRows in dictYears.items():
+        with open(path_raw / f"01{intYear % 100:02d}rd.txt", "w", newline="") as file:
+            csv.writer(file, lineterminator="\r\n").writerows(listRows)
+
+
+def test_validateStation(tmp_path):
+    path_legacy = str(tmp_path)
+    path_station_list, _ = generateStations(path_legacy, 1, 2001, 2004)
+    assert updateStation(path_legacy, "Synthetic 1")["status"] == "ok"
+    dictPaths = getStationPaths(path_legacy, "Synthetic 1")
+    path_raw = tmp_path / "raw"
+    path_raw.mkdir()
+    writeRawDaily(
+        path_raw,
+        getUpdatedPath(dictPaths["path_derived_dyly"]),
+        {(2003, 10): 0.1, (2003, 11): -0.2, (2002, 300): 3.0},
+    )
+
+    dictValidation = validateStation(
+        dictPaths["path_derived_hrly"],
+        dictPaths["path_derived_dyly"],
+        1,
+        str(path_raw),
+        intChunkBytes=2**14,
+    )
+    dictCounts = dictValidation["checks"]["heat_units"]
+    assert dictCounts["breaches"] == 2
+    assert dictCounts["max_abs_diff"] == 3.0
+    assert dictCounts["compared"] + dictCounts["missing"] == 4 * 365 + 1
+    dictYears = {
+        dictYear["year"]: dictYear
+        for dictYear in dictValidation["years"]
+        if dictYear["check"] == "heat_units"
+    }
+    assert dictYears[2002]["bins"][">1"] == 1
+    assert dictYears[2003]["bins"]["<=0.1"] == 1
+    assert dictYears[2003]["bins"]["<=0.2"] == 1
+    assert dictYears[2004]["breaches"] == 0
+
+    # a station with more breaches than allowed fails the gate
+    dictResult = updateStation(
+        path_legacy,
+        "Synthetic 1",
+        {
+            "validate": {
+                "path_raw": str(path_raw),
+                "path_station_list": path_station_list,
+                "max_breaches": 0.0,
+            }
+        },
+    )
+    assert dictResult["status"] == "invalid"
+    assert dictResult["error"] == (
+        f"2 of {dictCounts['compared']} days of heat_units off by more than 0.1"
+    )
+
+
+def test_summarizeDiffs():
+    rand = np.random.default_rng(0)
+    aryKeys = rand.choice([19870010000, 19880010000, 19890010000], size=1000)
+    aryDiffs = np.round(rand.normal(0, 0.2, size=1000), 1)
+    for dictYear in summarizeDiffs(aryKeys, aryDiffs, 0.1):
+        aryYear = aryDiffs[aryKeys // 10**7 == dictYear["year"]]
+        assert dictYear["compared"] == len(aryYear)
+        assert dictYear["breaches"] == int((np.abs(aryYear) > 0.1).sum())
+        assert sum(dictYear["bins"].values()) == len(aryYear)
+        for fltQuantile in DIFF_QUANTILES:
+            assert dictYear[f"p{round(fltQuantile * 100)}"] == round(
+                float(np.quantile(np.abs(aryYear), fltQuantile)), 4
+            )
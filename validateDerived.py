@@ -0,0 +1,260 @@
+# Checks the derived values of the _updated files against the values the
+# legacy data already had for the same thing, a whole column at a time with
+# NumPy, so that it is fast enough to run on every batch:
+#
+#   heat_units: the daily heat units (30/12.8 C) of the raw daily files, which
+#     the R download functions drop, against the recalculated
+#     obs_dyly_derived_heat_units_13C (30/12.7778 C)
+#   eto_azmet: the legacy daily obs_dyly_derived_eto_azmet against the total
+#     of the day's hourly obs_hrly_derived_eto_azmet, for days with all 24
+#     hours
+#
+# Each check counts the days off by more than its tolerance, with the
+# distribution of the differences, per station and year. batchUpdateDerived.py
+# runs it after updateDerived() with --validate and fails the stations with
+# too many days off.
+
+import csv
+import os
+import re
+
+from csvParseAndProcess import (
+    CSV_CHUNK_BYTES,
+    defaultMissingValues,
+    getObsKey,
+    getUpdatedPath,
+    np,
+    readObsArrays,
+    requireNumpy,
+)
+from fetchLegacyData import SUFFIXES
+
+# the largest difference of each check that isn't a breach: heat units are
+# rounded to 0.1 and the thresholds differ by 0.022 C, and the 24 hourly ETo
+# values are each rounded to 0.1 mm, so their total can be tenths off
+VALIDATION_TOLERANCES = {"heat_units": 0.1, "eto_azmet": 1.0}
+# upper edges of the bins of absolute differences, as multiples of the tolerance
+DIFF_BINS = (0.5, 1, 2, 5, 10)
+DIFF_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def getRawHeatUnitsIndex(intYear=1987):
+    # heat units swap places with ETo in the 2003 format, see
+    # http://ag.arizona.edu/azmet/raw2003.htm
+    return 24 if intYear <= 2002 else 23
+
+
+def readRawHeatUnits(path_raw, intStationNumber=1, missing=None):
+    # (day keys, heat units with NaN for missing) of every raw daily file of
+    # a station in the fetchLegacyData.py cache. The year comes from the file
+    # name, as in the R download functions.
+    if missing is None:
+        missing = defaultMissingValues
+    patternName = re.compile(
+        rf"{intStationNumber:02d}(\d\d){re.escape(SUFFIXES['daily'])}"
+    )
+    listKeys = []
+    listValues = []
+    for strName in sorted(os.listdir(path_raw)):
+        match = patternName.fullmatch(strName)
+        if match is None:
+            continue
+        intYear = int(match.group(1))
+        intYear += 1900 if intYear >= 87 else 2000
+        intIndex = getRawHeatUnitsIndex(intYear)
+        with open(os.path.join(path_raw, strName), "r", newline="") as csvfile:
+            for row in csv.reader(csvfile):
+                if len(row) <= intIndex:
+                    continue
+                # sometimes an odd end of file character is stuck to a field
+                strDoy = row[1].strip().strip("\x1a")
+                if not strDoy.isdigit():
+                    continue
+                listKeys.append(getObsKey(str(intYear), strDoy))
+                listValues.append(row[intIndex].strip())
+
+    return (
+        np.array(listKeys, dtype=np.int64),
+        missing.parseArray(listValues, "heat_units")[0],
+    )
+
+
+def getDailyTotals(aryKeys, aryValues, intHours=24):
+    # (day keys, totals) of hourly values, NaN for a day without exactly
+    # intHours values
+    aryDays, aryInverse = np.unique(aryKeys // 10**4 * 10**4, return_inverse=True)
+    aryPresent = ~np.isnan(aryValues)
+    aryTotals = np.bincount(
+        aryInverse, weights=np.where(aryPresent, aryValues, 0), minlength=len(aryDays)
+    )
+    aryTotals[np.bincount(aryInverse, minlength=len(aryDays)) != intHours] = np.nan
+    aryTotals[
+        np.bincount(aryInverse, weights=aryPresent, minlength=len(aryDays)) != intHours
+    ] = np.nan
+
+    return aryDays, aryTotals
+
+
+def matchDays(aryKeys, aryValues, aryLegacyKeys, aryLegacyValues):
+    # (day keys, values, legacy values, days in only one of them) of the days
+    # in both; of a duplicated day, the first row counts
+    aryKeys, aryFirst = np.unique(aryKeys, return_index=True)
+    aryLegacyKeys, aryLegacyFirst = np.unique(aryLegacyKeys, return_index=True)
+    aryCommon, aryIndexes, aryLegacyIndexes = np.intersect1d(
+        aryKeys, aryLegacyKeys, assume_unique=True, return_indices=True
+    )
+
+    return (
+        aryCommon,
+        aryValues[aryFirst[aryIndexes]],
+        aryLegacyValues[aryLegacyFirst[aryLegacyIndexes]],
+        len(aryKeys) + len(aryLegacyKeys) - 2 * len(aryCommon),
+    )
+
+
+def summarizeDiffs(aryKeys, aryDiffs, fltTolerance=0.0):
+    # [{"year", "compared", "breaches", "mean_diff", "max_abs_diff", the
+    # DIFF_QUANTILES of the absolute differences, "bins": {bin: days}}] of the
+    # (value - legacy value) differences of each year, all years at once
+    aryYears = aryKeys // 10**7
+    aryAbsDiffs = np.abs(aryDiffs)
+    aryOrder = np.lexsort((aryAbsDiffs, aryYears))
+    aryAbsDiffs = aryAbsDiffs[aryOrder]
+    aryUnique, aryStarts, aryCounts = np.unique(
+        aryYears[aryOrder], return_index=True, return_counts=True
+    )
+    intYears = len(aryUnique)
+    aryGroups = np.repeat(np.arange(intYears), aryCounts)
+
+    aryBreaches = np.bincount(
+        aryGroups, weights=aryAbsDiffs > fltTolerance, minlength=intYears
+    )
+    aryMeans = np.bincount(
+        aryGroups, weights=aryDiffs[aryOrder], minlength=intYears
+    ) / np.maximum(aryCounts, 1)
+    aryMax = aryAbsDiffs[aryStarts + aryCounts - 1]
+    # linear interpolation between the closest ranks, as np.quantile() does
+    listQuantiles = []
+    for fltQuantile in DIFF_QUANTILES:
+        aryRanks = fltQuantile * (aryCounts - 1)
+        aryLower = np.floor(aryRanks).astype(np.int64)
+        aryUpper = np.ceil(aryRanks).astype(np.int64)
+        aryLowerValues = aryAbsDiffs[aryStarts + aryLower]
+        listQuantiles.append(
+            aryLowerValues
+            + (aryAbsDiffs[aryStarts + aryUpper] - aryLowerValues)
+            * (aryRanks - aryLower)
+        )
+    # a difference on an edge goes in the bin below it
+    aryEdges = np.round(fltTolerance * np.array(DIFF_BINS), 6)
+    listBins = [f"<={fltEdge:g}" for fltEdge in aryEdges] + [f">{aryEdges[-1]:g}"]
+    aryBinCounts = np.bincount(
+        aryGroups * len(listBins) + np.searchsorted(aryEdges, aryAbsDiffs),
+        minlength=intYears * len(listBins),
+    ).reshape(intYears, len(listBins))
+
+    return [
+        {
+            "year": int(aryUnique[intYear]),
+            "compared": int(aryCounts[intYear]),
+            "breaches": int(aryBreaches[intYear]),
+            "mean_diff": round(float(aryMeans[intYear]), 4),
+            "max_abs_diff": round(float(aryMax[intYear]), 4),
+            **{
+                f"p{round(fltQuantile * 100)}": round(float(aryValues[intYear]), 4)
+                for fltQuantile, aryValues in zip(DIFF_QUANTILES, listQuantiles)
+            },
+            "bins": dict(zip(listBins, aryBinCounts[intYear].tolist())),
+        }
+        for intYear in range(intYears)
+    ]
+
+
+def compareDays(aryKeys, aryValues, aryLegacyKeys, aryLegacyValues, fltTolerance):
+    # ({"compared", "missing", "unmatched", "breaches", "max_abs_diff"},
+    # summarizeDiffs() of each year) of one check
+    aryKeys, aryValues, aryLegacyValues, intUnmatched = matchDays(
+        aryKeys, aryValues, aryLegacyKeys, aryLegacyValues
+    )
+    aryPresent = ~(np.isnan(aryValues) | np.isnan(aryLegacyValues))
+    # both have at most 2 places, so this takes off the float error and
+    # leaves e.g. 12.3 - 12.2 exactly at a tolerance of 0.1
+    aryDiffs = np.round(aryValues[aryPresent] - aryLegacyValues[aryPresent], 6)
+    listYears = summarizeDiffs(aryKeys[aryPresent], aryDiffs, fltTolerance)
+
+    return {
+        "tolerance": fltTolerance,
+        "compared": len(aryDiffs),
+        "missing": int((~aryPresent).sum()),
+        "unmatched": intUnmatched,
+        "breaches": sum(dictYear["breaches"] for dictYear in listYears),
+        "max_abs_diff": max(
+            (dictYear["max_abs_diff"] for dictYear in listYears), default=0.0
+        ),
+    }, listYears
+
+
+def validateStation(
+    path_derived_hrly,
+    path_derived_dyly,
+    intStationNumber=None,
+    path_raw=None,
+    dictTolerances=None,
+    missing=None,
+    intChunkBytes=CSV_CHUNK_BYTES,
+):
+    # {"checks": {check: compareDays() counts}, "years": [{"check", and
+    # summarizeDiffs() of a year}]} of the _updated files of the derived files
+    # at path_derived_hrly and path_derived_dyly. heat_units is only checked
+    # with path_raw and intStationNumber.
+    requireNumpy()
+    dictTolerances = dict(VALIDATION_TOLERANCES, **(dictTolerances or {}))
+    path_updated_hrly = getUpdatedPath(path_derived_hrly)
+    path_updated_dyly = getUpdatedPath(path_derived_dyly)
+    aryDays, (aryHeatUnits, aryEto) = readObsArrays(
+        path_updated_dyly,
+        ["obs_dyly_derived_heat_units_13C", "obs_dyly_derived_eto_azmet"],
+        missing,
+        intChunkBytes=intChunkBytes,
+    )
+
+    dictChecks = {}
+    if path_raw is not None and intStationNumber is not None:
+        dictChecks["heat_units"] = (
+            aryDays,
+            aryHeatUnits,
+            *readRawHeatUnits(path_raw, intStationNumber, missing),
+        )
+    aryHours, (aryHourlyEto,) = readObsArrays(
+        path_updated_hrly,
+        ["obs_hrly_derived_eto_azmet"],
+        missing,
+        blnHour=True,
+        intChunkBytes=intChunkBytes,
+    )
+    dictChecks["eto_azmet"] = (
+        *getDailyTotals(aryHours, aryHourlyEto),
+        aryDays,
+        aryEto,
+    )
+
+    dictResult = {"checks": {}, "years": []}
+    for strCheck, tplArrays in dictChecks.items():
+        dictCounts, listYears = compareDays(*tplArrays, dictTolerances[strCheck])
+        dictResult["checks"][strCheck] = dictCounts
+        dictResult["years"].extend(
+            {"check": strCheck, **dictYear} for dictYear in listYears
+        )
+
+    return dictResult
+
+
+def getBreachErrors(dictValidation, fltMaxBreaches=0.0):
+    # a message for each check of validateStation() with more than
+    # fltMaxBreaches of its compared days off by more than its tolerance
+    return [
+        f"{dictCounts['breaches']} of {dictCounts['compared']} days of "
+        f"{strCheck} off by more than {dictCounts['tolerance']:g}"
+        for strCheck, dictCounts in dictValidation["checks"].items()
+        if dictCounts["breaches"] > fltMaxBreaches * dictCounts["compared"]
+    ]